@@ -0,0 +1,58 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pydsge.engine import preprocess_jit, boehlgorithm_jit, bLL_jit, tLL_jit
+from .common import get_model, zlb_state
+
+
+class TimeEngine(object):
+
+    params = ['unconstrained', 'zlb']
+    param_names = ['state']
+
+    def setup(self, state):
+        self.mod = get_model()
+        self.par = self.mod.get_par('calib')
+        self.v = zlb_state(self.mod) if state == 'zlb' else np.zeros(
+            self.mod.dim_v)
+
+        mat, term, bmat, bterm = self.mod.precalc_mat
+        self.args = (*self.mod.sys, self.v, mat, term, bmat, bterm, 40)
+
+    def time_boehlgorithm_jit(self, state):
+        boehlgorithm_jit(*self.args)
+
+    def time_t_func(self, state):
+        self.mod.t_func(self.v)
+
+
+class TimeSystem(object):
+
+    def setup(self):
+        self.mod = get_model()
+        self.par = self.mod.get_par('calib')
+
+    def time_get_sys(self):
+        self.mod.get_sys(self.par, verbose=False)
+
+    def time_preprocess_jit(self):
+        preprocess_jit(self.mod.sys, 3, 16)
+
+
+def micro_cases():
+    """The numba kernels of the engine together with their arguments. Used by `run.py --micro` to separate compile time from steady-state runtime
+    """
+
+    mod = get_model()
+    mat, term, bmat, bterm = mod.precalc_mat
+    v0 = np.zeros(mod.dim_v)
+    vz = zlb_state(mod)
+
+    return [('preprocess_jit', preprocess_jit, (mod.sys, 3, 16)),
+            ('boehlgorithm_jit(unconstrained)', boehlgorithm_jit,
+             (*mod.sys, v0, mat, term, bmat, bterm, 40)),
+            ('boehlgorithm_jit(zlb)', boehlgorithm_jit,
+             (*mod.sys, vz, mat, term, bmat, bterm, 40)),
+            ('bLL_jit', bLL_jit, (1, 2, 3, vz, bmat, bterm)),
+            ('tLL_jit', tLL_jit, (1, 2, vz, mat, term, mod.dim_x))]
@@ -0,0 +1,39 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .common import get_model
+
+
+class TimeLprob(object):
+
+    params = [True, False]
+    param_names = ['linear']
+    timeout = 600
+
+    def setup(self, linear):
+        self.mod = get_model()
+        self.mod.prep_estim(N=300, linear=linear, ncores=0, verbose=False)
+        self.par = self.mod.get_par('prior_mean', full=False)
+
+    def time_lprob(self, linear):
+        self.mod.lprob(self.par)
+
+
+class TimeLprobBatch(object):
+    """A CMA-ES population of the linear model, evaluated one by one and in one batch
+    """
+
+    timeout = 600
+
+    def setup(self):
+        self.mod = get_model()
+        self.mod.prep_estim(linear=True, ncores=0, verbose=False)
+        par = np.array(self.mod.get_par('prior_mean', full=False))
+        self.pars = par*(1 + .01*np.random.RandomState(0).randn(24, len(par)))
+
+    def time_lprob_loop(self):
+        [self.mod.lprob(p) for p in self.pars]
+
+    def time_lprob_batch(self):
+        self.mod.lprob_batch(self.pars)
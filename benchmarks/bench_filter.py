@@ -0,0 +1,24 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .common import get_model, get_filter
+
+
+class TimeFilter(object):
+
+    params = ['KF', 'TEnKF', 'PF']
+    param_names = ['ftype']
+    timeout = 600
+
+    def setup(self, ftype):
+        self.mod = get_model()
+        get_filter(self.mod, ftype, N=1000 if ftype == 'PF' else 300)
+
+    def time_get_ll(self, ftype):
+        np.random.seed(0)
+        self.mod.get_ll()
+
+    def time_run_filter(self, ftype):
+        np.random.seed(0)
+        self.mod.run_filter(smoother=False)
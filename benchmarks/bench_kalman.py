@@ -0,0 +1,25 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Covariance recursions of the Kalman filter against the state dimension, on synthetic models with three observables. The standard recursion scales with dim_x^3, the Chandrasekhar recursions with dim_x^2 dim_z
+"""
+
+from .common import get_synthetic
+
+
+class TimeKalmanEngine(object):
+
+    params = [[25, 50, 100, 200], ['standard', 'chandrasekhar', 'sqrt', 'parallel']]
+    param_names = ['nvars', 'engine']
+    timeout = 600
+
+    def setup(self, nvars, engine):
+        self.mod = get_synthetic(nvars)
+        self.mod.create_filter(ftype='KF', engine=engine)
+        self.mod.filter.R = self.mod.create_obs_cov()
+
+    def time_get_ll(self, nvars, engine):
+        self.mod.get_ll()
+
+    def time_run_filter(self, nvars, engine):
+        self.mod.run_filter()
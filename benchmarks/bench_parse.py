@@ -0,0 +1,19 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+from pydsge import DSGE, example, meta_data, parser
+
+
+class TimeParse(object):
+
+    number = 1
+    repeat = 5
+    timeout = 300
+
+    def time_read(self):
+        # make sure that the model is actually parsed
+        parser.__dict__.pop('processed_raw_model', None)
+        DSGE.read(example[0])
+
+    def time_load(self):
+        DSGE.load(meta_data)
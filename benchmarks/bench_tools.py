@@ -0,0 +1,43 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .common import get_model, get_filter
+
+
+class TimeTools(object):
+
+    timeout = 600
+
+    def setup(self):
+        self.mod = get_model()
+        get_filter(self.mod, 'KF')
+        source = self.mod.extract(verbose=False)
+        # `simulate` expects arrays
+        self.source = {k: np.asarray(v) for k, v in source.items()}
+
+    def time_irfs(self):
+        self.mod.irfs(('e_u', 8, 0), T=50, verbose=False)
+
+    def time_simulate(self):
+        self.mod.simulate(self.source)
+
+
+class TimeExtract(object):
+
+    params = ['KF', 'TEnKF']
+    param_names = ['ftype']
+    timeout = 600
+
+    def setup(self, ftype):
+        self.mod = get_model()
+        get_filter(self.mod, ftype)
+
+        if ftype != 'KF':
+            try:
+                self.mod.extract(verbose=False)
+            except Exception as e:
+                raise NotImplementedError('extract not available: %s' % e)
+
+    def time_extract(self, ftype):
+        self.mod.extract(verbose=False)
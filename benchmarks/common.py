@@ -0,0 +1,77 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""shared setup of the benchmarks. Everything runs on the bundled `dfi` model and data, except for the benchmarks that scale with the model size, which use synthetic models
+"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+from pydsge import DSGE, example, meta_data
+from pydsge.synthetic import gen_model
+
+# parsing is expensive, hence the model is only read once per process
+_cache = {}
+
+
+def get_model(fresh=False):
+    """The calibrated `dfi` model with data loaded
+    """
+
+    if 'mod' not in _cache or fresh:
+        mod = DSGE.read(example[0])
+        mod.set_par('calib', verbose=False)
+        mod.load_data(pd.read_csv(
+            example[1], parse_dates=['date'], index_col='date'), start='1998Q1')
+        mod.debug = True
+        _cache['mod'] = mod
+
+    return _cache['mod']
+
+
+def get_synthetic(nvars):
+    """A calibrated synthetic model with `nvars` variables, three observables and data loaded
+    """
+
+    key = 'synth_%s' % nvars
+
+    if key not in _cache:
+        if 'path' not in _cache:
+            _cache['path'] = tempfile.mkdtemp(prefix='pydsge_bench_')
+
+        yaml_file, data_file = gen_model(
+            _cache['path'], nvars=nvars, nfwd=nvars//5, verbose=False)
+        mod = DSGE.read(yaml_file)
+        mod.set_par('calib', verbose=False)
+        mod.load_data(pd.read_csv(
+            data_file, parse_dates=['date'], index_col='date'))
+        _cache[key] = mod
+
+    return _cache[key]
+
+
+def get_filter(mod, ftype, N=None):
+    """Create a filter of type `ftype` ('KF', 'TEnKF' or 'PF'). Raises NotImplementedError (which skips the benchmark) if the filter is not available
+    """
+
+    try:
+        mod.create_filter(ftype=ftype, N=N, seed=0)
+        mod.filter.R = mod.create_obs_cov()
+        np.random.seed(0)
+        mod.get_ll()
+    except Exception as e:
+        # do not leave a broken filter behind
+        del mod.filter
+        raise NotImplementedError('%s not available: %s' % (ftype, e))
+
+    return mod.filter
+
+
+def zlb_state(mod, size=8.):
+    """A state vector that implies a long spell at the ZLB (about 10 periods for `dfi`)
+    """
+
+    eps = np.zeros(len(mod.shocks))
+    eps[mod.shocks.index('e_u')] = size
+
+    return mod.SIG @ eps
@@ -0,0 +1,91 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Precision benchmark: Monte Carlo standard deviation of the TEnKF likelihood against the ensemble size, for each sampling scheme.
+
+Usage:
+
+    python benchmarks/ll_noise.py --N 50 100 200 400 --nseeds 30 --out ll_noise.json
+
+For each scheme and ensemble size, the likelihood of the calibrated `dfi` model is evaluated with `--nseeds` different seeds. Reported are the standard deviation across seeds, the mean and the time per evaluation. A scheme that reaches the same standard deviation at a smaller N is a direct speedup.
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pydsge import DSGE, example
+from pydsge.tenkf import sampling_schemes
+
+
+def get_model():
+    """The calibrated `dfi` model with data loaded
+    """
+
+    mod = DSGE.read(example[0])
+    mod.set_par('calib', verbose=False)
+    mod.load_data(pd.read_csv(
+        example[1], parse_dates=['date'], index_col='date'), start='1998Q1')
+
+    return mod
+
+
+def measure(mod, N, sampling, nseeds):
+    """Likelihoods of `nseeds` seeds and the time per evaluation
+    """
+
+    mod.create_filter(N=N, seed=0, sampling=sampling)
+    mod.filter.R = mod.create_obs_cov()
+    mod.get_ll()
+
+    lls = np.empty(nseeds)
+    st = time.perf_counter()
+
+    for seed in range(nseeds):
+        mod.filter.seed = seed
+        lls[seed] = mod.get_ll()
+
+    return lls, (time.perf_counter() - st)/nseeds
+
+
+def main(argv=None):
+
+    aparser = argparse.ArgumentParser(
+        description='Standard deviation of the TEnKF likelihood against the ensemble size.')
+    aparser.add_argument('--N', type=int, nargs='+',
+                         default=[50, 100, 200, 400], help='ensemble sizes')
+    aparser.add_argument('--sampling', nargs='+', default=list(sampling_schemes),
+                         help='sampling schemes of the TEnKF')
+    aparser.add_argument('--nseeds', type=int, default=30,
+                         help='number of likelihood evaluations per ensemble size')
+    aparser.add_argument('--out', default=None,
+                         help='store the results as JSON')
+    args = aparser.parse_args(argv)
+
+    mod = get_model()
+
+    results = []
+    for sampling in args.sampling:
+        for N in args.N:
+
+            lls, dur = measure(mod, N, sampling, args.nseeds)
+            res = {'sampling': sampling, 'N': N, 'std': np.std(lls),
+                   'mean': np.mean(lls), 'time': dur}
+            results.append(res)
+
+            print('[ll_noise:]'.ljust(15, ' ') + ' %s, N=%s: std %.3f, mean %.3f, %.4fs per evaluation' %
+                  (sampling, N, res['std'], res['mean'], dur))
+
+    table = pd.DataFrame(results).pivot(index='N', columns='sampling', values='std')
+    print('\nStandard deviation of the log-likelihood\n', table.round(3))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
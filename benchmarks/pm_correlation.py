@@ -0,0 +1,106 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Correlation benchmark of the pseudo-marginal likelihood: standard deviation of the difference between the log-likelihoods of the current and the Crank-Nicolson-moved random numbers, for the particle filter with and without sorting before resampling.
+
+Usage:
+
+    python benchmarks/pm_correlation.py --N 1000 --npairs 100 --rho .99 --out pm_correlation.json
+
+The lower the standard deviation of the differences relative to that of independent random numbers (`rho=0`), the larger the steps a correlated pseudo-marginal sampler (`pmmh`) can take with the same number of particles. As the particle filter degenerates with small measurement errors, the measurement error covariance is scaled by `--scale-obs` (see `create_obs_cov`), and the filter starts from the unconditional covariance of the linearized model.
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pydsge import DSGE, example
+from pydsge.kalman import lyapunov_jit
+from pydsge.mcmc import cn_move
+
+
+def get_model():
+    """The calibrated `dfi` model with data loaded
+    """
+
+    mod = DSGE.read(example[0])
+    mod.set_par('calib', verbose=False)
+    mod.load_data(pd.read_csv(
+        example[1], parse_dates=['date'], index_col='date'), start='1998Q1')
+
+    return mod
+
+
+def measure(mod, N, R, P, rho, npairs, sort, sort_dim=1):
+    """Standard deviation of the likelihood differences over `npairs` pairs of random numbers and the time per evaluation
+    """
+
+    mod.create_filter(ftype='APF', N=N, seed=0, P=P,
+                      sort=sort, sort_dim=sort_dim)
+    mod.filter.R = R
+    mod.get_ll()
+
+    rng = np.random.RandomState(0)
+    diffs = np.empty(npairs)
+    st = time.perf_counter()
+
+    for i in range(npairs):
+        noise = mod.filter.draw_noise(len(mod.data), rng)
+        diffs[i] = mod.get_ll(noise=noise) - \
+            mod.get_ll(noise=cn_move(noise, rho, rng))
+
+    return np.std(diffs), (time.perf_counter() - st)/npairs/2
+
+
+def main(argv=None):
+
+    aparser = argparse.ArgumentParser(
+        description='Correlation of the particle filter likelihood under Crank-Nicolson moves of the random numbers.')
+    aparser.add_argument('--N', type=int, default=1000,
+                         help='number of particles')
+    aparser.add_argument('--npairs', type=int, default=100,
+                         help='number of pairs of likelihood evaluations')
+    aparser.add_argument('--rho', type=float, default=.99,
+                         help='correlation of the Crank-Nicolson move')
+    aparser.add_argument('--sort-dim', type=int, nargs='+', default=[1, 2, 3],
+                         help='number of principal axes used for sorting')
+    aparser.add_argument('--scale-obs', type=float, default=1.,
+                         help='scale of the measurement errors')
+    aparser.add_argument('--out', default=None,
+                         help='store the results as JSON')
+    args = aparser.parse_args(argv)
+
+    mod = get_model()
+    R = mod.create_obs_cov(args.scale_obs)
+
+    F = np.ascontiguousarray(mod.lin_t_func, dtype=float)
+    CO = mod.SIG @ mod.QQ(mod.ppar)
+    P = lyapunov_jit(F, np.ascontiguousarray(CO @ CO.T))[0]
+
+    cases = [('independent', 0, False, 1), ('unsorted', args.rho, False, 1)] + \
+        [('sorted (%s axes)' % k, args.rho, True, k) for k in args.sort_dim]
+
+    results = []
+    for name, rho, sort, sort_dim in cases:
+
+        std, dur = measure(mod, args.N, R, P, rho,
+                           args.npairs, sort, sort_dim)
+        res = {'case': name, 'rho': rho, 'std': std,
+               'se': std/np.sqrt(2*args.npairs), 'time': dur}
+        results.append(res)
+
+        print('[pm_correlation:]'.ljust(15, ' ') + ' %s: std of differences %.3f (+- %.3f), %.4fs per evaluation' %
+              (name, std, res['se'], dur))
+
+    print('\n', pd.DataFrame(results).set_index('case').round(3))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
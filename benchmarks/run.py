@@ -0,0 +1,228 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Lightweight runner for the benchmark suite. The suite itself follows the conventions of asv (airspeed velocity) and can also be run with `asv run` using `asv.conf.json`.
+
+Usage (from the repository root):
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --filter engine --compare bench.json
+    python -m benchmarks.run --micro
+
+Results are stored as JSON together with the commit hash, so that they can be compared across commits. With `--compare`, benchmarks that got slower by more than `--threshold` are flagged. The `--micro` mode reports, for each numba kernel of the engine, the time to load it from the cache, the time to compile it from scratch and the steady-state runtime.
+"""
+
+import sys
+import json
+import time
+import inspect
+import argparse
+import importlib
+import itertools
+import subprocess
+import numpy as np
+
+modules = 'bench_parse', 'bench_engine', 'bench_filter', 'bench_kalman', 'bench_estimation', 'bench_tools'
+
+
+def commit_hash():
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def timeit(func, args=(), number=1, repeat=5, min_time=.2):
+    """Time a callable. Returns the runtimes per call of all repeats
+
+    `number` is increased until a repeat takes at least `min_time / repeat` seconds.
+    """
+
+    func(*args)
+
+    while True:
+        st = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        if time.perf_counter() - st > min_time/repeat or number > 1e6:
+            break
+        number *= 10
+
+    times = []
+    for _ in range(repeat):
+        st = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        times.append((time.perf_counter() - st)/number)
+
+    return np.array(times)
+
+
+def collect(pattern=None):
+    """Find all benchmark classes and methods (asv-style: classes with `time_*` methods)
+    """
+
+    cases = []
+
+    for mname in modules:
+        module = importlib.import_module('benchmarks.' + mname)
+
+        for cname, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+
+            for fname in [f for f in dir(cls) if f.startswith('time_')]:
+                name = '%s.%s.%s' % (mname, cname, fname)
+                if pattern and pattern not in name:
+                    continue
+                cases.append((name, cls, fname))
+
+    return cases
+
+
+def run(pattern=None, verbose=True):
+
+    results = {}
+
+    for name, cls, fname in collect(pattern):
+
+        params = getattr(cls, 'params', [])
+        if params and not isinstance(params[0], list):
+            params = [params]
+
+        for par in itertools.product(*params):
+
+            key = name + ('(%s)' % ', '.join(str(p) for p in par) if par else '')
+            bench = cls()
+
+            try:
+                if hasattr(bench, 'setup'):
+                    bench.setup(*par)
+            except NotImplementedError as e:
+                if verbose:
+                    print('[benchmark:]'.ljust(15, ' ') +
+                          ' %s skipped (%s).' % (key, e))
+                continue
+
+            times = timeit(getattr(bench, fname), par, number=getattr(cls, 'number', 1),
+                           repeat=getattr(cls, 'repeat', 5))
+            results[key] = {'min': times.min(), 'median': np.median(times)}
+
+            if verbose:
+                print('[benchmark:]'.ljust(15, ' ') + ' %s: %s' %
+                      (key, fmt(results[key]['median'])))
+
+    return results
+
+
+def micro(verbose=True):
+    """Separate the compile time of the numba kernels from their steady-state runtime
+    """
+
+    from numba import njit
+    from .bench_engine import micro_cases
+
+    results = {}
+
+    for name, disp, args in micro_cases():
+
+        # first call of the cached dispatcher (loading from cache or compiling)
+        disp = njit(cache=True, **disp.targetoptions)(disp.py_func)
+        st = time.perf_counter()
+        disp(*args)
+        load = time.perf_counter() - st
+
+        # compile from scratch
+        fresh = njit(**disp.targetoptions)(disp.py_func)
+        st = time.perf_counter()
+        fresh(*args)
+        first = time.perf_counter() - st
+
+        steady = np.median(timeit(disp, args))
+        results[name] = {'cache_load': load, 'compile': first - steady,
+                         'steady': steady}
+
+        if verbose:
+            print('[benchmark:]'.ljust(15, ' ') + ' %s: cache/first call %s, compile %s, steady state %s' %
+                  (name, fmt(load), fmt(first - steady), fmt(steady)))
+
+    return results
+
+
+def fmt(t):
+
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if t*scale >= 1:
+            break
+
+    return '%.3f%s' % (t*scale, unit)
+
+
+def compare(new, old, threshold=1.1):
+    """Print the ratio of the medians and flag regressions
+    """
+
+    print('\n%-60s %10s %10s %7s' % ('benchmark', 'old', 'new', 'ratio'))
+
+    regressions = []
+    for key, res in new.items():
+        if key not in old:
+            continue
+
+        t0, t1 = old[key]['median'], res['median']
+        ratio = t1/t0
+        flag = ' !' if ratio > threshold else ''
+        if flag:
+            regressions.append(key)
+
+        print('%-60s %10s %10s %7.2f%s' % (key, fmt(t0), fmt(t1), ratio, flag))
+
+    return regressions
+
+
+def main(argv=None):
+
+    aparser = argparse.ArgumentParser(
+        description='Run the pydsge benchmark suite.')
+    aparser.add_argument('--filter', default=None,
+                         help='only run benchmarks that contain this string')
+    aparser.add_argument('--micro', action='store_true',
+                         help='report compile time vs. steady-state runtime of the numba kernels')
+    aparser.add_argument('--out', default=None,
+                         help='store the results as JSON')
+    aparser.add_argument('--compare', default=None,
+                         help='JSON file of a previous run to compare with')
+    aparser.add_argument('--threshold', type=float, default=1.1,
+                         help='ratio above which a benchmark counts as a regression')
+    args = aparser.parse_args(argv)
+
+    if args.micro:
+        results = micro()
+    else:
+        results = run(args.filter)
+
+    rdict = {'commit': commit_hash(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+             'mode': 'micro' if args.micro else 'suite', 'results': results}
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('mode') != rdict['mode']:
+            print('[benchmark:]'.ljust(15, ' ') +
+                  ' Can not compare a %s run to a %s run.' % (rdict['mode'], old.get('mode')))
+        else:
+            key = 'steady' if args.micro else 'median'
+            regressions = compare({k: {'median': v[key]} for k, v in results.items()},
+                                  {k: {'median': v[key]} for k, v in old['results'].items()}, args.threshold)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(rdict, f, indent=2)
+
+    return int(bool(regressions))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Scaling benchmark: time and memory of the main stages against the size of synthetic models.
+
+Usage:
+
+    python benchmarks/scaling.py --sizes 15 25 50 100 --out scaling.json
+
+For each size, a synthetic model and dataset are generated with `pydsge.synthetic`. The stages `read` (parsing, including `get_matrices`), `get_matrices`, `get_sys`, `preprocess_jit` and the likelihood of the Kalman filter and the TEnKF are timed in one pass and their peak memory is recorded in a second pass using `tracemalloc` (which would otherwise distort the timings). A tiny model is run first so that numba compile times do not show up in the results.
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pydsge import DSGE, parser
+from pydsge.engine import preprocess_jit
+from pydsge.synthetic import gen_model
+
+stages = 'read', 'get_matrices', 'get_sys', 'preprocess_jit', 'll_kf', 'll_tenkf'
+
+
+def structure(nvars, nlags=1):
+    """Default structure of a synthetic model with `nvars` variables
+    """
+
+    nshocks = 3 + nvars//10
+
+    return dict(nvars=nvars, nfwd=nvars//5, nshocks=nshocks, nobs=nshocks, nlags=nlags)
+
+
+def run_stages(yaml_file, data_file, N=100, l_max=3, k_max=16):
+    """Generator that runs the stages one after the other. Yields after each stage
+    """
+
+    # make sure that the model is actually parsed
+    parser.__dict__.pop('processed_raw_model', None)
+
+    mod = DSGE.read(yaml_file)
+    yield 'read'
+
+    mod.get_matrices()
+    yield 'get_matrices'
+
+    mod.set_par('calib', l_max=l_max, k_max=k_max, verbose=False)
+    yield 'get_sys'
+
+    preprocess_jit(mod.sys, l_max, k_max)
+    yield 'preprocess_jit'
+
+    mod.load_data(pd.read_csv(data_file, index_col='date', parse_dates=['date']))
+
+    mod.create_filter(ftype='KF')
+    mod.filter.R = mod.create_obs_cov()
+    mod.get_ll()
+    yield 'll_kf'
+
+    mod.create_filter(N=N, seed=0)
+    mod.filter.R = mod.create_obs_cov()
+    mod.get_ll()
+    yield 'll_tenkf'
+
+
+def measure(yaml_file, data_file, memory=False, **args):
+    """Time (or trace the memory of) each stage. Failing stages are reported as NaN
+    """
+
+    res = {}
+    runner = run_stages(yaml_file, data_file, **args)
+
+    for stage in stages:
+
+        if memory:
+            tracemalloc.start()
+        st = time.perf_counter()
+
+        try:
+            next(runner)
+            val = time.perf_counter() - st
+            if memory:
+                val = tracemalloc.get_traced_memory()[1]/2**20
+        except Exception as e:
+            print('[scaling:]'.ljust(15, ' ') +
+                  ' Stage %s failed: %s' % (stage, e), file=sys.stderr)
+            val = np.nan
+        finally:
+            if memory:
+                tracemalloc.stop()
+
+        res[stage] = val
+
+        if np.isnan(val):
+            # later stages depend on the failed one
+            break
+
+    return res
+
+
+def main(argv=None):
+
+    aparser = argparse.ArgumentParser(
+        description='Time and memory per stage against model size.')
+    aparser.add_argument('--sizes', type=int, nargs='+',
+                         default=[15, 25, 50, 100], help='number of variables of the models')
+    aparser.add_argument('--nlags', type=int, default=1,
+                         help='number of lags of the exogenous processes')
+    aparser.add_argument('--N', type=int, default=100,
+                         help='ensemble size of the TEnKF')
+    aparser.add_argument('--no-memory', action='store_true',
+                         help='skip the tracemalloc pass')
+    aparser.add_argument('--path', default=None,
+                         help='directory for the generated models (defaults to a temporary directory)')
+    aparser.add_argument('--out', default=None,
+                         help='store the results as JSON')
+    args = aparser.parse_args(argv)
+
+    path = args.path or tempfile.mkdtemp(prefix='pydsge_scaling_')
+
+    # warm up numba
+    files = gen_model(path, **structure(12, args.nlags), verbose=False)
+    measure(*files, N=args.N)
+
+    results = []
+    for nvars in args.sizes:
+
+        struct = structure(nvars, args.nlags)
+        files = gen_model(path, **struct, verbose=False)
+
+        res = dict(struct)
+        res['time'] = measure(*files, N=args.N)
+        if not args.no_memory:
+            res['memory'] = measure(*files, memory=True, N=args.N)
+
+        results.append(res)
+
+        print('[scaling:]'.ljust(15, ' ') + ' %s variables: ' % nvars +
+              ', '.join('%s %.3fs' % kv for kv in res['time'].items()))
+
+    table = pd.DataFrame({r['nvars']: r['time'] for r in results}).T
+    table.index.name = 'nvars'
+    print('\nTime [s]\n', table.round(4))
+
+    if not args.no_memory:
+        table = pd.DataFrame({r['nvars']: r['memory'] for r in results}).T
+        table.index.name = 'nvars'
+        print('\nPeak memory [MiB]\n', table.round(2))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""Accuracy benchmark of the sigma-point filters: likelihood and filtered means of the UKF and CKF compared to the TEnKF.
+
+Usage:
+
+    python benchmarks/sigma_points.py --N 100 300 1000 --N-ref 5000 --nseeds 10 --out sigma_points.json
+
+The reference is the TEnKF with `--N-ref` members, averaged over `--nseeds` seeds. For the TEnKF with smaller ensembles, the mean absolute likelihood error and the root mean squared error of the filtered means are averaged over the seeds as well. The sigma-point filters are deterministic and evaluated once.
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pydsge import DSGE, example
+
+
+def get_model():
+    """The calibrated `dfi` model with data loaded
+    """
+
+    mod = DSGE.read(example[0])
+    mod.set_par('calib', verbose=False)
+    mod.load_data(pd.read_csv(
+        example[1], parse_dates=['date'], index_col='date'), start='1998Q1')
+
+    return mod
+
+
+def evaluate(mod, ftype, N=None, seed=None):
+    """Likelihood, filtered means and time of one evaluation
+    """
+
+    mod.create_filter(ftype=ftype, N=N, seed=seed)
+    mod.filter.R = mod.create_obs_cov()
+    mod.get_ll()
+
+    st = time.perf_counter()
+    ll = mod.get_ll()
+    dur = time.perf_counter() - st
+
+    res = mod.run_filter(smoother=False)
+    means = res[0] if isinstance(res, tuple) else res.mean(axis=0)
+
+    return ll, means, dur
+
+
+def main(argv=None):
+
+    aparser = argparse.ArgumentParser(
+        description='Likelihood and filtering accuracy of the sigma-point filters against the TEnKF.')
+    aparser.add_argument('--N', type=int, nargs='+',
+                         default=[100, 300, 1000], help='ensemble sizes of the TEnKF')
+    aparser.add_argument('--N-ref', type=int, default=5000,
+                         help='ensemble size of the reference TEnKF')
+    aparser.add_argument('--nseeds', type=int, default=10,
+                         help='number of seeds of the TEnKF')
+    aparser.add_argument('--out', default=None,
+                         help='store the results as JSON')
+    args = aparser.parse_args(argv)
+
+    mod = get_model()
+
+    ref = [evaluate(mod, 'TEnKF', args.N_ref, seed)
+           for seed in range(args.nseeds)]
+    ll_ref = np.mean([r[0] for r in ref])
+    means_ref = np.mean([r[1] for r in ref], axis=0)
+
+    print('[sigma_points:]'.ljust(15, ' ') + ' Reference (TEnKF, N=%s): ll %.3f (std %.3f)' %
+          (args.N_ref, ll_ref, np.std([r[0] for r in ref])))
+
+    cases = [('UKF', None, [None]), ('CKF', None, [None])] + \
+        [('TEnKF', N, range(args.nseeds)) for N in args.N]
+
+    results = []
+    for ftype, N, seeds in cases:
+
+        runs = [evaluate(mod, ftype, N, seed) for seed in seeds]
+        res = {'filter': ftype if N is None else '%s (N=%s)' % (ftype, N),
+               'll': np.mean([r[0] for r in runs]),
+               'll_error': np.mean([abs(r[0] - ll_ref) for r in runs]),
+               'means_rmse': np.mean([np.sqrt(np.mean((r[1] - means_ref)**2)) for r in runs]),
+               'time': np.mean([r[2] for r in runs])}
+        results.append(res)
+
+        print('[sigma_points:]'.ljust(15, ' ') + ' %s: ll %.3f, |error| %.3f, RMSE of means %.4f, %.4fs per evaluation' %
+              (res['filter'], res['ll'], res['ll_error'], res['means_rmse'], res['time']))
+
+    print('\n', pd.DataFrame(results).set_index('filter').round(4))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'reference': {'N': args.N_ref, 'll': ll_ref}, 'results': results}, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
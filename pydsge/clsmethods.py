@@ -7,12 +7,15 @@ import pandas as pd
 from .parser import DSGE
 from .stats import summary, gfevd, mbcs_index, nhd, mdd
 from .plots import posteriorplot, traceplot
-from .mcmc import mcmc, tmcmc
+from .mcmc import mcmc, tmcmc, pmmh
 from .modesearch import cmaes
 from .filtering import *
 from .tools import *
 from .core import get_sys, get_par, get_cov, set_par
 from .estimation import *
+from .snapshot import snapshot, Snapshot
+from .codegen import gen_kernels
+from .timing import timings
 
 
 def vix(self, variables, dontfail=False):
@@ -43,13 +46,6 @@ def oix(self, observables):
     return [list(self.observables).index(v) for v in observables]
 
 
-def get_eps_lin(self, x, xp, rcond=1e-14):
-    """Get filter-implied (smoothed) shocks for linear model
-    """
-
-    return np.linalg.pinv(self.SIG, rcond) @ (x - self.lin_t_func@xp)
-
-
 @property
 def get_tune(self):
 
@@ -365,6 +361,8 @@ def load_data(self, df, start=None, end=None):
 
     import cloudpickle as cpickle
     self.data = d
+    self.Z = np.array(d)
+    self._Z_data = d
     self.fdict['data'] = cpickle.dumps(d, protocol=4)
     self.fdict['obs'] = self.observables
 
@@ -429,6 +427,7 @@ DSGE.oix = oix
 DSGE.get_tune = get_tune
 DSGE.save = save_meta
 DSGE.mapper = mapper
+DSGE.batch_mapper = batch_mapper
 DSGE.mode_summary = mode_summary
 DSGE.swarm_summary = swarm_summary
 DSGE.mcmc_summary = mcmc_summary
@@ -442,6 +441,14 @@ DSGE.rjfunc = rjfunc
 DSGE.bjfunc = bjfunc
 DSGE.get_sample = get_sample
 DSGE.create_pool = create_pool
+DSGE.snapshot = snapshot
+DSGE.gen_kernels = gen_kernels
+DSGE.timings = timings
+# helpers that `pre_func` hooks of `prep_estim` may use on the snapshot
+Snapshot.vix = vix
+Snapshot.oix = oix
+Snapshot.box_check = box_check
+Snapshot.create_obs_cov = create_obs_cov
 # from core
 DSGE.get_par = get_par
 DSGE.gp = get_par
@@ -454,11 +461,13 @@ DSGE.o_func = o_func
 DSGE.lin_t_func = lin_t_func
 DSGE.lin_o_func = lin_o_func
 DSGE.get_eps_lin = get_eps_lin
+DSGE.extract_lin = extract_lin
 DSGE.irfs = irfs
 DSGE.simulate = simulate
 # from mcmc
 DSGE.mcmc = mcmc
 DSGE.tmcmc = tmcmc
+DSGE.pmmh = pmmh
 # from estimation
 DSGE.prep_estim = prep_estim
 DSGE.load_estim = prep_estim
@@ -469,6 +478,7 @@ DSGE.cmaes = cmaes
 DSGE.create_filter = create_filter
 DSGE.run_filter = run_filter
 DSGE.get_ll = get_ll
+DSGE.update_filter = update_filter
 # from plot
 DSGE.traceplot = traceplot_m
 DSGE.posteriorplot = posteriorplot_m
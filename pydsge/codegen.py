@@ -0,0 +1,263 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a code generator that emits model-specific numba kernels for the engine
+"""
+
+import os
+import sys
+import time
+import hashlib
+import inspect
+import tempfile
+import importlib.util
+import numpy as np
+
+# modules that were already imported during this session, indexed by their hash
+kernel_cache = {}
+
+
+def _lincomb(arr, idx, vec, cols, const=None):
+    """Write the dot product of a row of `arr` with `vec` as an explicit sum
+    """
+
+    terms = ['%s[%s%s]*%s[%s]' % (arr, idx, c, vec, c) for c in cols]
+
+    if const is not None:
+        terms.insert(0, const)
+
+    if not terms:
+        return '0.'
+
+    return '(%s)' % ' +\n        '.join(terms)
+
+
+def _kernel(name, args, setup, dim_out, pattern, arr, vec, const, max_unroll, prefix):
+    """Emit a kernel that computes `out[i] = const[i] + sum_j arr[i, j]*vec[j]` for all nonzero entries of `pattern`
+    """
+
+    rows, cols = np.nonzero(pattern)
+    nnz = len(rows)
+
+    src = '\n\n@njit(nogil=True, cache=True)\ndef %s(%s):\n\n' % (name, args)
+    src += ''.join('    %s\n' % s for s in setup)
+
+    if nnz > max_unroll:
+        # too large to be unrolled: loop over the baked index arrays
+        src = '\n%s_ROWS = np.array(%s)\n%s_COLS = np.array(%s)\n' % (
+            prefix, rows.tolist(), prefix, cols.tolist()) + src
+        src += '    out = np.empty(%s)\n' % dim_out
+        src += '    for i in range(%s):\n' % dim_out
+        src += '        out[i] = %s\n' % (const % 'i' if const else '0.')
+        src += '    for n in range(%s):\n' % nnz
+        src += '        out[%s_ROWS[n]] += %s[%s_ROWS[n], %s_COLS[n]]*%s[%s_COLS[n]]\n' % (
+            prefix, arr, prefix, prefix, vec, prefix)
+        src += '    return out\n'
+
+        return src
+
+    src += '    out = np.empty(%s)\n' % dim_out
+    for i in range(dim_out):
+        src += '    out[%s] = %s\n' % (i, _lincomb(arr, '%s, ' %
+                                                  i, vec, cols[rows == i], const % i if const else None))
+    src += '    return out\n'
+
+    return src
+
+
+def _bvalid(bmat):
+    """Entries of `bmat` that are actually set by `preprocess_jit` (the others are uninitialized)
+    """
+
+    l, k, s = np.indices(bmat.shape[:3])
+
+    return bmat[s <= l + k + 1]
+
+
+def gen_src(self, max_unroll=2000):
+    """Generate the source code of the model-specific kernel module.
+
+    The shapes and the sparsity pattern are taken from the current solution (`self.precalc_mat` and `self.hx`). The regime search is copied from `pydsge.engine`, such that it calls the specialized kernels.
+
+    Returns
+    -------
+    src : str
+        The module source
+    masks : dict
+        The sparsity patterns that were baked into the module
+    """
+
+    from . import engine
+
+    mat, term, bmat, bterm = self.precalc_mat
+    dim_x = self.sys[2].shape[0]
+    dim_v = mat.shape[-1]
+    ny = self.hx[0].shape[0]
+
+    # union of the nonzero entries over all regimes
+    tmask = (mat[:, :, 1, dim_x:] != 0).any(axis=(0, 1))
+    bmask = (_bvalid(bmat) != 0).any(axis=0)
+    omask = self.hx[0] != 0
+
+    src = '#!/bin/python\n# -*- coding: utf-8 -*-\n\n'
+    src += '"""model-specific kernels for the model \'%s\'. Generated by `pydsge.codegen`, do not edit.\n"""\n\n' % self.name
+    src += 'import numpy as np\nfrom numba import njit\n\n'
+    src += 'DIM_X = %s\nDIM_V = %s\nNY = %s\n' % (dim_x, dim_v, ny)
+
+    # constraint-projection kernel. Scalar valued, hence always unrolled
+    src += '\n\n@njit(nogil=True, cache=True)\ndef bLL_jit(l, k, s, v, bmat, bterm):\n\n'
+    src += '    m = bmat[l, k, s]\n'
+    src += '    return %s\n' % _lincomb('m', '', 'v',
+                                        np.nonzero(bmask)[0], 'bterm[l, k, s]')
+
+    # transition kernel, only the rows that survive in the state vector
+    src += _kernel('tLL_jit', 'l, k, v, mat, term, dim_x', ('m = mat[l, k, 1, DIM_X:]', 't = term[l, k, 1, DIM_X:]'),
+                   dim_v, tmask, 'm', 'v', 't[%s]', max_unroll, 'T')
+
+    # observation kernel for a single state
+    src += _kernel('oLL_jit', 'v, hx0, hx1', (), ny, omask,
+                   'hx0', 'v', 'hx1[%s]', max_unroll, 'O')
+
+    src += '\n\n@njit(nogil=True, cache=True)\ndef oLL_batch_jit(X, hx0, hx1):\n\n'
+    src += '    if X.ndim == 1:\n'
+    src += '        return oLL_jit(X, hx0, hx1)\n'
+    src += '    out = np.empty((X.shape[0], NY))\n'
+    src += '    for i in range(X.shape[0]):\n'
+    src += '        out[i] = oLL_jit(X[i], hx0, hx1)\n'
+    src += '    return out\n'
+
+    # the search itself is taken verbatim from the engine
+    for func in (engine.boehlgorithm_jit, engine.bruite_wrapper, engine.boehlgorithm_batch_jit):
+        src += '\n\n' + inspect.getsource(func.py_func)
+
+    masks = {'dims': (dim_x, dim_v, ny), 'tmask': tmask,
+             'bmask': bmask, 'omask': omask}
+
+    return src, masks
+
+
+def kernel_dir(self):
+    """Directory where the generated modules (and their numba caches) live
+    """
+
+    path = os.path.join(self.path or '.', '__kernels__')
+
+    try:
+        os.makedirs(path, exist_ok=True)
+        if os.access(path, os.W_OK):
+            return path
+    except OSError:
+        pass
+
+    path = os.path.join(tempfile.gettempdir(), 'pydsge_kernels')
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+
+def load_kernels(self, key, src):
+    """Import a generated module. Writes the source to disk if necessary
+    """
+
+    if key in kernel_cache:
+        return kernel_cache[key]
+
+    modname = 'pydsge_kernels_%s' % key
+    fname = os.path.join(kernel_dir(self), modname + '.py')
+
+    if not os.path.exists(fname):
+        with open(fname, 'w') as f:
+            f.write(src)
+
+    spec = importlib.util.spec_from_file_location(modname, fname)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[modname] = module
+    spec.loader.exec_module(module)
+
+    kernel_cache[key] = module
+
+    return module
+
+
+def kernels_fit(self):
+    """Check if the current solution is compatible with the sparsity pattern of the generated kernels
+    """
+
+    kern = self.fdict.get('kernels')
+
+    if kern is None:
+        return False
+
+    mat, _, bmat, _ = self.precalc_mat
+    dim_x = self.sys[2].shape[0]
+
+    if kern['dims'] != (dim_x, mat.shape[-1], self.hx[0].shape[0]):
+        return False
+
+    if mat[:, :, 1, dim_x:][..., ~kern['tmask']].any():
+        return False
+
+    if _bvalid(bmat)[:, ~kern['bmask']].any():
+        return False
+
+    return not self.hx[0][~kern['omask']].any()
+
+
+def get_kernels(self):
+    """Get the generated kernel module if it exists and is compatible with the current solution. Returns `None` otherwise
+    """
+
+    if not getattr(self, 'kernels_fit', False):
+        return None
+
+    kern = self.fdict['kernels']
+
+    return load_kernels(self, kern['key'], kern['src'])
+
+
+def gen_kernels(self, max_unroll=2000, force=False, verbose=True):
+    """Generate a model-specific numba module for the transition, observation and constraint-projection kernels.
+
+    Dimensions and sparsity patterns are taken from the current solution and baked into the module. Kernels with less than `max_unroll` nonzero entries are fully unrolled, which avoids the overhead of generic BLAS calls on tiny matrices. The module is stored in `fdict` (and hence saved with the model) and written to a `__kernels__` directory next to the model, so that numba can cache the compiled code. If a later parameter draw violates the sparsity pattern, the generic kernels from `pydsge.engine` are used instead.
+
+    To stop using the kernels, remove `fdict['kernels']`.
+
+    Parameters
+    ----------
+    max_unroll : int, optional
+        Maximum number of nonzero entries of a kernel that is unrolled. Larger kernels loop over the baked index arrays. Defaults to 2000.
+    force : bool, optional
+        Regenerate the module even if one exists that fits the current solution.
+    verbose : bool, optional
+        Print messages.
+
+    Returns
+    -------
+    module
+        The generated module
+    """
+
+    st = time.time()
+
+    if not hasattr(self, 'precalc_mat'):
+        self.get_sys(verbose=verbose)
+
+    if not force and kernels_fit(self):
+        self.kernels_fit = True
+        return get_kernels(self)
+
+    src, masks = gen_src(self, max_unroll=max_unroll)
+    key = hashlib.sha1(src.encode()).hexdigest()[:16]
+
+    masks['src'] = src
+    masks['key'] = key
+    self.fdict['kernels'] = masks
+    self.kernels_fit = True
+
+    module = load_kernels(self, key, src)
+
+    if verbose:
+        print('[gen_kernels:]'.ljust(15, ' ') + ' Kernels generated within %ss. Module is %s.' %
+              (np.round(time.time() - st, 3), module.__file__))
+
+    return module
@@ -11,6 +11,7 @@ import scipy.linalg as sl
 import time
 from .engine import preprocess
 from .stats import post_mean
+from .timing import get_timer
 
 try:
     from numpy.core._exceptions import UFuncTypeError as ParafuncError
@@ -36,6 +37,8 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
     """
 
     st = time.time()
+    timer = get_timer(self)
+    tic = timer.tic()
 
     reduce_sys = reduce_sys if reduce_sys is not None else self.fdict.get(
         'reduce_sys')
@@ -79,8 +82,8 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
     if not self.const_var:
         raise NotImplementedError('Package is only meant to work with OBCs')
 
-    vv_v = np.array([v.name for v in self.variables])
-    vv_x = np.array(self.variables)
+    vv_v = np.array(self.var_names)
+    vv_x = np.array(self.var_names)
 
     dim_v = len(vv_v)
 
@@ -93,6 +96,8 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
     # define transition shocks -> state
     D = self.PSI(ppar)
 
+    tic = timer.toc('matrices', tic)
+
     # mask those vars that are either forward looking or part of the constraint
     in_x = ~fast0(AA, 0) | ~fast0(bb[:dim_v])
 
@@ -109,7 +114,7 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
 
     P = np.block([[-A1, -BB], [np.zeros((dim_x, dim_x)), np.eye(dim_v)[in_x]]])
 
-    c_arg = list(vv_x2).index(self.const_var)
+    c_arg = list(vv_x2).index(str(self.const_var))
 
     # c contains information on how the constraint var affects the system
     c1 = N[:, c_arg]
@@ -128,6 +133,8 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
     OME = re_bk(M1, P1, d_endo=dim_x)
     J = np.hstack((np.eye(dim_x), -OME))
 
+    tic = timer.toc('qz', tic)
+
     # desingularization of P
     U, s, V = nl.svd(P1)
 
@@ -149,8 +156,8 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
         print('[get_sys:]'.ljust(15, ' ') +
               ' determinant of `P` is %1.2e.' % nl.det(P2))
 
-    if 'x_bar' in [p.name for p in self.parameters]:
-        x_bar = par[[p.name for p in self.parameters].index('x_bar')]
+    if 'x_bar' in self.par_names:
+        x_bar = par[self.par_names.index('x_bar')]
     elif 'x_bar' in self.parafunc[0]:
         pf = self.parafunc
         x_bar = pf[1](par)[pf[0].index('x_bar')]
@@ -191,7 +198,7 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
 
     # add everything to the DSGE object
     self.vv = vv_v[~s_out_msk]
-    self.vx = np.array([v.name for v in vv_x3])
+    self.vx = vv_x3
     self.dim_x = dim_x
     self.dim_v = len(self.vv)
 
@@ -210,7 +217,9 @@ def get_sys(self, par=None, reduce_sys=None, l_max=None, k_max=None, linear=Fals
         print('[get_sys:]'.ljust(15, ' ')+' Creation of system matrices finished in %ss.'
               % np.round(time.time() - st, 3))
 
+    tic = timer.toc('desingularise', tic)
     preprocess(self, self.lks[0], self.lks[1], verbose)
+    timer.toc('preprocess', tic)
 
     if not ignore_tests:
         test_obj = self.precalc_mat[0][1, 0, 1]
@@ -305,8 +314,8 @@ def prior_sampler(self, nsamples, seed=0, test_lprob=False, lks=None, verbose=Tr
         from .estimation import create_pool
         create_pool(self)
 
-    set_par = serializer(self.set_par)
-    get_par = serializer(self.get_par)
+    msnap = self.snapshot()
+    set_par = serializer(msnap.set_par)
     lprob = serializer(self.lprob) if test_lprob else None
 
     def runner(locseed):
@@ -587,8 +596,6 @@ def set_par(self, dummy=None, setpar=None, npar=None, verbose=False, roundto=5,
         if self.filter.name == 'KalmanFilter':
             CO = self.SIG @ self.filter.eps_cov
             Q = CO @ CO.T
-        elif self.filter.name == 'ParticleFilter':
-            raise NotImplementedError
         else:
             Q = self.QQ(self.ppar) @ self.QQ(self.ppar)
 
@@ -5,6 +5,7 @@ import numpy as np
 import numpy.linalg as nl
 import time
 from .parser import DSGE as dsge
+from .codegen import get_kernels, kernels_fit
 from numba import njit
 
 aca = np.ascontiguousarray
@@ -96,6 +97,13 @@ def preprocess(self, l_max, k_max, verbose):
     st = time.time()
     self.precalc_mat = preprocess_jit(self.sys, l_max, k_max)
 
+    if 'kernels' in self.fdict:
+        # generated kernels can only be used as long as the sparsity pattern holds
+        self.kernels_fit = kernels_fit(self)
+        if verbose and not self.kernels_fit:
+            print('[preprocess:]'.ljust(
+                15, ' ')+' Solution does not fit the generated kernels, using generic kernels.')
+
     if verbose:
         print('[preprocess:]'.ljust(
             15, ' ')+' Preproceccing finished within %ss.' % np.round((time.time() - st), 3))
@@ -115,6 +123,12 @@ def bLL_jit(l, k, s, v, bmat, bterm):
     return bmat[l, k, s] @ v + bterm[l, k, s]
 
 
+@njit(nogil=True, cache=True)
+def tLL_jit(l, k, v, mat, term, dim_x):
+
+    return mat[l, k, 1, dim_x:] @ v + term[l, k, 1, dim_x:]
+
+
 @njit(nogil=True, cache=True)
 def boehlgorithm_jit(N, A, J, cx, b, x_bar, v, mat, term, bmat, bterm, max_cnt):
 
@@ -150,7 +164,7 @@ def boehlgorithm_jit(N, A, J, cx, b, x_bar, v, mat, term, bmat, bterm, max_cnt):
     # either l or k must be > 0
     if not k:
         l = 1
-    v_new = (mat[l, k, 1] @ v + term[l, k, 1])[J.shape[0]:]
+    v_new = tLL_jit(l, k, v, mat, term, J.shape[0])
 
     return v_new, (l, k), flag
 
@@ -181,6 +195,18 @@ def bruite_wrapper(b, x_bar, v, mat, term):
     return 999, 999
 
 
+@njit(nogil=True, cache=True)
+def boehlgorithm_batch_jit(N, A, J, cx, b, x_bar, V, mat, term, bmat, bterm, max_cnt, out, flags):
+    """Apply the transition to each row of V. Writes the new states to `out` and the error flags to `flags`
+    """
+
+    for i in range(V.shape[0]):
+        v_new, _, flag = boehlgorithm_jit(
+            N, A, J, cx, b, x_bar, V[i], mat, term, bmat, bterm, max_cnt)
+        out[i] = v_new
+        flags[i] = flag
+
+
 def boehlgorithm(self, v, max_cnt=4e1, linear=False):
 
     if not linear:
@@ -192,7 +218,10 @@ def boehlgorithm(self, v, max_cnt=4e1, linear=False):
         mat, term, bmat, bterm = self.precalc_mat
         N, A, J, cx, b, x_bar = self.sys
 
-        return boehlgorithm_jit(N, A, J, cx, b, x_bar, v, mat, term, bmat, bterm, max_cnt)
+        kern = get_kernels(self)
+        bfunc = kern.boehlgorithm_jit if kern else boehlgorithm_jit
+
+        return bfunc(N, A, J, cx, b, x_bar, v, mat, term, bmat, bterm, max_cnt)
 
     else:
 
@@ -204,6 +233,32 @@ def boehlgorithm(self, v, max_cnt=4e1, linear=False):
         return (self.precalc_mat[0][1, 0, 1] @ v)[dim_x:], (0, 0), 0
 
 
+def batch_dispatch(self, max_cnt=4e1):
+    """Transition function for a whole ensemble. Returns a function `t_func_batch(X, noise, out, flags)` that moves each row of X (with shocks `noise`) one period ahead and writes the result to `out`, using a single call of the nopython kernel
+    """
+
+    if not hasattr(self, 'precalc_mat'):
+        self.preprocess(verbose=False)
+
+    mat, term, bmat, bterm = self.precalc_mat
+    N, A, J, cx, b, x_bar = self.sys
+    x2eps = aca(self.SIG.T)
+
+    # kernel modules generated by earlier versions do not contain the batched kernel
+    kern = get_kernels(self)
+    bfunc = getattr(kern, 'boehlgorithm_batch_jit', boehlgorithm_batch_jit)
+
+    def t_func_batch(X, noise, out, flags):
+
+        V = X + noise @ x2eps
+        bfunc(N, A, J, cx, b, x_bar, V, mat, term,
+              bmat, bterm, max_cnt, out, flags)
+
+        return out, flags
+
+    return t_func_batch
+
+
 def func_dispatch(self, full=False, max_cnt=4e1, njit_t_func=True):
 
     if not hasattr(self, 'precalc_mat'):
@@ -213,9 +268,12 @@ def func_dispatch(self, full=False, max_cnt=4e1, njit_t_func=True):
     mat, term, bmat, bterm = self.precalc_mat
     N, A, J, cx, b, x_bar = self.sys
     x2eps = self.SIG
-    hx0 = np.ascontiguousarray(self.hx[0].astype(float).T)
     hx1 = self.hx[1]
 
+    # use the model-specific kernels if available
+    kern = get_kernels(self)
+    bfunc = kern.boehlgorithm_jit if kern else boehlgorithm_jit
+
     def t_func_jit(state, noise=np.zeros(self.ny)):
 
         newstate = state.copy()
@@ -223,8 +281,8 @@ def func_dispatch(self, full=False, max_cnt=4e1, njit_t_func=True):
         if full:
             newstate += x2eps @ noise
 
-        res = boehlgorithm_jit(N, A, J, cx, b, x_bar,
-                               newstate, mat, term, bmat, bterm, max_cnt)
+        res = bfunc(N, A, J, cx, b, x_bar,
+                    newstate, mat, term, bmat, bterm, max_cnt)
         return res[0], res[2]
 
     if njit_t_func:
@@ -239,10 +297,21 @@ def func_dispatch(self, full=False, max_cnt=4e1, njit_t_func=True):
         def get_eps_jit(x, xp):
             return (x - t_func_jit(xp, noise0)[0]) @ x2eps
 
-        @njit
-        def o_func_jit(state):
-            s = np.ascontiguousarray(state)
-            return s @ hx0 + hx1
+        if kern:
+            hx0 = np.ascontiguousarray(self.hx[0].astype(float))
+            oLL_batch_jit = kern.oLL_batch_jit
+
+            @njit
+            def o_func_jit(state):
+                return oLL_batch_jit(np.ascontiguousarray(state), hx0, hx1)
+
+        else:
+            hx0 = np.ascontiguousarray(self.hx[0].astype(float).T)
+
+            @njit
+            def o_func_jit(state):
+                s = np.ascontiguousarray(state)
+                return s @ hx0 + hx1
 
         self.o_func_jit = o_func_jit
         self.get_eps_jit = get_eps_jit
@@ -8,8 +8,25 @@ import pathos
 import time
 import tqdm
 from .stats import get_prior
-from .filtering import get_ll
+from .filtering import get_ll, get_Z
 from .core import get_par, set_par
+from .timing import get_timer
+from .kalman import batch_ll
+
+
+class PreFuncError(RuntimeError):
+    """Raised if the `pre_func` hook of `prep_estim` does not work on the model snapshot
+    """
+
+
+def call_pre_func(pre_func, mod):
+    """Call the `pre_func` hook of `prep_estim`. Attribute errors most likely stem from hooks that rely on the `DSGE` object and would otherwise silently make every draw -inf
+    """
+
+    try:
+        pre_func(mod)
+    except AttributeError as err:
+        raise PreFuncError('[estimation:]'.ljust(15, ' ') + ' `pre_func` failed on the model snapshot: %s' % err) from err
 
 
 def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=False, dispatch=False, ncores=None, reduce_sys=True, l_max=3, k_max=16, pre_func=None, verbose=True, debug=False, **filterargs):
@@ -29,6 +46,8 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
         Random seed. Defaults to 0
     dispatch : bool, optional
         Whether to use a dispatcher to create jitted transition and observation functions. Defaults to False.
+    pre_func : callable, optional
+        Function that is called before each evaluation of the likelihood. Note that, unlike in earlier versions, it receives the numeric model snapshot that evaluates the likelihood (see `pydsge.snapshot.Snapshot`) and not the `DSGE` object, which does not follow the evaluated parameters. The snapshot provides the current parameters (`par`, `ppar`, `get_par`), the solution (`sys`, `hx`, `SIG`, ...), the data, the filter and `vix`, `oix`, `box_check` and `create_obs_cov`, but no symbolic objects. An `AttributeError` raised by `pre_func` is not treated as an invalid parameter draw but raised.
     verbose : bool/int, optional
         Whether display messages:
             0 - no messages
@@ -109,7 +128,10 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
             print('[estimation:]'.ljust(
                 15, ' ') + ' %s priors detected. Adding parameters to the prior distribution.' % self.ndim)
 
-    def llike(parameters, par_fix, linear, verbose, seed):
+    # the likelihood only works on a numeric snapshot of the model, which is much cheaper to send to workers
+    mod = self.snapshot()
+
+    def llike(parameters, par_fix, linear, verbose, seed, noise=None):
 
         random_state = np.random.get_state()
         with warnings.catch_warnings(record=True):
@@ -122,33 +144,34 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
                 par_active_lst = list(par_fix)
 
                 if not linear:
-                    if self.filter.name == 'KalmanFilter':
+                    if mod.filter.name == 'KalmanFilter':
                         raise AttributeError('[estimation:]'.ljust(
                             15, ' ') + 'Missmatch between linearity choice (filter vs. lprob)')
                     # these max vals should be sufficient given we're dealing with stochastic linearization
                     # the get_sys and following part replicates call to set_par, redundant
-                    self.get_sys(par=par_active_lst, l_max=l_max, k_max=k_max,
-                                 reduce_sys=True, verbose=verbose > 3)
-                    self.filter.Q = self.QQ(self.ppar) @ self.QQ(self.ppar)
+                    mod.get_sys(par=par_active_lst, l_max=l_max, k_max=k_max,
+                                reduce_sys=True, verbose=verbose > 3)
+                    mod.filter.Q = mod.QQ(mod.ppar) @ mod.QQ(mod.ppar)
                 else:
-                    if not self.filter.name == 'KalmanFilter':
+                    if not mod.filter.name == 'KalmanFilter':
                         raise AttributeError('[estimation:]'.ljust(
                             15, ' ') + 'Missmatch between linearity choice (filter vs. lprob)')
                     # the get_sys and following part replicates call to set_par, redundant
-                    self.get_sys(par=par_active_lst, linear=True,
-                                 reduce_sys=True, verbose=verbose > 3)
-                    CO = self.SIG @ self.QQ(self.ppar)
-                    self.filter.Q = CO @ CO.T
+                    mod.get_sys(par=par_active_lst, linear=True,
+                                reduce_sys=True, verbose=verbose > 3)
+                    CO = mod.SIG @ mod.QQ(mod.ppar)
+                    mod.filter.Q = CO @ CO.T
 
                 if pre_func is not None:
-                    pre_func(self)
+                    call_pre_func(pre_func, mod)
 
-                ll = get_ll(self, verbose=verbose > 3, dispatch=dispatch)
+                ll = get_ll(mod, verbose=verbose > 3,
+                            dispatch=dispatch, noise=noise)
 
                 np.random.set_state(random_state)
                 return ll
 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, PreFuncError):
                 raise
 
             except Exception as err:
@@ -156,9 +179,9 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
                     print('[llike:]'.ljust(15, ' ') +
                           ' Failure. Error msg: %s' % err)
                     if verbose > 1:
-                        pardict = get_par(self, full=False, asdict=True)
+                        pardict = get_par(mod, full=False, asdict=True)
                         print(pardict)
-                        self.box_check([*pardict.values()])
+                        box_check(mod, [*pardict.values()])
 
                 np.random.set_state(random_state)
                 return -np.inf
@@ -166,16 +189,22 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
     def lprior(par):
 
         prior = 0
-        for i, pl in enumerate(self.fdict['frozen_prior']):
+        for i, pl in enumerate(mod.fdict['frozen_prior']):
             prior += pl.logpdf(par[i])
 
         return prior
 
     linear_pa = linear
 
-    def lprob(par, par_fix=par_fix, linear=None, verbose=verbose > 1, temp=1, lprob_seed='set'):
+    timer = get_timer(self)
 
+    def lprob(par, par_fix=par_fix, linear=None, verbose=verbose > 1, temp=1, lprob_seed='set', noise=None):
+        """Posterior log-density. If the random numbers of the filter are given (`noise`, see `draw_noise` of the filters), these are used and `lprob_seed` is ignored
+        """
+
+        tic = timer.tic()
         lp = lprior(par)
+        timer.toc('prior', tic)
 
         if np.isinf(lp):
             if verbose:
@@ -201,7 +230,8 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
             raise NotImplementedError(
                 "`lprob_seed` must be one of `('vec', 'rand', 'set')`.")
 
-        ll = llike(par, par_fix, linear, verbose, seed_loc)*temp if temp else 0
+        ll = llike(par, par_fix, linear, verbose, seed_loc,
+                   noise)*temp if temp else 0
 
         if np.isinf(ll):
             return ll
@@ -214,8 +244,99 @@ def prep_estim(self, N=None, linear=None, load_R=False, seed=None, eval_priors=F
 
         return ll
 
+    def llike_batch(pars, par_fix, verbose):
+        """Log-likelihoods of the linear model for a stack of parameter vectors. The systems are build one after the other, then all filters run in one call of `kalman.batch_ll`
+        """
+
+        if not mod.filter.name == 'KalmanFilter':
+            raise AttributeError('[estimation:]'.ljust(
+                15, ' ') + 'Batched evaluation of the likelihood requires the Kalman filter (`linear=True`)')
+
+        n = len(pars)
+        dim_x, dim_z = len(mod.vv), mod.ny
+        F = np.zeros((n, dim_x, dim_x))
+        Q = np.zeros((n, dim_x, dim_x))
+        H = np.zeros((n, dim_z, dim_x))
+        d = np.zeros((n, dim_z))
+        R = np.zeros((n, dim_z, dim_z))
+        failed = np.zeros(n, dtype=bool)
+
+        with warnings.catch_warnings(record=True):
+            warnings.filterwarnings('error')
+
+            for i, parameters in enumerate(pars):
+                try:
+                    par_fix[prior_arg] = parameters
+                    mod.get_sys(par=list(par_fix), linear=True,
+                                reduce_sys=True, verbose=verbose > 3)
+
+                    if pre_func is not None:
+                        call_pre_func(pre_func, mod)
+
+                    CO = mod.SIG @ mod.QQ(mod.ppar)
+                    F[i] = mod.lin_t_func
+                    Q[i] = CO @ CO.T
+                    H[i], d[i] = mod.lin_o_func
+                    R[i] = mod.filter.R
+
+                except (KeyboardInterrupt, PreFuncError):
+                    raise
+
+                except Exception as err:
+                    failed[i] = True
+                    if verbose:
+                        print('[llike:]'.ljust(15, ' ') +
+                              ' Failure. Error msg: %s' % err)
+
+        # same initial covariance as the filter of `lprob`. The unconditional covariances if not set
+        P0 = None
+        if mod.filter.P is not None:
+            P0 = np.tile(np.asarray(mod.filter.P, dtype=float), (n, 1, 1))
+
+        tic = timer.tic()
+        Z = get_Z(mod)
+        ll, failed = batch_ll(Z, F, Q, H, d, R, P0=P0, failed=failed,
+                              ss_tol=getattr(mod.filter, 'ss_tol', 1e-10))
+
+        dt = (timer.tic() - tic)/n
+        for _ in range(n):
+            timer.add('filter', dt)
+            timer.add('filter_period', dt/len(Z))
+
+        return ll
+
+    def lprob_batch(pars, par_fix=par_fix, linear=None, verbose=verbose > 1, temp=1, lprob_seed='set'):
+        """Posterior log-density for a stack of parameter vectors (shape (n, ndim)). Returns an array of shape (n,).
+
+        For the linear model, all likelihoods are evaluated in lockstep by a single nopython kernel. Otherwise, `lprob` is evaluated for each vector within the calling process.
+        """
+
+        if linear is None:
+            linear = linear_pa
+
+        pars = np.array(pars, dtype=float).reshape(-1, len(prior_arg))
+
+        if not linear:
+            return np.array([lprob(p, par_fix=par_fix, linear=linear, verbose=verbose, temp=temp, lprob_seed=lprob_seed) for p in pars])
+
+        lps = np.empty(len(pars))
+        for i, p in enumerate(pars):
+            # per candidate, such that the counts match those of the filter
+            tic = timer.tic()
+            lps[i] = lprior(p)
+            timer.toc('prior', tic)
+
+        res = lps.copy()
+        valid = ~np.isinf(lps)
+
+        if temp and valid.any():
+            res[valid] += llike_batch(pars[valid], par_fix, verbose)*temp
+
+        return res
+
     # make functions accessible
     self.lprob = lprob
+    self.lprob_batch = lprob_batch
     self.lprior = lprior
     self.llike = llike
 
@@ -241,6 +362,9 @@ def create_pool(self, ncores=None, threadpool_limit=None):
 
     import pathos
 
+    # the timer must exist before the workers are forked to collect their timings
+    get_timer(self)
+
     if hasattr(self, 'pool'):
         ncores = ncores or self.pool.ncpus
         self.pool.close()
@@ -266,6 +390,37 @@ def create_pool(self, ncores=None, threadpool_limit=None):
     return self.pool
 
 
+class BatchMapper(object):
+    """Drop-in replacement for a mapper (or a pool with a `map` method) that evaluates a batched function on chunks of the candidates instead of calling a function once per candidate.
+
+    `func_batch` takes an array of candidates and returns an array of results. The candidates are split into `nchunks` chunks, which are distributed using `mapper`. The function passed when mapping is ignored.
+    """
+
+    def __init__(self, func_batch, mapper=map, nchunks=1):
+
+        self.func_batch = func_batch
+        self.mapper = mapper
+        self.nchunks = nchunks
+
+    def __call__(self, func, X):
+
+        X = np.array(list(X))
+        chunks = np.array_split(X, min(self.nchunks, len(X)))
+
+        return list(np.hstack(list(self.mapper(self.func_batch, chunks))))
+
+    map = __call__
+
+
+def batch_mapper(self, func_batch):
+    """A `BatchMapper` that distributes `func_batch` over the pool, with one chunk per core
+    """
+
+    nchunks = self.pool.ncpus if getattr(self, 'pool', None) and not self.debug else 1
+
+    return BatchMapper(func_batch, self.mapper, nchunks)
+
+
 @property
 def mapper(self):
 
@@ -6,12 +6,23 @@ import pandas as pd
 from .core import time
 from grgrlib.core import timeprint
 from econsieve.stats import logpdf
+from .timing import get_timer
+
+
+def get_Z(self):
+    """The data as an array. The array is cached as long as `self.data` is the same object, such that assigning new data to `self.data` is picked up
+    """
+
+    if getattr(self, '_Z_data', None) is not self.data or not hasattr(self, 'Z'):
+        self.Z = np.array(self.data)
+        self._Z_data = self.data
+
+    return self.Z
 
 
 def create_obs_cov(self, scale_obs=0.1):
 
-    self.Z = np.array(self.data)
-    sig_obs = np.var(self.Z, axis=0)*scale_obs**2
+    sig_obs = np.var(get_Z(self), axis=0)*scale_obs**2
     obs_cov = np.diagflat(sig_obs)
 
     return obs_cov
@@ -19,7 +30,7 @@ def create_obs_cov(self, scale_obs=0.1):
 
 def create_filter(self, P=None, R=None, N=None, ftype=None, seed=None, **fargs):
 
-    self.Z = np.array(self.data)
+    get_Z(self)
 
     if ftype == 'KalmanFilter':
         ftype = 'KF'
@@ -27,12 +38,20 @@ def create_filter(self, P=None, R=None, N=None, ftype=None, seed=None, **fargs):
         ftype = 'PF'
     if ftype == 'AuxiliaryParticleFilter':
         ftype = 'APF'
+    if ftype == 'UnscentedKalmanFilter':
+        ftype = 'UKF'
+    if ftype == 'CubatureKalmanFilter':
+        ftype = 'CKF'
+    if ftype == 'PiecewiseKalmanFilter':
+        ftype = 'PKF'
+    if ftype == 'InversionFilter':
+        ftype = 'IF'
 
     if ftype == 'KF':
 
-        from econsieve import KalmanFilter
+        from .kalman import KalmanFilter
 
-        f = KalmanFilter(dim_x=len(self.vv), dim_z=self.ny)
+        f = KalmanFilter(dim_x=len(self.vv), dim_z=self.ny, **fargs)
 
     elif ftype in ('PF', 'APF'):
 
@@ -42,13 +61,33 @@ def create_filter(self, P=None, R=None, N=None, ftype=None, seed=None, **fargs):
             N = 10000
 
         aux_bs = ftype == 'APF'
-        f = ParticleFilter(N=N, dim_x=len(self.vv),
-                           dim_z=self.ny, auxiliary_bootstrap=aux_bs)
+        f = ParticleFilter(N=N, dim_x=len(self.vv), dim_z=self.ny,
+                           seed=seed, auxiliary_bootstrap=aux_bs, **fargs)
+
+    elif ftype in ('UKF', 'CKF'):
+
+        from .ukf import UKF
+
+        if ftype == 'CKF':
+            fargs['rule'] = 'cubature'
+        f = UKF(dim_x=len(self.vv), dim_z=self.ny, **fargs)
+
+    elif ftype == 'PKF':
+
+        from .pwlkf import PiecewiseKalmanFilter
+
+        f = PiecewiseKalmanFilter(dim_x=len(self.vv), dim_z=self.ny, **fargs)
+
+    elif ftype == 'IF':
+
+        from .invfilt import InversionFilter
+
+        f = InversionFilter(dim_x=len(self.vv), dim_z=self.ny, **fargs)
 
     else:
         ftype = 'TEnKF'
 
-        from econsieve import TEnKF
+        from .tenkf import TEnKF
 
         if N is None:
             N = 500
@@ -58,7 +97,8 @@ def create_filter(self, P=None, R=None, N=None, ftype=None, seed=None, **fargs):
         f.P = P
     elif hasattr(self, 'P'):
         f.P = self.P
-    else:
+    elif ftype != 'KF':
+        # the Kalman filter uses the unconditional covariance by default
         f.P *= 1e1
     f.init_P = f.P
 
@@ -81,18 +121,25 @@ def get_ll(self, **args):
     return run_filter(self, smoother=False, get_ll=True, **args)
 
 
-def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, verbose=False):
+def filter_toc(timer, tic, nperiods):
+    """Record the filtering time, both in total and per period
+    """
 
-    if verbose:
-        st = time.time()
+    now = timer.tic()
+    timer.add('filter', now - tic)
+    timer.add('filter_period', (now - tic)/nperiods)
 
-    self.Z = np.array(self.data)
+    return now
+
+
+def filter_setup(self, dispatch=None, rcond=1e-14):
+    """Assign the latest transition & observation functions (of parameters) to the filter
+    """
 
-    # assign latest transition & observation functions (of parameters)
     if self.filter.name == 'KalmanFilter':
         self.filter.F = self.lin_t_func
         self.filter.H = self.lin_o_func
-    elif dispatch or self.filter.name == 'ParticleFilter':
+    elif dispatch:
         from .engine import func_dispatch
         t_func_jit, o_func_jit, get_eps_jit = func_dispatch(self, full=True)
         self.filter.t_func = t_func_jit
@@ -103,10 +150,61 @@ def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, ve
         self.filter.o_func = self.o_func
     self.filter.get_eps = self.get_eps_lin
 
+    if hasattr(self.filter, 't_func_batch'):
+        # the native TEnKF moves the whole ensemble at once
+        from .engine import batch_dispatch
+        self.filter.t_func_batch = batch_dispatch(self)
+        self.filter.H = np.asarray(self.hx[0], dtype=float), self.hx[1]
+        # for the compiled shock inversion of `npas`
+        self.filter.eps_lin = np.ascontiguousarray(self.lin_t_func, dtype=float), np.linalg.pinv(
+            np.asarray(self.SIG, dtype=float), rcond)
+
+    if self.filter.name in ('PiecewiseKalmanFilter', 'InversionFilter'):
+        # works on the matrices of the regimes directly
+        self.filter.precalc_mat = self.precalc_mat
+        self.filter.sys = self.sys
+        self.filter.SIG = self.SIG
+        self.filter.H = np.asarray(self.hx[0], dtype=float), self.hx[1]
+
+
+def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, engine=None, noise=None, verbose=False):
+    """Run the filter (and smoother) over the data
+
+    Parameters
+    ----------
+    smoother : bool or int, optional
+        Whether to run the smoother. Defaults to True.
+    get_ll : bool, optional
+        Return the log-likelihood instead of the filtered/smoothed states. Defaults to False.
+    dispatch : bool, optional
+        Use the jitted transition and observation functions for the ensemble filters.
+    rcond : float, optional
+        Cutoff for small singular values in the smoother of the TEnKF.
+    engine : str, optional
+        Covariance recursion of the Kalman filter ('standard', 'chandrasekhar' or 'sqrt'). Defaults to the engine of the filter. Ignored for other filters.
+    noise : dict, optional
+        Random numbers of the TEnKF or particle filter (see `draw_noise` of the filters). Drawn from the random state if not given.
+    verbose : bool, optional
+    """
+
+    if verbose:
+        st = time.time()
+
+    timer = get_timer(self)
+    tic = timer.tic()
+
+    # only converts the data if it changed since the last call
+    get_Z(self)
+
+    filter_setup(self, dispatch, rcond)
+    tic = timer.toc('filter_setup', tic)
+
     if self.filter.name == 'KalmanFilter':
 
-        means, covs, ll = self.filter.batch_filter(self.Z)
+        means, covs, ll = self.filter.batch_filter(
+            self.Z, store=smoother or not get_ll, engine=engine)
         res = (means, covs)
+        tic = filter_toc(timer, tic, len(self.Z))
 
         if get_ll:
             res = ll
@@ -115,10 +213,13 @@ def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, ve
             means, covs, _, _ = self.filter.rts_smoother(
                 means, covs, inv=np.linalg.pinv)
             res = (means, covs)
+            timer.toc('smoother', tic)
 
     elif self.filter.name == 'ParticleFilter':
 
-        res = self.filter.batch_filter(self.Z)
+        res = self.filter.batch_filter(
+            self.Z, calc_ll=get_ll, store=bool(smoother), noise=noise, verbose=verbose > 0)
+        tic = filter_toc(timer, tic, len(self.Z))
 
         if smoother:
 
@@ -129,14 +230,17 @@ def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, ve
             if isinstance(smoother, bool):
                 smoother = 10
             res = self.filter.smoother(smoother)
+            timer.toc('smoother', tic)
 
     else:
 
         res = self.filter.batch_filter(
-            self.Z, calc_ll=get_ll, store=smoother, verbose=verbose > 0)
+            self.Z, calc_ll=get_ll, store=smoother, noise=noise, verbose=verbose > 0)
+        tic = filter_toc(timer, tic, len(self.Z))
 
         if smoother:
             res = self.filter.rts_smoother(res, rcond=rcond)
+            timer.toc('smoother', tic)
 
     if get_ll:
         if np.isnan(res):
@@ -156,7 +260,181 @@ def run_filter(self, smoother=True, get_ll=False, dispatch=None, rcond=1e-14, ve
     return res
 
 
-def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, accept_failure=False, verbose=True, debug=False, l_max=None, k_max=None, **npasargs):
+def advance_filter(self, Z, state=None, shocks=True):
+    """Run the filter over `Z`, starting from `state` (the filtered state of the period before `Z`, a dict as stored by `update_filter`) or from the initial conditions of the filter if `state` is None.
+
+    Returns
+    -------
+    state : dict
+        The filtered state after the last period of `Z`
+    ll : float
+        The log-likelihood of `Z`
+    means : array
+        The filtered means
+    covs : array or None
+        The filtered covariances (for the deterministic filters)
+    resid : array or None
+        The shocks. With `state` the shocks of all periods of `Z`, otherwise of all but the first
+    """
+
+    f = self.filter
+    fname = f.name
+    T = len(Z)
+    covs = resid = None
+
+    if fname == 'KalmanFilter':
+
+        x0, P0 = f.x, f.P
+        if state is not None:
+            f.x, f.P = state['x'], state['P']
+        try:
+            means, covs, ll = f.batch_filter(Z, store=True)
+        finally:
+            f.x, f.P = x0, P0
+
+        # the shocks are a recursion over the states that they imply, which is carried along
+        path = means if state is None else np.vstack((state['x_lin'], means))
+        res, resid = self.extract_lin(path)
+        new_state = {'x': means[-1], 'P': covs[-1], 'x_lin': res[-1]}
+
+    elif fname in ('UKF', 'PiecewiseKalmanFilter', 'InversionFilter'):
+
+        x0, P0 = f.x, f.P
+        if state is not None:
+            f.x, f.P = state['x'], state['P']
+        try:
+            means, covs = f.batch_filter(Z)
+        finally:
+            f.x, f.P = x0, P0
+        ll = f.ll
+
+        if fname == 'InversionFilter':
+            if means is None:
+                raise ValueError('[update_filter:]'.ljust(15, ' ') + ' The shocks cannot be recovered from the observables.')
+            # the states are exact given the data, the shocks come with the filter
+            resid = covs if state is not None else covs[1:]
+            covs = None
+            new_state = {'x': means[-1], 'P': P0}
+        else:
+            new_state = {'x': means[-1], 'P': covs[-1]}
+
+    elif fname == 'TEnKF':
+
+        init_states = seed = None
+        if state is not None:
+            init_states = state['X'].T
+            # new draws for each update that only depend on the seed and the period
+            if f.seed is not None:
+                seed = f.seed + state['t']
+
+        X = f.batch_filter(Z, init_states=init_states, seed=seed)
+        ll = f.ll
+        means = X.mean(axis=0)
+        new_state = {'X': X[:, -1].copy()}
+
+        if shocks:
+            path = X if state is None else np.concatenate((state['X'][:, None], X), axis=1)
+            resid = f.npas(X=path, get_eps=self.get_eps_lin, nsamples=1, verbose=False)[2][0]
+
+    else:
+        raise NotImplementedError('[update_filter:]'.ljust(15, ' ') + ' Online updates are not implemented for the %s.' % fname)
+
+    new_state['t'] = T if state is None else state['t'] + T
+    new_state['ll'] = ll if state is None else state['ll'] + ll
+
+    return new_state, ll, means, covs, resid
+
+
+def update_filter(self, df, shocks=True, dispatch=None, rcond=1e-14, verbose=False):
+    """Online update: append new observations to the data and advance the filter over the new periods only.
+
+    The filtered state after the last period (the mean and covariance, or the ensemble of the TEnKF) is kept in `self.filter_state` together with the cumulative log-likelihood. Each update then costs O(new periods) instead of O(T). If there is no valid state (at the first call, or if the parameters, the filter or the data were changed in between), the filter is first run over the data that is already loaded.
+
+    The states and shocks are filtered, not smoothed, estimates: they are conditional on the data up to the respective period. For the Kalman filter, the shocks are those of `extract_lin`, for the inversion filter they come with the filter, and for the TEnKF they are obtained by `npas` on the filtered ensembles. The UKF and the piecewise-linear Kalman filter do not provide shocks. The TEnKF draws the random numbers of each update with its seed plus the number of periods already filtered, so the updated likelihood is reproducible but (as for the noise of any other seed) not identical to that of a single run over the full sample.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The new observations. Only rows with an index after the last period of `self.data` are used, so the full updated dataset can be passed as well.
+    shocks : bool, optional
+        Whether to extract the shocks of the new periods. Defaults to True.
+    dispatch : bool, optional
+        Use the jitted transition and observation functions for the ensemble filters.
+    rcond : float, optional
+        Cutoff for small singular values of the shock inversion.
+    verbose : bool, optional
+
+    Returns
+    -------
+    dict
+        The log-likelihood of the full sample (`ll`) and of the new periods (`ll_new`), the filtered means (`means`) and covariances (`covs`) of the new periods and the shocks (`resid`). As for `extract`, the shock that moves the state of one period to the next is indexed by the earlier period, such that the shocks of the new periods start at the last period of the old data.
+    """
+
+    if verbose:
+        st = time.time()
+
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError('Type of input data must be a `pandas.DataFrame`.')
+
+    for o in self.observables:
+        if str(o) not in df.keys():
+            raise KeyError('%s is not in the data!' % o)
+
+    timer = get_timer(self)
+    tic = timer.tic()
+
+    filter_setup(self, dispatch, rcond)
+    tic = timer.toc('filter_setup', tic)
+
+    f = self.filter
+    state = getattr(self, 'filter_state', None)
+    # the state is only valid for the same filter, parameters and data
+    if state is not None and not (state['filter'] is f and state['t'] == len(self.data) and np.array_equal(state['par'], self.par) and np.array_equal(state['R'], f.R)):
+        state = None
+
+    if state is None:
+        if verbose:
+            print('[update_filter:]'.ljust(15, ' ') + ' No valid filter state, filtering the %s periods of the loaded data first.' % len(self.data))
+
+        state = advance_filter(self, np.array(self.data, dtype=float), shocks=False)[0]
+        tic = filter_toc(timer, tic, len(self.data))
+
+    new = df[self.observables].loc[df.index > self.data.index[-1]]
+    Z = np.array(new, dtype=float)
+
+    if len(new):
+        state, ll_new, means, covs, resid = advance_filter(
+            self, Z, state, shocks)
+        filter_toc(timer, tic, len(new))
+
+        import cloudpickle as cpickle
+        self.data = pd.concat((self.data, new))
+        get_Z(self)
+        self.fdict['data'] = cpickle.dumps(self.data, protocol=4)
+
+        means = pd.DataFrame(means, index=new.index, columns=self.vv)
+        if resid is not None:
+            resid = pd.DataFrame(
+                resid, index=self.data.index[-len(new)-1:-1], columns=self.shocks)
+    else:
+        ll_new, means, covs, resid = 0., None, None, None
+
+    state.update({'filter': f, 'par': np.copy(self.par), 'R': np.copy(f.R)})
+    self.filter_state = state
+    self.ll = state['ll']
+
+    if verbose:
+        print('[update_filter:]'.ljust(15, ' ') + ' %s new period(s) done in %s. Likelihood is %s.' %
+              (len(new), timeprint(time.time()-st, 3), self.ll))
+
+    return {'ll': state['ll'],
+            'll_new': ll_new,
+            'means': means,
+            'covs': covs,
+            'resid': resid}
+
+
+def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, accept_failure=False, verbose=True, debug=False, l_max=None, k_max=None, cov_type='full', cov_rank=None, cov_dtype=None, storage=None, storage_path=None, checkpoint=None, **npasargs):
     """Extract the timeseries of (smoothed) shocks.
 
     Parameters
@@ -167,6 +445,18 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
         Number of `npas`-draws for each element in `sample`. Defaults to 1
     nattemps : int, optional
         Number of attemps per sample to crunch the sample with a different seed. Defaults to 4
+    cov_type : str, optional
+        How the covariances of the states are stored. One of 'full', 'diag' (only the variances), 'lowrank' (a factor of rank `cov_rank`) or 'none'. See `pydsge.tools.compress_covs`. Defaults to 'full'
+    cov_rank : int, optional
+        Rank of the factor for `cov_type='lowrank'`
+    cov_dtype : dtype, optional
+        Data type of the stored covariances, e.g. `np.float32`. Defaults to float
+    storage : str, optional
+        If 'shm' or 'disk', the results are preallocated in shared memory or as memory-mapped files in `storage_path`, and the workers write into them directly. Saves the memory and transfer costs of collecting the results from the pool for large samples. Defaults to None, where results are returned by the workers
+    storage_path : str, optional
+        Directory of the memory-mapped files for `storage='disk'`. Defaults to a fresh temporary directory. The files are not removed, deleting them is up to the caller (the location is given by the `filename` attribute of the returned arrays)
+    checkpoint : str, optional
+        Directory to which every completed sample is written immediately (implies `storage='disk'`). If the directory already contains a checkpoint of the same `sample` and `nsamples`, only the samples that were not completed (including failed ones) are run. Allows to resume long runs after interruptions or failures
 
     Returns
     -------
@@ -177,6 +467,7 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
     import tqdm
     import os
     from grgrlib.core import map2arr, serializer
+    from .tools import compress_covs
 
     if sample is None:
         sample = self.par
@@ -191,9 +482,15 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
         from .estimation import create_pool
         create_pool(self)
 
-    if fname == 'ParticleFilter':
+    if fname in ('ParticleFilter', 'UKF', 'PiecewiseKalmanFilter'):
         raise NotImplementedError
 
+    elif fname == 'InversionFilter':
+        if nsamples > 1:
+            print('[extract:]'.ljust(
+                15, ' ')+' Setting `nsamples` to 1 as the inversion filter is deterministic.')
+        nsamples = 1
+
     elif fname == 'KalmanFilter':
         if nsamples > 1:
             print('[extract:]'.ljust(
@@ -212,20 +509,85 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
     else:
         self.debug |= debug
 
-    set_par = serializer(self.set_par)
-    run_filter = serializer(self.run_filter)
-    t_func = serializer(self.t_func)
-    obs = serializer(self.obs)
-    filter_get_eps = serializer(self.get_eps_lin)
+    msnap = self.snapshot()
+    set_par = serializer(msnap.set_par)
+    run_filter = serializer(msnap.run_filter)
+    obs = serializer(msnap.obs)
+    filter_get_eps = serializer(msnap.get_eps_lin)
+    extract_lin = serializer(msnap.extract_lin)
     edim = len(self.shocks)
     xdim = len(self.vv)
     odim = len(self.observables)
 
     sample = [(x, y) for x in sample for y in range(nsamples)]
 
+    # fails early for invalid options
+    cov_shape = np.shape(compress_covs(
+        np.eye(xdim), cov_type, cov_rank, cov_dtype))
+
+    if checkpoint:
+        storage, storage_path = 'disk', checkpoint
+
+    if storage:
+        from .shared import SharedArrays
+
+        T = len(self.data)
+        shapes = {'means': ((len(sample), T, xdim), float),
+                  'obs': ((len(sample), T, odim), float),
+                  'resid': ((len(sample), T-1, edim), float)}
+        if cov_type != 'none':
+            shapes['covs'] = (len(sample), T) + \
+                cov_shape, cov_dtype or float
+
+        if checkpoint:
+            # bookkeeping of which (parameter, seed) pairs are done
+            shapes['pars'] = (len(sample), np.size(sample[0][0])), float
+            shapes['seeds'] = (len(sample),), int
+            shapes['done'] = (len(sample),), np.int8
+            shapes['flags'] = (len(sample),), float
+
+        out = SharedArrays(shapes, storage=storage, path=storage_path,
+                           prefix=self.name + '_extract', resume=bool(checkpoint))
+
+    todo = list(enumerate(sample))
+
+    if checkpoint:
+        pars_chk = np.array([s[0] for s in sample], dtype=float)
+        seeds_chk = np.array([s[1] for s in sample])
+
+        if out.resumed:
+            if not (np.allclose(out['pars'], pars_chk, equal_nan=True) and np.all(out['seeds'] == seeds_chk)):
+                raise ValueError('[extract:]'.ljust(15, ' ') + " The checkpoint in '%s' was created for a different sample. Use a different directory or remove it." % checkpoint)
+
+            todo = [(i, s) for i, s in todo if not out['done'][i]]
+            if verbose:
+                print('[extract:]'.ljust(15, ' ') + ' Resuming from checkpoint, %s of %s samples are done.' %
+                      (len(sample) - len(todo), len(sample)))
+        else:
+            out.write(slice(None), pars=pars_chk, seeds=seeds_chk, done=0)
+            out.flush()
+
+    def store(i, means, obs, covs, resid, flags):
+
+        covs = compress_covs(covs, cov_type, cov_rank, cov_dtype)
+
+        if not storage:
+            return means, obs, covs, resid, flags
+
+        # write in place and only send back the flags
+        out.write(i, means=means, obs=obs, resid=resid)
+        if covs is not None:
+            out.write(i, covs=covs)
+
+        if checkpoint:
+            out.write(i, flags=np.any(flags), done=1)
+            out.flush()
+
+        return flags
+
     def runner(arg):
 
-        par, seed_loc = arg
+        i, (par, seed_loc) = arg
 
         if par is not None:
             set_par(par, l_max=l_max, k_max=k_max)
@@ -234,14 +596,17 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
 
         if fname == 'KalmanFilter':
             means, covs = res
-            res = means.copy()
-            resid = np.empty((means.shape[0]-1, edim))
+            res, resid = extract_lin(means)
+
+            return store(i, res, obs(res), covs, resid, 0)
 
-            for t, x in enumerate(means[1:]):
-                resid[t] = filter_get_eps(x, res[t])
-                res[t+1] = t_func(res[t], resid[t], linear=True)[0]
+        if fname == 'InversionFilter':
+            # the states are exact given the data, the shocks come with the filter
+            means, resid = res
+            if means is None:
+                raise ValueError('[extract:]'.ljust(15, ' ') + ' The shocks cannot be recovered from the observables.')
 
-            return res, obs(res), covs, resid, 0
+            return store(i, means, obs(means), np.zeros((len(means), xdim, xdim)), resid[1:], 0)
 
         get_eps = filter_get_eps if precalc else None
 
@@ -252,7 +617,7 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
                 means, covs, resid, flags = npas(
                     get_eps=get_eps, verbose=max(len(sample) == 1, verbose-1), seed=seed_loc, nsamples=1, **npasargs)
 
-                return means[0], obs(means[0]), covs, resid[0], flags
+                return store(i, means[0], obs(means[0]), covs, resid[0], flags)
             except Exception as e:
                 ee = e
 
@@ -265,9 +630,24 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
 
     wrap = tqdm.tqdm if (verbose and len(sample) >
                          1) else (lambda x, **kwarg: x)
-    res = wrap(self.mapper(runner, sample), unit=' sample(s)',
-               total=len(sample), dynamic_ncols=True)
-    means, obs, covs, resid, flags = map2arr(res)
+    res = wrap(self.mapper(runner, todo), unit=' sample(s)',
+               total=len(todo), dynamic_ncols=True)
+
+    if checkpoint:
+        list(res)
+        flags = np.array(out['flags'])
+        means, obs, resid = [out[k] for k in ('means', 'obs', 'resid')]
+        covs = out['covs'] if cov_type != 'none' else None
+        out.flush()
+    elif storage:
+        # failed samples remain NaN
+        flags = np.array([np.nan if f is None else f for f in res])
+        means, obs, resid = [out[k] for k in ('means', 'obs', 'resid')]
+        covs = out['covs'] if cov_type != 'none' else None
+        out.release()
+    else:
+        means, obs, covs, resid, flags = map2arr(res)
+        covs = covs if cov_type != 'none' else None
 
     if hasattr(self, 'pool') and self.pool:
         self.pool.close()
@@ -287,6 +667,7 @@ def extract(self, sample=None, nsamples=1, precalc=True, seed=0, nattemps=4, acc
              'obs': obs,
              'covs': covs,
              'resid': resid,
-             'flags': flags}
+             'flags': flags,
+             'cov_type': cov_type}
 
     return edict
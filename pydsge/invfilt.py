@@ -0,0 +1,220 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains an inversion filter that recovers the shocks period by period from the observables
+"""
+
+import numpy as np
+from math import erfc, exp, log, pi, sqrt
+from numba import njit
+from .engine import boehlgorithm_jit
+from .kalman import log2pi
+
+aca = np.ascontiguousarray
+
+
+@njit(cache=True, nogil=True)
+def cond_shocks_jit(G, r, z, Q, R, tol):
+    """Conditional mean of the shocks given the observables z = G e + r (+ measurement error). Directions in which the covariance of the observables is below `tol` (relative to its largest eigenvalue) are dropped. Returns the shocks, the standardized innovations of the remaining directions, the log-determinant of their covariance and the loadings W of the shocks on the innovations (e = W u)
+    """
+
+    S = G @ Q @ aca(G.T) + R
+    w, V = np.linalg.eigh(S)
+    keep = w > tol*max(np.max(w), 1.)
+    sw = np.sqrt(w[keep])
+    Vk = aca(V[:, keep])
+
+    u = (Vk.T @ (z - r))/sw
+    W = Q @ aca(G.T) @ Vk/sw
+
+    return W @ u, u, np.sum(np.log(w[keep])), W
+
+
+@njit(cache=True, nogil=True)
+def inversion_jit(Z, x0, Q, H, d, R, SIG, N, A, J, cx, b, x_bar, mat, term, bmat, bterm, max_cnt, max_iter, tol):
+    """Solve for the shocks of each period given the state of the last period. Within a regime, the observables are affine in the shocks, so the shocks are found by iterating over regimes until the regime implied by the shocks is the one that was assumed
+    """
+
+    T, dim_z = Z.shape
+    dim_v, dim_e = SIG.shape
+    dim_x = J.shape[0]
+
+    means = np.empty((T, dim_v))
+    resid = np.zeros((T, dim_e))
+    regimes = np.empty((T, 2), dtype=np.int64)
+    flags = np.zeros(T, dtype=np.int64)
+    censored = np.zeros(T, dtype=np.bool_)
+
+    # the value of the constrained variable without the constraint is a' e + b' x + b0
+    bv, b0 = aca(bmat[0, 0, 0]), bterm[0, 0, 0]
+    a = aca(SIG.T) @ bv
+
+    x = x0.copy()
+    ll = 0.
+
+    for t in range(T):
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+        nobs = np.sum(obs)
+        Ho = aca(H[obs])
+        do, zo = d[obs], z[obs]
+        Ro = aca(R[obs][:, obs])
+        has_obs = nobs > 0
+
+        # start with the regime without shocks
+        _, (l, k), flag = boehlgorithm_jit(
+            N, A, J, cx, b, x_bar, x, mat, term, bmat, bterm, max_cnt)
+
+        converged = False
+        best = np.inf
+
+        for _ in range(max_iter):
+
+            F = aca(mat[l, k, 1, dim_x:])
+            c = term[l, k, 1, dim_x:]
+
+            e = np.zeros(dim_e)
+            u = np.zeros(0)
+            logdet = 0.
+            nkeep = 0
+            lcens = 0.
+            cens = False
+
+            if has_obs:
+                # z = G e + r (+ measurement error)
+                G = Ho @ F @ SIG
+                r = Ho @ (F @ x + c) + do
+
+                # if a constraint binds, some observables do not depend on the shocks (e.g. the policy rate at the ZLB). These directions are dropped and the density is taken on the remaining ones
+                e, u, logdet, W = cond_shocks_jit(G, r, zo, Q, Ro, tol)
+                nkeep = len(u)
+
+                if not l:
+                    # if the data imply that the constraint binds also without it (e.g. a policy rate at or below the bound), the observables at the bound are censored: the shocks are conditioned on the unconstrained value being below the bound, which enters the likelihood with its probability
+                    Fu = aca(mat[1, 0, 1, dim_x:])
+                    ru = Ho @ (Fu @ x + term[1, 0, 1, dim_x:]) + do
+                    eu = cond_shocks_jit(Ho @ Fu @ SIG, ru, zo, Q, Ro, tol)[0]
+
+                    Sc = Q - W @ aca(W.T)
+                    sd = np.sqrt(max(a @ Sc @ a, 0.))
+
+                    if a @ eu + bv @ x + b0 <= x_bar and sd**2 > tol*(a @ Q @ a):
+                        q = (x_bar - a @ e - bv @ x - b0)/sd
+                        Phi = .5*erfc(-q/sqrt(2))
+                        # inverse Mills ratio, using its asymptote if the probability underflows
+                        mills = exp(-.5*q**2)/sqrt(2*pi)/Phi if Phi > 0 else -q
+                        e = e - Sc @ a*mills/sd
+                        lcens = log(Phi) if Phi > 0 else -.5*q**2 - log(-q) - .5*log(2*pi)
+                        cens = True
+
+            x_new, (l_new, k_new), flag_new = boehlgorithm_jit(
+                N, A, J, cx, b, x_bar, x + SIG @ e, mat, term, bmat, bterm, max_cnt)
+
+            # if the iteration cycles, the candidate that fits the data best under the actual transition is used
+            misfit = np.sum((Ho @ x_new + do - zo)**2)
+            if misfit < best or (l_new == l and k_new == k):
+                best = misfit
+                sol = x_new, e, u, logdet, nkeep, lcens, cens, l_new, k_new, flag_new
+
+            if l_new == l and k_new == k:
+                converged = True
+                break
+            l, k = l_new, k_new
+
+        x, e, u, logdet, nkeep, lcens, cens, l, k, flag = sol
+
+        if has_obs:
+            ll += lcens - .5*(nkeep*log2pi + logdet + np.sum(u**2))
+
+        means[t] = x
+        resid[t] = e
+        regimes[t] = l, k
+        flags[t] = flag if converged else 4
+        censored[t] = cens
+
+    return means, resid, ll, regimes, flags, censored
+
+
+class InversionFilter(object):
+    """Deterministic inversion filter.
+
+    If the model has as many shocks as observables, the shocks of each period are uniquely pinned down by the observables and the state of the last period. Within a regime of the piecewise-linear transition, the observables are affine in the shocks, and the regime is found by iterating until it is consistent with the recovered shocks (at most `max_iter` times). The likelihood is the density of the shocks times the Jacobian of the map from shocks to observables. No ensemble or random numbers are needed, and the extracted shocks come as a by-product (`resid`), which makes a separate `extract` step unnecessary.
+
+    Without measurement errors (the default, `R = 0`), this requires a square model. More generally, the observables given the last state are normal within a regime with covariance G Q G' + R, where G maps the shocks to the observables. The filter then uses the conditional mean of the shocks, which is exact in the square case and an approximation otherwise (e.g. for missing observations).
+
+    If a constraint binds, observables that no longer depend on the shocks (e.g. the policy rate at the ZLB) are dropped for that period: directions in which the covariance of the observables is below `tol` (relative to its largest eigenvalue) do not enter the likelihood, and the shocks that only load on them are set to their mean of zero. If the data imply that the constraint would also bind without it (e.g. because the observed policy rate is at or below the bound of the model), these observables are instead treated as censored: the shocks are set to their conditional mean given that the unconstrained value of the constrained variable is below the bound, and the probability of this event enters the likelihood. The censored periods are stored in `censored`.
+
+    The regimes of the last run are stored in `regimes`, and error flags in `flags`. If the regime iteration does not converge, the candidate that fits the data best under the actual transition is used and the period is flagged with 4. The number of such periods is reported if `verbose` is set.
+    """
+
+    name = 'InversionFilter'
+
+    def __init__(self, dim_x, dim_z, max_cnt=4e1, max_iter=20, tol=1e-10):
+
+        self.dim_x = dim_x
+        self.dim_z = dim_z
+        self.max_cnt = max_cnt
+        self.max_iter = max_iter
+        self.tol = tol
+
+        self.precalc_mat = None
+        self.sys = None
+        self.SIG = None
+        self.H = None
+
+        self.R = np.zeros((dim_z, dim_z))
+        self.Q = np.eye(dim_x)
+        self.P = np.eye(dim_x)
+        self.x = np.zeros(dim_x)
+
+    def batch_filter(self, Z, store=False, calc_ll=False, noise=None, verbose=False):
+        """Batch filter.
+
+        Parameters
+        ----------
+        Z : array
+            The data, shape (T, dim_z). NaNs are treated as missing.
+        store : bool, optional
+            Only for compatibility with the other filters.
+        calc_ll : bool, optional
+            Whether to return the log-likelihood instead of the states and shocks. Defaults to False.
+        noise : None
+            Only for compatibility with the ensemble filters. The filter does not use random numbers.
+
+        Returns
+        -------
+        float or tuple
+            The log-likelihood if `calc_ll` is True, the states (T, dim_x) and the shocks (T, dim_e) otherwise. The shocks of the first period move the initial state `x` to the first state
+        """
+
+        self.Z = Z
+
+        mat, term, bmat, bterm = self.precalc_mat
+        N, A, J, cx, b, x_bar = self.sys
+
+        try:
+            means, resid, ll, self.regimes, self.flags, self.censored = inversion_jit(aca(Z, dtype=float), aca(self.x, dtype=float), aca(self.Q, dtype=float), aca(self.H[0], dtype=float), aca(self.H[1], dtype=float).reshape(-1), aca(
+                self.R, dtype=float), aca(self.SIG, dtype=float), N, A, J, cx, b, x_bar, mat, term, bmat, bterm, self.max_cnt, self.max_iter, self.tol)
+        except np.linalg.LinAlgError:
+            # the shocks do not map onto the observables
+            means = resid = None
+            ll = -np.inf
+
+        if verbose and means is not None and (self.flags == 4).any():
+            print('[invfilt:]'.ljust(15, ' ') + ' The regime iteration did not converge in %s of %s periods.' %
+                  (np.sum(self.flags == 4), len(Z)))
+
+        self.means, self.resid = means, resid
+        self.ll = ll
+
+        if calc_ll:
+            return ll
+
+        return means, resid
+
+    def rts_smoother(self, res, rcond=None):
+        """The states are pinned down by the data up to each period. Returns `res` unchanged
+        """
+
+        return res
@@ -0,0 +1,935 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a native (nopython) Kalman filter and RTS smoother for the linear representation of the model
+"""
+
+import warnings
+import numpy as np
+from numba import njit, prange
+
+aca = np.ascontiguousarray
+log2pi = np.log(2*np.pi)
+
+
+def psd_sqrt(A):
+    """Square root `S` of a positive semidefinite matrix such that `S @ S.T = A`. Unlike the Cholesky factor, also works for singular matrices
+    """
+
+    w, v = np.linalg.eigh(A)
+
+    return aca(v * np.sqrt(np.maximum(w, 0)))
+
+
+@njit(cache=True, nogil=True)
+def fsolve_jit(L, B):
+    """Solve L X = B for lower triangular L
+    """
+
+    n, m = B.shape
+    X = np.empty((n, m))
+
+    for i in range(n):
+        for j in range(m):
+            s = B[i, j]
+            for k in range(i):
+                s -= L[i, k]*X[k, j]
+            X[i, j] = s/L[i, i]
+
+    return X
+
+
+@njit(cache=True, nogil=True)
+def bsolve_jit(L, B):
+    """Solve L' X = B for lower triangular L
+    """
+
+    n, m = B.shape
+    X = np.empty((n, m))
+
+    for i in range(n-1, -1, -1):
+        for j in range(m):
+            s = B[i, j]
+            for k in range(i+1, n):
+                s -= L[k, i]*X[k, j]
+            X[i, j] = s/L[i, i]
+
+    return X
+
+
+@njit(cache=True, nogil=True)
+def lyapunov_jit(F, Q, tol=1e-12, max_iter=100):
+    """Solve P = F P F' + Q using the doubling algorithm. Returns the solution and a flag whether it converged
+    """
+
+    A = F.copy()
+    P = Q.copy()
+
+    for i in range(max_iter):
+
+        P_new = P + A @ P @ A.T
+        A = A @ A
+
+        if np.max(np.abs(P_new - P)) < tol*max(1., np.max(np.abs(P_new))):
+            return P_new, True
+
+        P = P_new
+
+    return P, False
+
+
+@njit(cache=True, nogil=True)
+def update_jit(P_pred, H, R):
+    """Cholesky-based update step. Returns the gain, the posterior covariance, the Cholesky factor of the innovation covariance and its log-determinant
+    """
+
+    PHT = P_pred @ aca(H.T)
+    S = H @ PHT + R
+    L = np.linalg.cholesky(S)
+
+    # W' = L^-1 HP, such that P_post = P_pred - W W' and K = W L^-1
+    Wt = fsolve_jit(L, aca(PHT.T))
+    K = aca(bsolve_jit(L, Wt).T)
+    P = P_pred - Wt.T @ Wt
+
+    logdet = 2*np.sum(np.log(np.diag(L)))
+
+    return K, (P + P.T)/2, L, logdet
+
+
+@njit(cache=True, nogil=True)
+def kf_jit(Z, F, Q, H, d, R, P0, store, ss_tol, x0):
+
+    T, dim_z = Z.shape
+    dim_x = F.shape[0]
+
+    means = np.empty((T, dim_x))
+    covs = np.empty((T if store else 0, dim_x, dim_x))
+    # flags periods for which the covariance is the steady state covariance
+    frozen = np.zeros(T, dtype=np.bool_)
+
+    FT = aca(F.T)
+    x = x0.copy()
+    P = P0.copy()
+
+    K = np.zeros((dim_x, dim_z))
+    L = np.eye(dim_z)
+    logdet = 0.
+    converged = False
+    ll = 0.
+
+    for t in range(T):
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+        nobs = np.sum(obs)
+
+        # the steady state only holds as long as all variables are observed
+        if nobs < dim_z:
+            converged = False
+
+        x = F @ x
+
+        if nobs == dim_z:
+
+            if not converged:
+                P_pred = F @ P @ FT + Q
+                K, P_new, L, logdet = update_jit(P_pred, H, R)
+
+                if np.max(np.abs(P_new - P)) < ss_tol*max(1., np.max(np.abs(P))):
+                    converged = True
+                P = P_new
+
+            frozen[t] = converged
+
+            y = z - H @ x - d
+            u = fsolve_jit(L, y.reshape(-1, 1))[:, 0]
+
+            ll -= .5*(dim_z*log2pi + logdet + np.sum(u**2))
+            x += K @ y
+
+        elif nobs:
+
+            P_pred = F @ P @ FT + Q
+            Ho = aca(H[obs])
+            Kt, P, Lt, logdett = update_jit(P_pred, Ho, aca(R[obs][:, obs]))
+
+            y = z[obs] - Ho @ x - d[obs]
+            u = fsolve_jit(Lt, y.reshape(-1, 1))[:, 0]
+
+            ll -= .5*(nobs*log2pi + logdett + np.sum(u**2))
+            x += Kt @ y
+
+        else:
+            P = F @ P @ FT + Q
+
+        means[t] = x
+        if store:
+            covs[t] = P
+
+    return means, covs, ll, frozen
+
+
+@njit(cache=True, nogil=True)
+def lyapunov_batch_jit(F, Q):
+    """Unconditional covariances of a stack of systems. Falls back to 10*I where the Lyapunov equation can not be solved
+    """
+
+    n, dim_x, _ = F.shape
+    P0 = np.empty((n, dim_x, dim_x))
+
+    for i in range(n):
+        P, converged = lyapunov_jit(F[i], Q[i])
+        if converged and not np.isnan(P).any():
+            P0[i] = P
+        else:
+            P0[i] = 1e1*np.eye(dim_x)
+
+    return P0
+
+
+@njit(cache=True, nogil=True)
+def kf_batch_jit(Z, F, Q, H, d, R, P0, failed, ss_tol):
+    """Run the filters of a stack of n systems in lockstep over the data. All system matrices carry the candidate as leading dimension. Candidates flagged in `failed` are skipped, and candidates for which an innovation covariance is not positive definite are flagged on the way. Returns the log-likelihoods (-inf for failed candidates) and the failure mask
+    """
+
+    T, dim_z = Z.shape
+    n, dim_x, _ = F.shape
+
+    failed = failed.copy()
+    ll = np.zeros(n)
+
+    x = np.zeros((n, dim_x))
+    P = P0.copy()
+    K = np.zeros((n, dim_x, dim_z))
+    L = np.zeros((n, dim_z, dim_z))
+    logdet = np.zeros(n)
+    converged = np.zeros(n, dtype=np.bool_)
+
+    for t in range(T):
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+        nobs = np.sum(obs)
+
+        for i in range(n):
+
+            if failed[i]:
+                continue
+
+            x[i] = F[i] @ x[i]
+
+            try:
+                if nobs == dim_z:
+
+                    if not converged[i]:
+                        P_pred = F[i] @ P[i] @ aca(F[i].T) + Q[i]
+                        K[i], P_new, L[i], logdet[i] = update_jit(
+                            P_pred, H[i], R[i])
+
+                        if np.max(np.abs(P_new - P[i])) < ss_tol*max(1., np.max(np.abs(P[i]))):
+                            converged[i] = True
+                        P[i] = P_new
+
+                    y = z - H[i] @ x[i] - d[i]
+                    u = fsolve_jit(L[i], y.reshape(-1, 1))[:, 0]
+
+                    ll[i] -= .5*(dim_z*log2pi + logdet[i] + np.sum(u**2))
+                    x[i] += K[i] @ y
+
+                elif nobs:
+
+                    converged[i] = False
+
+                    P_pred = F[i] @ P[i] @ aca(F[i].T) + Q[i]
+                    Ho = aca(H[i][obs])
+                    Kt, P[i], Lt, logdett = update_jit(
+                        P_pred, Ho, aca(R[i][obs][:, obs]))
+
+                    y = z[obs] - Ho @ x[i] - d[i][obs]
+                    u = fsolve_jit(Lt, y.reshape(-1, 1))[:, 0]
+
+                    ll[i] -= .5*(nobs*log2pi + logdett + np.sum(u**2))
+                    x[i] += Kt @ y
+
+                else:
+                    converged[i] = False
+                    P[i] = F[i] @ P[i] @ aca(F[i].T) + Q[i]
+
+            except Exception:
+                failed[i] = True
+
+    for i in range(n):
+        if failed[i] or np.isnan(ll[i]):
+            failed[i] = True
+            ll[i] = -np.inf
+
+    return ll, failed
+
+
+@njit(cache=True, nogil=True)
+def chandrasekhar_jit(Z, F, H, d, R, P0, store, ss_tol):
+    """Chandrasekhar recursions. Instead of the covariance, the recursion updates a low-rank factorization of its increment, dP_t = W_t M_t W_t', where W_t is of shape (dim_x, dim_z). The cost per period is O(dim_x^2 dim_z) instead of O(dim_x^3).
+
+    Requires a time-invariant system without missing observations and an initial covariance that is the unconditional covariance of the states.
+    """
+
+    T, dim_z = Z.shape
+    dim_x = F.shape[0]
+
+    means = np.empty((T, dim_x))
+    covs = np.empty((T if store else 0, dim_x, dim_x))
+    frozen = np.zeros(T, dtype=np.bool_)
+
+    # PZ = P_t|t-1 H' and S = H P_t|t-1 H' + R
+    PZ = P0 @ aca(H.T)
+    S = H @ PZ + R
+    L = np.linalg.cholesky(S)
+
+    # as P0 = F P0 F' + Q, the first increment is -F PZ S^-1 PZ' F'
+    W = F @ PZ
+    M = -bsolve_jit(L, fsolve_jit(L, np.eye(dim_z)))
+
+    P_pred = P0.copy()
+    scale = max(1., np.max(np.abs(P0)))
+    x = np.zeros(dim_x)
+    converged = False
+    ll = 0.
+
+    for t in range(T):
+
+        if t:
+            x = F @ x
+
+        y = Z[t] - H @ x - d
+        u = fsolve_jit(L, y.reshape(-1, 1))[:, 0]
+        ll -= .5*(dim_z*log2pi + 2*np.sum(np.log(np.diag(L))) + np.sum(u**2))
+
+        # filtered mean and covariance
+        G = aca(bsolve_jit(L, fsolve_jit(L, aca(PZ.T))).T)
+        x += G @ y
+        means[t] = x
+
+        frozen[t] = converged
+        if store:
+            covs[t] = P_pred - G @ aca(PZ.T)
+            covs[t] = (covs[t] + covs[t].T)/2
+
+        if converged:
+            continue
+
+        # increment is bounded by max|W|^2 sum|M|
+        if np.max(np.abs(W))**2*np.sum(np.abs(M)) < ss_tol*scale:
+            converged = True
+            continue
+
+        ZW = H @ W
+        MZW = M @ aca(ZW.T)
+
+        S_new = S + ZW @ MZW
+        PZ_new = PZ + W @ MZW
+        L_new = np.linalg.cholesky(S_new)
+
+        if store:
+            P_pred += W @ M @ aca(W.T)
+
+        # M_t+1 = M_t + M_t W_t' H' S_t^-1 H W_t M_t
+        V = fsolve_jit(L, aca(MZW.T))
+        M = M + V.T @ V
+        # W_t+1 = F (I - PZ_t+1 S_t+1^-1 H) W_t
+        G = bsolve_jit(L_new, fsolve_jit(L_new, ZW))
+        W = F @ (W - PZ_new @ G)
+
+        S, PZ, L = S_new, PZ_new, L_new
+
+    return means, covs, ll, frozen
+
+
+@njit(cache=True, nogil=True)
+def givens_jit(C, row, i, j):
+    """Rotate the columns i and j of C such that C[row, j] becomes zero
+    """
+
+    a, b = C[row, i], C[row, j]
+    r = np.sqrt(a**2 + b**2)
+    if r == 0:
+        return
+
+    c, s = a/r, b/r
+    for k in range(row, C.shape[0]):
+        ck, sk = C[k, i], C[k, j]
+        C[k, i] = c*ck + s*sk
+        C[k, j] = -s*ck + c*sk
+
+
+@njit(cache=True, nogil=True)
+def hyperbolic_jit(C, row, i, j):
+    """Hyperbolic rotation of the columns i (positive signature) and j (negative signature) of C such that C[row, j] becomes zero. Uses the mixed form, which is numerically stable. Returns False if the rotation does not exist
+    """
+
+    a, b = C[row, i], C[row, j]
+    if b == 0:
+        return True
+    if abs(b) >= abs(a):
+        return False
+
+    rho = b/a
+    c = np.sqrt(1 - rho**2)
+    for k in range(row, C.shape[0]):
+        ck = (C[k, i] - rho*C[k, j])/c
+        C[k, j] = c*C[k, j] - rho*ck
+        C[k, i] = ck
+
+    return True
+
+
+@njit(cache=True, nogil=True)
+def sqrt_chandrasekhar_jit(Z, F, H, d, R, P0, store, ss_tol):
+    """Square-root (array) form of the Chandrasekhar recursions. The increment of the covariance is kept as dP_t = -L_t L_t' and the pre-array
+
+        | S_t^1/2       H L_t |
+        | PZ_t S_t^-T/2   L_t |
+
+    is reduced to lower triangular form by J-orthogonal (Givens and hyperbolic) rotations, which directly yields S_t+1^1/2, PZ_t+1 S_t+1^-T/2 and L_t+1. Innovation covariances are never formed explicitly and stay positive definite by construction.
+
+    Same requirements and cost as `chandrasekhar_jit`.
+    """
+
+    T, dim_z = Z.shape
+    dim_x = F.shape[0]
+
+    means = np.empty((T, dim_x))
+    covs = np.empty((T if store else 0, dim_x, dim_x))
+    frozen = np.zeros(T, dtype=np.bool_)
+
+    S = H @ P0 @ aca(H.T) + R
+    # the array. Rows: [S^1/2, H L] and [PZ S^-T/2, L], columns: dim_z with positive and dim_z with negative signature
+    C = np.zeros((dim_z + dim_x, 2*dim_z))
+    C[:dim_z, :dim_z] = np.linalg.cholesky(S)
+    C[dim_z:, :dim_z] = fsolve_jit(C[:dim_z, :dim_z], aca(H @ P0)).T
+    # the first increment is -F PZ S^-1 PZ' F'
+    C[dim_z:, dim_z:] = F @ aca(C[dim_z:, :dim_z])
+
+    P_pred = P0.copy()
+    scale = max(1., np.max(np.abs(P0)))
+    x = np.zeros(dim_x)
+    converged = False
+    ll = 0.
+
+    for t in range(T):
+
+        if t:
+            x = F @ x
+
+        Lc = aca(C[:dim_z, :dim_z])
+        PZb = aca(C[dim_z:, :dim_z])
+
+        y = Z[t] - H @ x - d
+        u = aca(fsolve_jit(Lc, y.reshape(-1, 1))[:, 0])
+        ll -= .5*(dim_z*log2pi + 2 *
+                  np.sum(np.log(np.abs(np.diag(Lc)))) + np.sum(u**2))
+
+        x += PZb @ u
+        means[t] = x
+
+        frozen[t] = converged
+        if store:
+            covs[t] = P_pred - PZb @ aca(PZb.T)
+            covs[t] = (covs[t] + covs[t].T)/2
+
+        if converged:
+            continue
+
+        Lt = aca(C[dim_z:, dim_z:])
+        if np.max(np.sum(Lt**2, axis=1)) < ss_tol*scale:
+            converged = True
+            continue
+
+        if store:
+            P_pred -= Lt @ aca(Lt.T)
+
+        C[:dim_z, dim_z:] = H @ Lt
+
+        for i in range(dim_z):
+            # collapse row i within the positive and the negative block, then eliminate the negative part
+            for j in range(i+1, dim_z):
+                givens_jit(C, i, i, j)
+            for j in range(dim_z+1, 2*dim_z):
+                givens_jit(C, i, dim_z, j)
+            if not hyperbolic_jit(C, i, i, dim_z):
+                # innovation covariance is not positive definite
+                means[:] = np.nan
+                covs[:] = np.nan
+                return means, covs, -np.inf, frozen
+
+        # the lower right block is L_t+1 = F X
+        C[dim_z:, dim_z:] = F @ aca(C[dim_z:, dim_z:])
+
+    return means, covs, ll, frozen
+
+
+@njit(cache=True, nogil=True)
+def smoother_gain_jit(P, F, Q):
+    """Smoother gain P F' Pp^-1. Uses a Cholesky solve if Pp is positive definite and the pseudo inverse otherwise
+    """
+
+    Pp = F @ P @ aca(F.T) + Q
+    FP = F @ P
+
+    try:
+        L = np.linalg.cholesky(Pp)
+        K = aca(bsolve_jit(L, fsolve_jit(L, FP)).T)
+    except Exception:
+        K = aca((np.linalg.pinv(Pp) @ FP).T)
+
+    return K, Pp
+
+
+@njit(cache=True, nogil=True)
+def rts_jit(means, covs, F, Q, frozen):
+
+    T = means.shape[0]
+
+    x = means.copy()
+    P = covs.copy()
+
+    K_ss, Pp_ss = smoother_gain_jit(covs[0], F, Q)
+    have_ss = False
+
+    for t in range(T-2, -1, -1):
+
+        if frozen[t] and have_ss:
+            K, Pp = K_ss, Pp_ss
+        else:
+            K, Pp = smoother_gain_jit(covs[t], F, Q)
+            if frozen[t]:
+                K_ss, Pp_ss = K, Pp
+                have_ss = True
+
+        x[t] += K @ (x[t+1] - F @ x[t])
+        P[t] += K @ (P[t+1] - Pp) @ aca(K.T)
+
+    return x, P
+
+
+@njit(cache=True, nogil=True)
+def shocks_jit(means, F, SIG, SIG_inv):
+    """Recover the shocks that, starting from `means[0]`, replicate the series `means` under the linear transition. Returns the implied states and the shocks
+    """
+
+    T, dim_x = means.shape
+
+    res = np.empty((T, dim_x))
+    resid = np.empty((T-1, SIG.shape[1]))
+    res[0] = means[0]
+
+    for t in range(T-1):
+        resid[t] = SIG_inv @ (means[t+1] - F @ res[t])
+        res[t+1] = F @ (res[t] + SIG @ resid[t])
+
+    return res, resid
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def filter_elements_jit(Z, F, Q, H, d, R, P0):
+    """Elements (A, b, C, eta, J) of the parallel-scan Kalman filter (Särkkä & García-Fernández, 2021). Combining the elements of periods 0, ..., t yields the filtered mean b and covariance C of period t
+    """
+
+    T, dim_z = Z.shape
+    dim_x = F.shape[0]
+
+    A = np.zeros((T, dim_x, dim_x))
+    b = np.zeros((T, dim_x))
+    C = np.zeros((T, dim_x, dim_x))
+    eta = np.zeros((T, dim_x))
+    J = np.zeros((T, dim_x, dim_x))
+
+    FT = aca(F.T)
+    I = np.eye(dim_x)
+
+    for t in prange(T):
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+
+        # the first element contains the prior
+        P = F @ P0 @ FT + Q if t == 0 else Q
+
+        if not np.any(obs):
+            if t:
+                A[t] = F
+            C[t] = P
+            continue
+
+        Ho = aca(H[obs])
+        y = z[obs] - d[obs]
+
+        S = Ho @ P @ aca(Ho.T) + aca(R[obs][:, obs])
+        # S^-1 H and S^-1 y
+        SiH = np.linalg.solve(S, Ho)
+        Siy = np.linalg.solve(S, y)
+        K = P @ aca(SiH.T)
+        IKH = I - K @ Ho
+
+        C[t] = IKH @ P
+        C[t] = (C[t] + C[t].T)/2
+
+        if t == 0:
+            b[t] = K @ y
+        else:
+            A[t] = IKH @ F
+            b[t] = K @ y
+            eta[t] = FT @ (aca(Ho.T) @ Siy)
+            J[t] = FT @ aca(Ho.T) @ SiH @ F
+
+    return A, b, C, eta, J
+
+
+@njit(cache=True, nogil=True)
+def combine_filter_jit(A, b, C, eta, J, i, j):
+    """Combine the filter elements i (earlier) and j (later) and write the result to j
+    """
+
+    I = np.eye(A.shape[1])
+
+    Ai, Aj, Ci, Jj = A[i], A[j], C[i], J[j]
+
+    M = np.linalg.solve(aca((I + Ci @ Jj).T), aca(Aj.T)).T
+    N = np.linalg.solve(aca((I + Jj @ Ci).T), aca(Ai)).T
+
+    b[j] = M @ (b[i] + Ci @ eta[j]) + b[j]
+    C[j] = M @ Ci @ aca(Aj.T) + C[j]
+    eta[j] = N @ (eta[j] - Jj @ b[i]) + eta[i]
+    J[j] = N @ Jj @ Ai + J[i]
+    A[j] = M @ Ai
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def scan_filter_jit(A, b, C, eta, J):
+    """Inclusive scan over the filter elements (in place). Brent-Kung scheme: O(T) work and O(log T) depth, the combinations of each level run in parallel
+    """
+
+    T = A.shape[0]
+
+    s = 1
+    while s < T:
+        for k in prange((T - s)//(2*s) + 1):
+            j = 2*s*k + 2*s - 1
+            if j < T:
+                combine_filter_jit(A, b, C, eta, J, j - s, j)
+        s *= 2
+
+    s //= 2
+    while s >= 1:
+        for k in prange((T - s)//(2*s) + 1):
+            j = 2*s*k + 3*s - 1
+            if j < T:
+                combine_filter_jit(A, b, C, eta, J, j - s, j)
+        s //= 2
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def parallel_ll_jit(Z, F, Q, H, d, R, P0, means, covs):
+    """Log-likelihood given the filtered means and covariances. The periods are independent of each other
+    """
+
+    T, dim_z = Z.shape
+    FT = aca(F.T)
+    lls = np.zeros(T)
+
+    for t in prange(T):
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+        nobs = np.sum(obs)
+        if not nobs:
+            continue
+
+        if t == 0:
+            x = np.zeros(F.shape[0])
+            P = F @ P0 @ FT + Q
+        else:
+            x = F @ means[t-1]
+            P = F @ covs[t-1] @ FT + Q
+
+        Ho = aca(H[obs])
+        S = Ho @ P @ aca(Ho.T) + aca(R[obs][:, obs])
+        L = np.linalg.cholesky(S)
+
+        u = fsolve_jit(L, (z[obs] - Ho @ x - d[obs]).reshape(-1, 1))[:, 0]
+        lls[t] = -.5*(nobs*log2pi + 2*np.sum(np.log(np.diag(L))) + np.sum(u**2))
+
+    return np.sum(lls)
+
+
+def parallel_kf(Z, F, Q, H, d, R, P0):
+    """Kalman filter as a parallel prefix scan. Returns the filtered means, covariances and the log-likelihood
+    """
+
+    A, b, C, eta, J = filter_elements_jit(Z, F, Q, H, d, R, P0)
+    scan_filter_jit(A, b, C, eta, J)
+
+    return b, C, parallel_ll_jit(Z, F, Q, H, d, R, P0, b, C)
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def smoother_elements_jit(means, covs, F, Q):
+    """Elements (E, g, L) of the parallel-scan RTS smoother. Combining the elements of periods t, ..., T-1 yields the smoothed mean g and covariance L of period t
+    """
+
+    T, dim_x = means.shape
+
+    E = np.zeros((T, dim_x, dim_x))
+    g = np.empty((T, dim_x))
+    L = np.empty((T, dim_x, dim_x))
+
+    g[T-1] = means[T-1]
+    L[T-1] = covs[T-1]
+
+    for t in prange(T-1):
+        K, _ = smoother_gain_jit(covs[t], F, Q)
+        E[t] = K
+        g[t] = means[t] - K @ (F @ means[t])
+        L[t] = covs[t] - K @ F @ covs[t]
+
+    return E, g, L
+
+
+@njit(cache=True, nogil=True)
+def combine_smoother_jit(E, g, L, i, j):
+    """Combine the smoother elements i (earlier) and j (later) and write the result to i
+    """
+
+    Ei = E[i]
+    g[i] = Ei @ g[j] + g[i]
+    L[i] = Ei @ L[j] @ aca(Ei.T) + L[i]
+    E[i] = Ei @ E[j]
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def scan_smoother_jit(E, g, L):
+    """Inclusive scan over the smoother elements, backwards in time (in place). Same scheme as `scan_filter_jit`
+    """
+
+    T = E.shape[0]
+
+    s = 1
+    while s < T:
+        for k in prange((T - s)//(2*s) + 1):
+            j = 2*s*k + 2*s - 1
+            if j < T:
+                combine_smoother_jit(E, g, L, T-1-j, T-1-j+s)
+        s *= 2
+
+    s //= 2
+    while s >= 1:
+        for k in prange((T - s)//(2*s) + 1):
+            j = 2*s*k + 3*s - 1
+            if j < T:
+                combine_smoother_jit(E, g, L, T-1-j, T-1-j+s)
+        s //= 2
+
+
+def parallel_rts(means, covs, F, Q):
+    """RTS smoother as a parallel prefix scan. Returns the smoothed means and covariances
+    """
+
+    E, g, L = smoother_elements_jit(means, covs, F, Q)
+    scan_smoother_jit(E, g, L)
+
+    return g, L
+
+
+class KalmanFilter(object):
+    """Native Kalman filter for the linear state space model x_t = F x_{t-1} + e_t, z_t = H[0] x_t + H[1] + u_t with Cov(e) = Q and Cov(u) = R.
+
+    The filter runs in nopython mode and uses Cholesky-based updates. Unless `P` is set, the initial covariance is the unconditional covariance of the states, obtained from a discrete Lyapunov equation. The initial mean `x` defaults to zero (the steady state). Once the covariance recursion has converged (relative tolerance `ss_tol`), the steady state gain is used and the recursion is skipped. Missing observations (NaNs) are skipped in the update step.
+
+    The covariance recursion is selected by `engine`:
+
+    - 'standard': the usual Riccati recursion, O(dim_x^3) per period
+    - 'chandrasekhar': Chandrasekhar recursions, which update a rank-dim_z factorization of the change in the covariance, O(dim_x^2 dim_z) per period. Pays off for models with many states and few observables
+    - 'sqrt': square-root (array) form of the Chandrasekhar recursions, same cost but numerically more robust
+    - 'parallel': the filter and the RTS smoother as parallel prefix scans over associative elements (Särkkä & García-Fernández, 2021). O(log T) depth across the threads of numba (see `NUMBA_NUM_THREADS`) at a constant factor more work. Pays off for long samples when only one or a few likelihoods are evaluated at a time, e.g. for the Hessian or a single chain
+
+    The Chandrasekhar engines require the unconditional covariance as initial covariance and no missing observations. Otherwise, the standard recursion is used. The same holds for all other engines if the initial mean is not zero.
+    """
+
+    name = 'KalmanFilter'
+    engines = 'standard', 'chandrasekhar', 'sqrt', 'parallel'
+
+    def __init__(self, dim_x, dim_z, ss_tol=1e-10, engine='standard'):
+
+        if engine not in self.engines:
+            raise ValueError('[KalmanFilter:]'.ljust(15, ' ') +
+                             " `engine` must be one of %s, got '%s'." % (self.engines, engine))
+
+        self.dim_x = dim_x
+        self.dim_z = dim_z
+        self.ss_tol = ss_tol
+        self.engine = engine
+
+        self.F = np.eye(dim_x)
+        self.H = np.zeros((dim_z, dim_x)), np.zeros(dim_z)
+        self.Q = np.eye(dim_x)
+        self.R = np.eye(dim_z)
+
+        # initial covariance. If None, the unconditional covariance is used
+        self.P = None
+        # initial mean. If None, the steady state is used
+        self.x = None
+
+    def get_P0(self, return_flag=False):
+        """Unconditional covariance of the states. Falls back to a diffuse-ish prior if the system is not stationary. If `return_flag` is True, also returns whether the Lyapunov equation was solved. The fallback is reported by a `RuntimeWarning`, which is shown only once per process by default since it occurs for every non-stationary candidate during estimation
+        """
+
+        P0, converged = lyapunov_jit(aca(self.F, dtype=float), aca(self.Q, dtype=float))
+        converged = converged and not np.isnan(P0).any()
+
+        if not converged:
+            warnings.warn('[KalmanFilter:]'.ljust(15, ' ') +
+                          ' Lyapunov equation did not converge, using `P = 10*I` instead.', RuntimeWarning)
+            P0 = 1e1*np.eye(self.dim_x)
+
+        if return_flag:
+            return P0, converged
+
+        return P0
+
+    def batch_filter(self, Z, store=True, engine=None):
+        """Run the filter over the data
+
+        Parameters
+        ----------
+        Z : array
+            The data, shape (T, dim_z). NaNs are treated as missing.
+        store : bool, optional
+            Whether to store the covariances (required for the smoother). Defaults to True.
+        engine : str, optional
+            The covariance recursion, one of 'standard', 'chandrasekhar', 'sqrt' or 'parallel'. Defaults to `self.engine`.
+
+        Returns
+        -------
+        means : array
+            Filtered means
+        covs : array
+            Filtered covariances (an empty array if `store` is False)
+        ll : float
+            The log-likelihood
+        """
+
+        F = aca(self.F, dtype=float)
+        Q = aca(self.Q, dtype=float)
+        H = aca(self.H[0], dtype=float)
+        d = aca(self.H[1], dtype=float).reshape(-1)
+        R = aca(self.R, dtype=float)
+        Z = aca(Z, dtype=float)
+
+        engine = engine or self.engine
+        if engine not in self.engines:
+            raise ValueError('[KalmanFilter:]'.ljust(15, ' ') +
+                             " `engine` must be one of %s, got '%s'." % (self.engines, engine))
+
+        if self.P is None:
+            P0, unconditional = self.get_P0(return_flag=True)
+        else:
+            P0, unconditional = aca(self.P, dtype=float), False
+
+        # the Chandrasekhar recursions rely on a time-invariant system and the unconditional covariance
+        if engine in ('chandrasekhar', 'sqrt') and (not unconditional or np.isnan(Z).any()):
+            engine = 'standard'
+
+        x0 = getattr(self, 'x', None)
+        x0 = np.zeros(self.dim_x) if x0 is None else aca(x0, dtype=float)
+        if x0.any():
+            engine = 'standard'
+        self.engine_used = engine
+
+        try:
+            if engine == 'chandrasekhar':
+                means, covs, ll, self.frozen = chandrasekhar_jit(
+                    Z, F, H, d, R, P0, store, self.ss_tol)
+            elif engine == 'sqrt':
+                means, covs, ll, self.frozen = sqrt_chandrasekhar_jit(
+                    Z, F, H, d, R, P0, store, self.ss_tol)
+            elif engine == 'parallel':
+                means, covs, ll = parallel_kf(Z, F, Q, H, d, R, P0)
+                self.frozen = np.zeros(len(Z), dtype=bool)
+            else:
+                means, covs, ll, self.frozen = kf_jit(
+                    Z, F, Q, H, d, R, P0, store, self.ss_tol, x0)
+        except np.linalg.LinAlgError:
+            # innovation covariance is not positive definite
+            means = np.full((len(Z), self.dim_x), np.nan)
+            covs = np.full((len(Z) if store else 0,
+                            self.dim_x, self.dim_x), np.nan)
+            ll, self.frozen = -np.inf, np.zeros(len(Z), dtype=bool)
+
+        return means, covs, ll
+
+    def rts_smoother(self, means, covs, inv=None):
+        """Rauch-Tung-Striebel smoother. `inv` is ignored and only kept for compatibility
+
+        Returns
+        -------
+        means : array
+            Smoothed means
+        covs : array
+            Smoothed covariances
+        """
+
+        if getattr(self, 'engine_used', None) == 'parallel':
+            means, covs = parallel_rts(aca(means), aca(covs), aca(self.F, dtype=float), aca(self.Q, dtype=float))
+            return means, covs, None, None
+
+        frozen = getattr(self, 'frozen', np.zeros(len(means), dtype=bool))
+        means, covs = rts_jit(aca(means), aca(covs), aca(self.F, dtype=float), aca(self.Q, dtype=float), frozen)
+
+        return means, covs, None, None
+
+
+def batch_ll(Z, F, Q, H, d, R, P0=None, failed=None, ss_tol=1e-10):
+    """Log-likelihoods of a stack of linear state space models, evaluated in one call of a nopython kernel. This avoids one round-trip through the pool per candidate, e.g. when evaluating a whole population of CMA-ES.
+
+    Parameters
+    ----------
+    Z : array
+        The data, shape (T, dim_z). NaNs are treated as missing.
+    F, Q : array
+        Transition matrices and covariances of the states, shape (n, dim_x, dim_x)
+    H : array
+        Observation matrices, shape (n, dim_z, dim_x)
+    d : array
+        Observation constants, shape (n, dim_z)
+    R : array
+        Covariance of the measurement errors. Either of shape (n, dim_z, dim_z) or (dim_z, dim_z), in which case it is shared by all candidates.
+    P0 : array, optional
+        Initial covariances, shape (n, dim_x, dim_x). Defaults to the unconditional covariances.
+    failed : array, optional
+        Boolean mask of candidates that are skipped (e.g. because their system could not be build).
+    ss_tol : float, optional
+        Tolerance of the steady state detection (see `KalmanFilter`)
+
+    Returns
+    -------
+    ll : array
+        The log-likelihoods, shape (n,). -inf for failed candidates
+    failed : array
+        The failure mask, shape (n,)
+    """
+
+    F = aca(F, dtype=float)
+    Q = aca(Q, dtype=float)
+    n = F.shape[0]
+
+    R = aca(R, dtype=float)
+    if R.ndim == 2:
+        R = aca(np.broadcast_to(R, (n,) + R.shape))
+
+    if failed is None:
+        failed = np.zeros(n, dtype=bool)
+
+    if P0 is None:
+        P0 = lyapunov_batch_jit(F, Q)
+
+    return kf_batch_jit(aca(Z, dtype=float), F, Q, aca(H, dtype=float), aca(d, dtype=float).reshape(n, -1), R, aca(P0, dtype=float), aca(failed, dtype=np.bool_), ss_tol)
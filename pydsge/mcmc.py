@@ -11,7 +11,11 @@ from datetime import datetime
 from .core import get_par
 
 
-def mcmc(self, p0=None, nsteps=3000, nwalks=None, tune=None, moves=None, temp=False, seed=None, backend=True, suffix=None, linear=None, resume=False, append=False, update_freq=None, lprob_seed=None, biject=False, report=None, verbose=False, debug=False, **samplerargs):
+def mcmc(self, p0=None, nsteps=3000, nwalks=None, tune=None, moves=None, temp=False, seed=None, backend=True, suffix=None, linear=None, resume=False, append=False, update_freq=None, lprob_seed=None, biject=False, batched=False, report=None, verbose=False, debug=False, **samplerargs):
+    """Run the emcee ensemble sampler.
+
+    If `batched` is True, the walkers are evaluated in chunks (one per core) using `lprob_batch`, which for the linear model evaluates all likelihoods of a chunk in one call of a nopython kernel.
+    """
 
     import pathos
     import emcee
@@ -69,6 +73,15 @@ def mcmc(self, p0=None, nsteps=3000, nwalks=None, tune=None, moves=None, temp=Fa
 
     def lprob_scaled(x): return lprob(bjfunc(x))
 
+    pool = self.pool
+    if batched:
+        lprob_batch_global = serializer(self.lprob_batch)
+
+        def lprob_batch_scaled(X): return lprob_batch_global(
+            bjfunc(X), linear=linear, verbose=verbose, temp=temp, lprob_seed=lprob_seed or 'set')
+
+        pool = self.batch_mapper(lprob_batch_scaled)
+
     if self.pool:
         self.pool.clear()
 
@@ -115,7 +128,7 @@ def mcmc(self, p0=None, nsteps=3000, nwalks=None, tune=None, moves=None, temp=Fa
         sampler = emcee.EnsembleSampler(nwalks, self.ndim, lprob_scaled)
     else:
         sampler = emcee.EnsembleSampler(
-            nwalks, self.ndim, lprob_scaled, moves=moves, pool=self.pool, backend=backend)
+            nwalks, self.ndim, lprob_scaled, moves=moves, pool=pool, backend=backend)
 
     if resume and not p0:
         p0 = sampler.get_last_sample()
@@ -416,3 +429,103 @@ def tmcmc(self, nsteps, nwalks, ntemps, target, update_freq=False, test_lprob=Fa
     self.fdict['datetime'] = str(datetime.now())
 
     return pars
+
+
+def cn_move(noise, rho, rng=None):
+    """Crank-Nicolson move of standard normal random numbers: returns `rho*noise + sqrt(1 - rho**2)*xi` with fresh standard normals `xi`. Leaves the standard normal distribution invariant
+    """
+
+    rng = rng or np.random
+
+    return {k: rho*v + np.sqrt(1 - rho**2)*rng.standard_normal(v.shape) for k, v in noise.items()}
+
+
+def pmmh(self, p0=None, nsteps=3000, rho=.99, cov=None, scale=.1, seed=None, verbose=True):
+    """Correlated pseudo-marginal Metropolis-Hastings for the nonlinear filters (TEnKF and particle filter).
+
+    The random numbers of the filter are part of the state of the chain. With each proposal of the parameters, they are updated with a Crank-Nicolson move with correlation `rho`, and accepted or rejected together with the parameters. The likelihood estimates of the current and the proposed parameters are then strongly correlated, which allows for much fewer particles/ensemble members than with independent random numbers.
+
+    Parameters
+    ----------
+    p0 : array, optional
+        Initial parameters. Defaults to the best parameters available
+    nsteps : int, optional
+        Number of iterations
+    rho : float, optional
+        Correlation of the random numbers between iterations
+    cov : array, optional
+        Covariance of the random walk proposal. Defaults to a diagonal matrix with the (quantile based) prior variances times `scale**2`
+    scale : float, optional
+        Scaling of the default proposal covariance
+    seed : int, optional
+        Random seed
+
+    Returns
+    -------
+    chain : array
+        The draws, shape (nsteps, ndim)
+    lprobs : array
+        The log-posterior of each draw
+    """
+
+    if not hasattr(self, 'ndim'):
+        self.prep_estim(load_R=True)
+
+    if self.filter.name == 'KalmanFilter':
+        raise AttributeError('[pmmh:]'.ljust(
+            15, ' ') + 'The Kalman filter is exact, use `mcmc` instead.')
+
+    if seed is None:
+        seed = self.fdict['seed']
+
+    rng = np.random.RandomState(seed)
+
+    if p0 is None:
+        p0 = get_par(self, 'best', asdict=False, full=False)
+
+    if cov is None:
+        # robust to priors without finite variance
+        cov = np.diag([(scale*(pl.ppf(.8413) - pl.ppf(.1587))/2)**2
+                       for pl in self.fdict['frozen_prior']])
+
+    L = np.linalg.cholesky(cov)
+
+    x = np.array(p0, dtype=float)
+    noise = self.filter.draw_noise(len(self.data), rng)
+    lp = self.lprob(x, noise=noise)
+
+    if np.isinf(lp):
+        raise ValueError('[pmmh:]'.ljust(15, ' ') +
+                         'Posterior of the initial values is zero.')
+
+    chain = np.empty((nsteps, self.ndim))
+    lprobs = np.empty(nsteps)
+    accepted = 0
+
+    pbar = tqdm.tqdm(total=nsteps, unit='sample(s)',
+                     dynamic_ncols=True, disable=not verbose)
+
+    for i in range(nsteps):
+
+        x_prop = x + L @ rng.standard_normal(self.ndim)
+        noise_prop = cn_move(noise, rho, rng)
+        lp_prop = self.lprob(x_prop, noise=noise_prop)
+
+        if np.log(rng.rand()) < lp_prop - lp:
+            x, noise, lp = x_prop, noise_prop, lp_prop
+            accepted += 1
+
+        chain[i] = x
+        lprobs[i] = lp
+
+        pbar.set_description('[ll/MAF:%s/%1.0f%%]' %
+                             (str(lp)[:7], accepted/(i+1)*100))
+        pbar.update(1)
+
+    pbar.close()
+
+    self.fdict['pmmh_chain'] = chain
+    self.fdict['pmmh_lprobs'] = lprobs
+    self.fdict['datetime'] = str(datetime.now())
+
+    return chain, lprobs
@@ -749,7 +749,7 @@ def cmaes2(self, p0=None, sigma=None, pop_size=None, seeds=3, seed=None, stagtol
     return f_max, x_max_scaled
 
 
-def cmaes(self, p0=None, sigma=None, pop_size=None, restart_factor=2, seeds=3, seed=None, linear=None, lprob_seed=None, update_freq=1000, verbose=True, **args):
+def cmaes(self, p0=None, sigma=None, pop_size=None, restart_factor=2, seeds=3, seed=None, linear=None, lprob_seed=None, update_freq=1000, batched=False, verbose=True, **args):
     """Find mode using CMA-ES from grgrlib.
 
     Parameters
@@ -758,6 +758,8 @@ def cmaes(self, p0=None, sigma=None, pop_size=None, restart_factor=2, seeds=3, s
         Size of each population. (Default: number of dimensions)
     seeds : in, optional
         Number of different seeds tried. (Default: 3)
+    batched : bool, optional
+        Evaluate each population in chunks (one per core) using `lprob_batch` instead of sending each candidate to the pool separately. For the linear model, the likelihoods of a chunk are evaluated in one call of a nopython kernel. (Default: False)
     """
 
     from grgrlib.optimize import cmaes as fmin
@@ -786,6 +788,15 @@ def cmaes(self, p0=None, sigma=None, pop_size=None, restart_factor=2, seeds=3, s
 
     def lprob_scaled(x): return -lprob((bnd[1] - bnd[0])*x + bnd[0])
 
+    mapper = self.mapper
+    if batched:
+        lprob_batch_global = serializer(self.lprob_batch)
+
+        def lprob_batch_scaled(X): return -lprob_batch_global(
+            (bnd[1] - bnd[0])*X + bnd[0], linear=linear, lprob_seed=lprob_seed or 'set')
+
+        mapper = self.batch_mapper(lprob_batch_scaled)
+
     if self.pool:
         self.pool.clear()
 
@@ -808,7 +819,7 @@ def cmaes(self, p0=None, sigma=None, pop_size=None, restart_factor=2, seeds=3, s
 
         np.random.seed(s)
         res = fmin(lprob_scaled, p0, sigma, popsize=pop_size,
-                   verbose=verbose, mapper=self.mapper, **args)
+                   verbose=verbose, mapper=mapper, **args)
 
         x_scaled = res[0] * (bnd[1] - bnd[0]) + bnd[0]
         f_hist.append(-res[1])
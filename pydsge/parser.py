@@ -93,6 +93,10 @@ class DSGE(dict):
     def variables(self):
         return self['var_ordering']
 
+    @property
+    def var_names(self):
+        return [v.name for v in self['var_ordering']]
+
     # ->
     @property
     def const_var(self):
@@ -1,168 +1,728 @@
 #!/bin/python
 # -*- coding: utf-8 -*-
 
-import particles
-from particles import state_space_models as ssm
+"""contains a native bootstrap/auxiliary particle filter for the nonlinear model
+"""
+
 import numpy as np
-from numba import njit, prange
+from collections import deque
+from numba import njit
+from scipy.special import ndtr
+from .kalman import fsolve_jit, log2pi, psd_sqrt
 
+aca = np.ascontiguousarray
 
-@njit(parallel=True)
-def logpdf_jit(x, get_eps_lin, locs, L, logdet, dim):
+resampling_schemes = 'systematic', 'stratified', 'multinomial'
+history_modes = 'full', 'float32', 'lag', 'checkpoint'
 
-    HALFLOG2PI = 0.5 * np.log(np.pi)
 
-    res = np.empty(locs.shape[0])
+@njit(cache=True, nogil=True)
+def obs_logpdf_jit(Y, z, L, logdet, out):
+    """Log-density of the observation `z` (NaNs removed) given the observable of each particle (rows of `Y`, same columns as `z`) and the Cholesky factor `L` of the measurement error covariance. Uses one triangular solve for all particles
+    """
 
-    for i in prange(locs.shape[0]):
-        z = np.linalg.solve(L, get_eps_lin(x, locs[i]).T)
-        res[i] = - 0.5 * np.sum(z**2) - logdet - dim * HALFLOG2PI
+    N, nobs = Y.shape
+    U = fsolve_jit(L, aca((z - Y).T))
 
-    return res
+    for i in range(N):
+        s = 0.
+        for j in range(nobs):
+            s += U[j, i]**2
+        out[i] = -.5*(nobs*log2pi + s) - logdet
+
+    return out
+
+
+@njit(cache=True, nogil=True)
+def resample_jit(W, U, out):
+    """Inverse-CDF resampling. `W` are normalized weights and `U` are sorted uniforms on [0, 1). Writes the ancestor indices to `out`
+    """
+
+    N = len(U)
+    j = 0
+    csum = W[0]
+
+    for i in range(N):
+        while U[i] > csum and j < len(W) - 1:
+            j += 1
+            csum += W[j]
+        out[i] = j
+
+    return out
 
 
-@njit(parallel=True)
-def rvs_jit(state, func, L, size, dim, dim_v):
+@njit(cache=True, nogil=True)
+def lse_jit(a):
+    """Log-sum-exp of a vector
+    """
 
-    res = np.empty((size, dim_v))
+    m = np.max(a)
+    if not np.isfinite(m):
+        return m
 
-    for i in prange(size):
-        z = np.empty(dim)
-        for j in range(dim):
-            z[j] = np.random.normal()
-        res[i] = func(state[i], np.dot(z, L.T))[0]
+    return m + np.log(np.sum(np.exp(a - m)))
+
+
+@njit(cache=True, nogil=True)
+def trace_jit(A, idx):
+    """Trace the genealogy of the particles `idx` at the last period back to the first. `A[t]` are the ancestor indices of the particles at t in t-1. Returns the indices of the ancestors for each period, shape (T, len(idx))
+    """
+
+    T = A.shape[0]
+    res = np.empty((T, len(idx)), dtype=np.int64)
+    res[T-1] = idx
+
+    for t in range(T-1, 0, -1):
+        for i in range(len(idx)):
+            res[t-1, i] = A[t, res[t, i]]
 
     return res
 
 
-class StochTFunc(particles.distributions.ProbDist):
-    def __init__(self, t_func, get_eps_lin, state, cov):
+@njit(cache=True, nogil=True)
+def hilbert_keys_jit(U, bits):
+    """Position of each row of `U` (points in the unit cube) on a Hilbert curve, with `bits` bits per dimension (Skilling, 2004). Sorting particles by these keys keeps nearby particles close to each other in the ordering. Requires `bits*d <= 63`
+    """
 
-        self.t_func = t_func
-        self.get_eps_lin = get_eps_lin
-        self.state = state
-        self.cov = cov
+    N, d = U.shape
+    M = 1 << (bits - 1)
+    top = (1 << bits) - 1
 
-        cov_error = ValueError('mvnorm: argument cov must be a dxd ndarray, \
-                               with d>1, defining a symetric positive matrix')
-        try:
-            self.L = np.linalg.cholesky(cov)
-            self.halflogdetcor = np.sum(np.log(np.diag(self.L)))
-        except:
-            raise cov_error
-        if self.dim < 2 or cov.shape != (self.dim, self.dim):
-            raise cov_error
+    keys = np.empty(N, dtype=np.int64)
+    c = np.empty(d, dtype=np.int64)
 
-    @property
-    def dim(self):
-        return self.cov.shape[0]
+    for i in range(N):
+        for j in range(d):
+            c[j] = min(int(U[i, j]*(top + 1)), top)
 
-    @property
-    def nstates(self):
-        return self.state.shape[1]
+        # inverse undo
+        Q = M
+        while Q > 1:
+            P = Q - 1
+            for j in range(d):
+                if c[j] & Q:
+                    c[0] ^= P
+                else:
+                    t = (c[0] ^ c[j]) & P
+                    c[0] ^= t
+                    c[j] ^= t
+            Q >>= 1
+
+        # gray encode
+        for j in range(1, d):
+            c[j] ^= c[j-1]
+        t = 0
+        Q = M
+        while Q > 1:
+            if c[d-1] & Q:
+                t ^= Q - 1
+            Q >>= 1
+        for j in range(d):
+            c[j] ^= t
+
+        # interleave the bits
+        key = 0
+        for b in range(bits-1, -1, -1):
+            for j in range(d):
+                key = (key << 1) | ((c[j] >> b) & 1)
+        keys[i] = key
 
-    def logpdf(self, x):
-        return logpdf_jit(x, self.get_eps_lin, self.state, self.L, self.halflogdetcor, self.dim)
+    return keys
 
-    def rvs(self, size=1):
-        return rvs_jit(self.state, self.t_func, self.L, size, self.dim, self.nstates)
 
+def lag_moments(hist, W):
+    """Weighted means and variances of the particles of each period in `hist` (a sequence of (particles, ancestors) of consecutive periods), given the weights `W` of the particles of the last period
+    """
 
-class DSGESSM(ssm.StateSpaceModel):
+    n = len(hist)
+    N, dim_x = hist[-1][0].shape
+    means = np.empty((n, dim_x))
+    variances = np.empty((n, dim_x))
+    idx = np.arange(N)
 
-    def __init__(self, t_func, obs_func, get_eps_lin, init_cov, t_cov, obs_cov, x=None):
+    for k in range(n-1, -1, -1):
+        X, anc = hist[k]
+        x = X[idx]
+        means[k] = W @ x
+        variances[k] = W @ (x - means[k])**2
+        idx = anc[idx]
 
-        self.t_func = t_func
-        self.obs_func = obs_func
-        self.get_eps_lin = get_eps_lin
+    return means, variances
 
-        self.init_x = 0. if x is None else x
 
-        self.init_cov = init_cov
-        self.t_cov = t_cov
-        self.obs_cov = obs_cov
+def base(X):
+    """The buffer of which `X` is a view
+    """
+    return X if X.base is None else X.base
 
-    def PX0(self):
-        # Distribution of X_0
-        return particles.distributions.MvNormal(loc=self.init_x, cov=self.init_cov)
 
-    def PX(self, t, xp):
-        # Distribution of X_t given X_{t-1}=xp (p=past)
-        return StochTFunc(t_func=self.t_func, get_eps_lin=self.get_eps_lin, state=xp, cov=self.t_cov)
+def trace(Xs, As, idx, out):
+    """Trace the particles `idx` at the last entry of the sequences of particles `Xs` and ancestors `As` back to the first. Writes the trajectories to `out` and returns the indices of the ancestors of the first entry
+    """
 
-    def PY(self, t, xp, x):
-        # Distribution of Y_t given X_t=x (and possibly X_{t-1}=xp)
-        return particles.distributions.MvNormal(loc=self.obs_func(x), cov=self.obs_cov)
+    for t in range(len(Xs) - 1, -1, -1):
+        out[:, t] = Xs[t][idx]
+        idx = As[t][idx]
+
+    return idx
 
 
 class ParticleFilter(object):
+    """Native particle filter.
+
+    Bootstrap filter or, with `auxiliary_bootstrap=True`, an auxiliary particle filter that pre-selects particles using the observation density at their noise-free prediction. The particles live in preallocated arrays, are moved with one call of the batched transition function per period (`t_func_batch(X, noise, out, flags)`, set by `run_filter`) and weighted by a nopython kernel that does one triangular solve for all particles. Resampling is systematic, stratified or multinomial and is triggered if the effective sample size falls below `ess_min*N`.
+
+    For correlated pseudo-marginal samplers, the random numbers can be provided (see `draw_noise`). Particles are then sorted along their first principal axis (or a Hilbert curve through the leading `sort_dim` principal axes) before resampling (unless `sort` is set to False), such that the ancestors, and hence the likelihood, change smoothly with the random numbers and the parameters.
+
+    With `adaptive=True`, the number of particles changes from period to period within `N_min` and `N_max`. After each period, the count for the next period is set such that the effective sample size after weighting would just meet `ess_target` (default: N/2) at the current rate of degeneracy (or, if `ll_var_target` is given, the effective sample size at which the relative variance of the likelihood increment, about 1/ESS - 1/N, meets that target). As the count of a period only depends on the earlier periods and never on its own weights, the likelihood estimate remains unbiased, as required by pseudo-marginal samplers. `N` is the number of particles of the first period, and the counts used are stored in `Ns`.
+
+    The history kept for smoothing is set by `history`: 'full' stores all particles, ancestors and weights, 'float32' does the same in single precision. 'lag' only keeps the last `lag` periods and provides fixed-lag smoothed means and variances (`S_lag`, `V_lag`). 'checkpoint' stores the particles every `checkpoint_every` periods (default: the square root of the sample length) and recomputes the segments when tracing trajectories backwards.
+    """
 
     name = 'ParticleFilter'
 
-    def __init__(self, N, dim_x=None, dim_z=None, seed=None, auxiliary_bootstrap=True):
+    def __init__(self, N, dim_x=None, dim_z=None, seed=None, auxiliary_bootstrap=True, resampling='systematic', ess_min=.5, sort=None, sort_dim=1, history='full', lag=10, checkpoint_every=None, adaptive=False, N_min=None, N_max=None, ess_target=None, ll_var_target=None):
+
+        if resampling not in resampling_schemes:
+            raise ValueError('[partfilt:]'.ljust(15, ' ') + " `resampling` must be one of %s, got '%s'." % (
+                resampling_schemes, resampling))
+        if history not in history_modes:
+            raise ValueError('[partfilt:]'.ljust(15, ' ') + " `history` must be one of %s, got '%s'." % (
+                history_modes, history))
+        if not 0 < sort_dim < 64:
+            raise ValueError('[partfilt:]'.ljust(15, ' ') + ' `sort_dim` must be between 1 and 63, got %s.' % sort_dim)
 
         self.N = N
-        self._dim_x = dim_x
-        self._dim_z = dim_z
+        self.dim_x = dim_x
+        self.dim_z = dim_z
         self.seed = seed
 
-        self.R = np.eye(self._dim_z)
-        self.Q = np.eye(self._dim_z)
-        self.P = np.eye(self._dim_x)
+        self.R = np.eye(self.dim_z)
+        self.Q = np.eye(self.dim_z)
+        self.P = np.eye(self.dim_x)
+        self.x = np.zeros(self.dim_x)
 
-        self.data = None
+        self.t_func = None
+        self.o_func = None
+        self.t_func_batch = None
+        self.H = None
 
-        def dummy(x): return print('implement me')
+        self.auxiliary_bootstrap = auxiliary_bootstrap
+        self.resampling = resampling
+        self.ess_min = ess_min
+        self.sort = sort
+        self.sort_dim = sort_dim
 
-        self.t_func = dummy
-        self.o_func = dummy
-        self.get_eps_lin = dummy
+        self.history = history
+        self.lag = lag
+        self.checkpoint_every = checkpoint_every
 
-        self.auxiliary_bootstrap = auxiliary_bootstrap
+        self.adaptive = adaptive
+        self.N_min = N_min or max(N // 10, 2)
+        self.N_max = N_max or 4*N
+        self.ess_target = ess_target or max(N // 2, 2)
+        self.ll_var_target = ll_var_target
 
-    @property
-    def ss_mod(self):
-        return DSGESSM(self.t_func, self.o_func, self.get_eps_lin, self.P, self.Q, self.R)
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        # buffers are allocated again when needed, the transition is set by `run_filter`
+        state.pop('_buffers', None)
+        state['t_func_batch'] = None
+
+        return state
 
     @property
-    def fk_mod(self):
+    def n_max(self):
+        """The largest number of particles a period can have
+        """
+        return max(self.N_max, self.N) if self.adaptive else self.N
+
+    def target_ess(self, n):
+        """The effective sample size required by the adaptive particle count when using `n` particles
+        """
+
+        if self.ll_var_target is not None:
+            return 1/(self.ll_var_target + 1/n)
+
+        return self.ess_target
+
+    def buffers(self):
+        """Preallocated particle arrays, reused as long as the dimensions do not change
+        """
+
+        N = self.n_max
+        shape = N, self.dim_x, self.dim_z
+        buf = getattr(self, '_buffers', None)
+
+        if buf is None or buf['shape'] != shape:
+            buf = {'shape': shape,
+                   'X': np.empty((N, self.dim_x)),
+                   'X_new': np.empty((N, self.dim_x)),
+                   'X_aux': np.empty((N, self.dim_x)),
+                   'Y': np.empty((N, self.dim_z)),
+                   'Y_aux': np.empty((N, self.dim_z)),
+                   'logw': np.empty(N),
+                   'logp': np.empty(N),
+                   'anc': np.empty(N, dtype=np.int64),
+                   'flags': np.empty(N, dtype=np.int64),
+                   'flags_aux': np.empty(N, dtype=np.int64)}
+            self._buffers = buf
+
+        return buf
+
+    def predict(self, X, eps, out, flags):
+
+        if self.t_func_batch is not None:
+            return self.t_func_batch(X, eps, out, flags)
+
+        for i in range(len(X)):
+            out[i], flags[i] = self.t_func(X[i], eps[i])
+
+        return out, flags
+
+    def observe(self, X, Y):
+
+        if self.H is not None:
+            np.dot(X, self.H[0].T, out=Y)
+            Y += self.H[1]
+        else:
+            Y[:] = self.o_func(X)
+
+        return Y
+
+    def draw_noise(self, T, rng=None):
+        """Draw the standard normal auxiliary random numbers of a filter run over `T` periods. Passing these to `batch_filter` (`noise`) makes the likelihood a smooth function of the parameters, which is what correlated pseudo-marginal samplers need
+        """
+
+        rng = rng or np.random
+        dim_e = len(self.Q)
+        N = self.n_max
+
+        noise = {'x0': rng.standard_normal((self.N, self.dim_x)),
+                 'eps': rng.standard_normal((T, N, dim_e)),
+                 'res': rng.standard_normal((T, N))}
         if self.auxiliary_bootstrap:
-            return ssm.AuxiliaryBootstrap(ssm=self.ss_mod, data=self.data)
+            noise['pilot'] = rng.standard_normal((T, N, dim_e))
+
+        return noise
+
+    def resample(self, W, out, u=None, X=None):
+        """Draw ancestor indices given the normalized weights `W`. If given, the uniforms are obtained from the standard normals `u`. If the particles `X` are given, they are sorted along a Hilbert curve first
+        """
+
+        N = len(out)
+        if u is None:
+            u = np.random.standard_normal(N)
+
+        if self.resampling == 'systematic':
+            U = (ndtr(u[0]) + np.arange(N))/N
+        elif self.resampling == 'stratified':
+            U = (ndtr(u) + np.arange(N))/N
         else:
-            # AuxiliaryBootstrap seems to perform better
-            return ssm.Bootstrap(ssm=self.ss_mod, data=self.data)
+            U = np.sort(ndtr(u))
+
+        if X is None:
+            return resample_jit(W, U, out)
+
+        order = self.sort_order(X)
+        out[:] = order[resample_jit(aca(W[order]), U, out)]
+
+        return out
+
+    def sort_order(self, X):
+        """Order of the particles for resampling.
+
+        The order is taken at full precision through a low-dimensional projection of the particles: the leading `sort_dim` principal axes of the standardized particles. For `sort_dim=1` (the default), the particles are simply sorted along the first principal axis. Each coordinate is mapped smoothly to the unit interval by the normal CDF of its standardized value, such that the ordering does not depend on extreme particles as a bounding box would.
+        """
+
+        sd = X.std(axis=0)
+        Y = (X - X.mean(axis=0))/np.where(sd > 0, sd, 1)
+
+        sort_dim = getattr(self, 'sort_dim', 1)
+        if Y.shape[1] > sort_dim:
+            _, s, Vt = np.linalg.svd(Y, full_matrices=False)
+            Vt, s = Vt[:sort_dim], s[:sort_dim]
+            # fix the signs of the axes, such that the ordering changes smoothly with the particles
+            Vt *= np.sign(Vt[np.arange(len(Vt)), np.argmax(np.abs(Vt), axis=1)])[:, None]
+            Y = Y @ Vt.T/np.where(s > 0, s, 1)*np.sqrt(len(Y))
+
+        U = ndtr(Y)
+
+        if U.shape[1] == 1:
+            return np.argsort(U[:, 0], kind='stable')
+
+        bits = min(63 // U.shape[1], 32)
+
+        return np.argsort(hilbert_keys_jit(aca(U), bits), kind='stable')
+
+    def obs_density(self, z, cov=None):
+        """Cholesky factor and log-determinant of the measurement error covariance (or `cov`) of the observed entries of `z`. For the measurement errors, these are cached by pattern of missing values
+        """
 
-    def simulate(self, niter):
+        obs = ~np.isnan(z)
 
-        true_states, sim_data = self.ss_mod.simulate(niter)
-        true_states = np.array(true_states).reshape(niter, self._dim_x)
-        sim_data = np.array(sim_data).squeeze()
+        if cov is not None:
+            L = np.linalg.cholesky(cov[obs][:, obs])
+            return obs, aca(L), np.sum(np.log(np.diag(L)))
 
-        return true_states, sim_data
+        cache = self.__dict__.setdefault('_obs_chol', {})
+        key = obs.tobytes(), self.R.tobytes()
 
-    def batch_filter(self, data=None):
+        if key not in cache:
+            if len(cache) > 8:
+                cache.clear()
+            L = np.linalg.cholesky(self.R[obs][:, obs])
+            cache[key] = obs, aca(L), np.sum(np.log(np.diag(L)))
 
-        if data is not None:
-            self.data = data
+        return cache[key]
 
-        self.pf = particles.SMC(
-            fk=self.fk_mod, N=self.N, seed=self.seed, moments=False, store_history=True)
-        self.pf.run()
+    def logpdf(self, X, Y, z, out, cov=None):
+        """Log-density of the observation `z` for each particle in `X`. Uses the measurement error covariance unless `cov` is given
+        """
 
-        self.X = np.array(self.pf.hist.X).swapaxes(
-            0, 1).reshape(self.N, len(self.data), self._dim_x)
+        obs, L, logdet = self.obs_density(z, cov)
 
-        return self.X
+        if not obs.any():
+            out[:] = 0
+            return out
+
+        self.observe(X, Y)
+
+        return obs_logpdf_jit(aca(Y[:, obs]), z[obs], L, logdet, out)
+
+    def batch_filter(self, Z=None, seed=None, store=True, calc_ll=False, noise=None, verbose=False):
+        """Batch filter.
+
+        Runs the particle filter on the full dataset.
+
+        Parameters
+        ----------
+        Z : array, optional
+            The data, shape (T, dim_z). Defaults to the data of the last call
+        seed : int, optional
+            Random seed. Defaults to `self.seed`
+        store : bool, optional
+            Whether to store the history required by the smoother (see `history`). Defaults to True
+        calc_ll : bool, optional
+            Whether to return the log-likelihood instead of the filtered particles. Defaults to False
+        noise : dict, optional
+            Standard normal random numbers as returned by `draw_noise`, used instead of drawing from the random state
+
+        Returns
+        -------
+        float or array
+            The log-likelihood if `calc_ll` is True. Otherwise the filtered particles of shape (N, T, dim_x) if the full history is kept with a fixed number of particles, and the filtered means of shape (T, dim_x) if not
+        """
+
+        if Z is not None:
+            self.Z = Z
+        Z = aca(self.Z, dtype=float)
+
+        T = Z.shape[0]
+        N, dim_x = self.N, self.dim_x
+        history = self.history if store or not calc_ll else None
+
+        seeded = seed if seed is not None else self.seed
+        if seeded is not None:
+            np.random.seed(seeded)
+
+        ctx = self.context(T, noise)
+        buf = self.buffers()
+        X, X_new = buf['X'][:N], buf['X_new']
+
+        if noise is not None and 'x0' in noise:
+            X[:] = self.x + noise['x0'] @ psd_sqrt(self.P).T
+        else:
+            X[:] = np.random.multivariate_normal(self.x, self.P, size=N)
+        buf['logw'][:N] = -np.log(N)
+
+        if history in ('full', 'float32'):
+            dtype = float if history == 'full' else np.float32
+            itype = np.int64 if history == 'full' else np.int32
+            if self.adaptive:
+                # the number of particles differs between periods
+                self.Xs, self.As, self.Ws = [None]*T, [None]*T, [None]*T
+            else:
+                self.Xs = np.empty((T, N, dim_x), dtype=dtype)
+                self.As = np.empty((T, N), dtype=itype)
+                self.Ws = np.empty((T, N), dtype=dtype)
+
+        elif history == 'lag':
+            hist = deque(maxlen=self.lag + 1)
+            self.S_lag = np.empty((T, dim_x))
+            self.V_lag = np.empty((T, dim_x))
+
+        elif history == 'checkpoint':
+            every = self.checkpoint_every or max(int(np.sqrt(T)), 1)
+            self.checkpoints = []
+
+        if not calc_ll:
+            means = np.empty((T, dim_x))
+
+        logw = buf['logw'][:N]
+        ll = 0
+        ess = np.empty(T)
+        self.Ns = np.zeros(T, dtype=int)
+
+        for t in range(T):
+
+            if history == 'checkpoint' and not t % every:
+                self.checkpoints.append((t, X.copy(), buf['logw'][:len(X)].copy(
+                ), np.random.get_state(), ctx['n']))
+
+            X, X_new, ll_t, ess[t] = self.advance(t, Z[t], X, X_new, ctx)
+            ll += ll_t
+
+            if not np.isfinite(ll):
+                # no particle is compatible with the data
+                ll = -np.inf
+                break
+
+            n = self.Ns[t] = len(X)
+            logw, anc = buf['logw'][:n], buf['anc'][:n]
+
+            if not calc_ll:
+                means[t] = np.exp(logw) @ X
+
+            if history in ('full', 'float32'):
+                self.Xs[t] = X.astype(dtype)
+                self.As[t] = anc.astype(itype)
+                self.Ws[t] = logw.astype(dtype)
+
+            elif history == 'lag':
+                hist.append((X.copy(), anc.copy()))
+                if len(hist) == self.lag + 1:
+                    m, v = lag_moments(hist, np.exp(logw))
+                    self.S_lag[t - self.lag], self.V_lag[t - self.lag] = m[0], v[0]
+
+        if history == 'lag' and np.isfinite(ll):
+            # the last periods are smoothed with all data
+            m, v = lag_moments(hist, np.exp(logw))
+            self.S_lag[T-len(hist):], self.V_lag[T-len(hist):] = m, v
+
+        if history == 'checkpoint':
+            self.final_logw = logw.copy()
+            self.noise = noise
+
+        # keep the buffers in place for the next call
+        buf['X'], buf['X_new'] = base(X), X_new
+
+        self.ess = ess
+        self.ll = ll
+
+        if verbose and self.adaptive:
+            print('[partfilt:]'.ljust(15, ' ') + ' Used %s particles on average (min %s, max %s).' %
+                  (int(np.mean(self.Ns)), np.min(self.Ns), np.max(self.Ns)))
+
+        if calc_ll:
+            return ll
+
+        if history in ('full', 'float32') and not self.adaptive:
+            self.X = self.Xs.swapaxes(0, 1)
+            return self.X
+
+        return means
+
+    def context(self, T, noise):
+        """Quantities that are constant over one filter run
+        """
+
+        # square root of the (possibly singular) covariance of the shocks
+        Q_sqrt = psd_sqrt(self.Q)
+
+        if noise is None:
+            def draw(size, key, t): return np.random.standard_normal(size)
+            res = [None]*T
+        else:
+            def draw(size, key, t): return noise[key][t][:size[0]]
+            res = noise['res']
+
+        sort = self.sort if self.sort is not None else noise is not None
+
+        return {'Q_sqrt': Q_sqrt, 'dim_e': len(Q_sqrt), 'draw': draw, 'res': res, 'sort': sort, 'n': self.N}
+
+    def advance(self, t, z, X, X_new, ctx):
+        """One period of the filter. With an adaptive particle count, the period uses the count set in the last period, and the count for the next period is set from the effective sample size of this one. Returns the same as `step`
+        """
+
+        if not self.adaptive:
+            return self.step(t, z, X, X_new, ctx)
+
+        n = ctx['n']
+        X_out, spare, ll, ess = self.step(t, z, X, X_new, ctx, n)
+
+        # the count of each period only depends on the earlier periods, which keeps the likelihood estimate unbiased
+        logw = self.buffers()['logw']
+        target = self.target_ess(n)
+        ess_post = 1/np.sum(np.exp(logw[:n])**2) if np.isfinite(ll) else 0
+
+        n_next = int(np.ceil(n*target/ess_post)) if ess_post > 0 else self.n_max
+        ctx['n'] = min(max(n_next, self.N_min), self.n_max)
+
+        return X_out, spare, ll, ess
+
+    def step(self, t, z, X, X_new, ctx, n=None):
+        """One period of the filter, moving the particles `X` to `n` new particles (by default as many as in `X`) in the buffer `X_new`. Updates the log-weights and ancestors in the buffers. Returns the new particles, the buffer holding the old ones, the increment of the log-likelihood and the effective sample size
+        """
+
+        buf = self.buffers()
+        n_old = len(X)
+        n = n or n_old
+
+        X_aux, Y, Y_aux, logp, flags, flags_aux = [buf[k][:n_old] for k in (
+            'X_aux', 'Y', 'Y_aux', 'logp', 'flags', 'flags_aux')]
+        logw_old = buf['logw'][:n_old]
+        logw, anc = buf['logw'][:n], buf['anc'][:n]
+
+        dim_e, Q_sqrt, draw = ctx['dim_e'], ctx['Q_sqrt'], ctx['draw']
+        X_sort = X if ctx['sort'] else None
+        u = ctx['res'][t]
+        u = u[:n] if u is not None else None
+        ll = 0
+
+        if self.auxiliary_bootstrap:
+            # first stage weights using the noise-free prediction. The predictive variance due to the shocks is estimated from a pilot draw
+            X_pred = X_new[:n_old]
+            self.predict(X, np.zeros((n_old, dim_e)), X_pred, flags)
+            eps = draw((n_old, dim_e), 'pilot', t) @ Q_sqrt.T
+            self.predict(X, eps, X_aux, flags_aux)
+            ok = ~(flags | flags_aux).astype(bool)
+            D = self.observe(X_aux, Y) - self.observe(X_pred, Y_aux)
+            cov = self.R + np.cov(D[ok].T) if ok.sum() > 1 else self.R
+
+            logeta = self.logpdf(X_pred, Y, z, logp, cov).copy()
+            logeta[~ok] = -np.inf
+            lw = logw_old + logeta
+            ll += lse_jit(lw)
+            self.resample(np.exp(lw - lse_jit(lw)), anc, u, X_sort)
+            logw[:] = -np.log(n) - logeta[anc]
+
+        else:
+            W = np.exp(logw_old - lse_jit(logw_old))
+            ess = 1/np.sum(W**2)
+
+            if ess < self.ess_min*n_old or n != n_old:
+                self.resample(W, anc, u, X_sort)
+                logw[:] = -np.log(n)
+            else:
+                anc[:] = np.arange(n)
+                logw -= lse_jit(logw)
+
+        Y, logp, flags = buf['Y'][:n], buf['logp'][:n], buf['flags'][:n]
+
+        # propagate the selected particles
+        eps = draw((n, dim_e), 'eps', t) @ Q_sqrt.T
+        self.predict(aca(X[anc]), eps, X_new[:n], flags)
+        X, X_new = X_new[:n], base(X)
+
+        self.logpdf(X, Y, z, logp)
+        logp[flags.astype(bool)] = -np.inf
+        logw += logp
+
+        lse = lse_jit(logw)
+        ll += lse
+        if np.isfinite(lse):
+            logw -= lse
+
+        if self.auxiliary_bootstrap:
+            ess = 1/np.sum(np.exp(logw)**2)
+
+        return X, X_new, ll, ess
 
     def smoother(self, nback=False):
+        """Smoothed states. Requires that `batch_filter` was run with `store=True`.
+
+        With a full history, trajectories are drawn by tracing the genealogy of particles drawn at the last period. With `history='checkpoint'`, the same is done segment by segment, recomputing the particles and ancestors of each segment from the stored checkpoints. With `history='lag'`, the fixed-lag smoothed means are returned.
 
-        if nback > 1:
-            smooth_trajectories = self.pf.hist.backward_sampling(nback)
-            self.S = np.array(smooth_trajectories).swapaxes(
-                0, 1).reshape(nback, len(self.data), self._dim_x)
+        Parameters
+        ----------
+        nback : int, optional
+            Number of trajectories. If not larger than one, a single trajectory is returned
+
+        Returns
+        -------
+        array
+            The trajectories, shape (nback, T, dim_x) or (T, dim_x)
+        """
+
+        if self.history == 'lag':
+            self.S = self.S_lag
+            return self.S
+
+        nsamples = max(int(nback), 1)
+        idx = np.empty(nsamples, dtype=np.int64)
+
+        if self.history == 'checkpoint':
+            self.resample(np.exp(self.final_logw), idx)
+            S = self.recompute(idx)
+
+        elif isinstance(self.Xs, list):
+            self.resample(np.exp(self.Ws[-1].astype(float)), idx)
+            S = np.empty((nsamples, len(self.Xs), self.dim_x))
+            trace(self.Xs, self.As, idx, S)
 
         else:
-            smooth_trajectories = self.pf.hist.extract_one_trajectory()
-            self.S = np.array(smooth_trajectories)
+            T = self.Xs.shape[0]
+            self.resample(np.exp(self.Ws[-1].astype(float)), idx)
+            paths = trace_jit(aca(self.As, dtype=np.int64), idx)
+            S = self.Xs[np.arange(T)[:, None], paths].swapaxes(0, 1)
+
+        self.S = S if nback > 1 else S[0]
 
         return self.S
+
+    def recompute(self, idx):
+        """Trace the particles `idx` at the last period back through the checkpoints, rerunning the filter over one segment at a time. Only the history of a single segment is kept in memory
+        """
+
+        T = len(self.Z)
+        Z = aca(self.Z, dtype=float)
+        S = np.empty((len(idx), T, self.dim_x))
+
+        ctx = self.context(T, self.noise)
+        buf = self.buffers()
+        state = np.random.get_state()
+        bounds = [c[0] for c in self.checkpoints[1:]] + [T]
+
+        for (t0, X0, logw0, rstate, n0), t1 in reversed(list(zip(self.checkpoints, bounds))):
+
+            np.random.set_state(rstate)
+            X, X_new = buf['X'][:len(X0)], buf['X_new']
+            X[:] = X0
+            buf['logw'][:len(X0)] = logw0
+            ctx['n'] = n0
+
+            Xs, As = [], []
+
+            for t in range(t0, t1):
+                X, X_new, _, _ = self.advance(t, Z[t], X, X_new, ctx)
+                Xs.append(X.copy())
+                As.append(buf['anc'][:len(X)].copy())
+
+            idx = trace(Xs, As, idx, S[:, t0:t1])
+
+        np.random.set_state(state)
+
+        return S
+
+    def simulate(self, niter, x=None):
+        """Simulate states and observables from the state space model
+        """
+
+        Q_sqrt = psd_sqrt(self.Q)
+        R_sqrt = psd_sqrt(self.R)
+
+        X = np.empty((niter + 1, self.dim_x))
+        Y = np.empty((niter, self.dim_z))
+        flags = np.empty(1, dtype=np.int64)
+
+        X[0] = self.x if x is None else x
+
+        for t in range(niter):
+            eps = (Q_sqrt @ np.random.standard_normal(len(Q_sqrt)))[None]
+            self.predict(aca(X[t:t+1]), aca(eps), X[t+1:t+2], flags)
+            self.observe(X[t+1:t+2], Y[t:t+1])
+            Y[t] += R_sqrt @ np.random.standard_normal(self.dim_z)
+
+        return X[1:], Y
@@ -0,0 +1,174 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a piecewise-linear Kalman filter that conditions on the regime implied by the filtered mean
+"""
+
+import numpy as np
+from numba import njit
+from .engine import boehlgorithm_jit
+from .kalman import update_jit, fsolve_jit, smoother_gain_jit, log2pi
+
+aca = np.ascontiguousarray
+
+
+@njit(cache=True, nogil=True)
+def pwl_kf_jit(Z, x0, P0, SQS, H, d, R, N, A, J, cx, b, x_bar, mat, term, bmat, bterm, max_cnt, store):
+    """Kalman filter with the affine transition of the regime `(l, k)` that the transition function picks for the filtered mean of the last period
+    """
+
+    T, dim_z = Z.shape
+    dim_v = x0.shape[0]
+    dim_x = J.shape[0]
+
+    means = np.empty((T, dim_v))
+    covs = np.empty((T if store else 0, dim_v, dim_v))
+    x_priors = np.empty((T if store else 0, dim_v))
+    P_priors = np.empty((T if store else 0, dim_v, dim_v))
+    Fs = np.empty((T if store else 0, dim_v, dim_v))
+    regimes = np.empty((T, 2), dtype=np.int64)
+    flags = np.empty(T, dtype=np.int64)
+
+    x = x0.copy()
+    P = P0.copy()
+    ll = 0.
+
+    for t in range(T):
+
+        # the regime is determined at the mean. The shocks have mean zero
+        x, (l, k), flags[t] = boehlgorithm_jit(
+            N, A, J, cx, b, x_bar, x, mat, term, bmat, bterm, max_cnt)
+        regimes[t] = l, k
+
+        F = aca(mat[l, k, 1, dim_x:])
+        P = F @ (P + SQS) @ aca(F.T)
+        P = (P + P.T)/2
+
+        if store:
+            x_priors[t] = x
+            P_priors[t] = P
+            Fs[t] = F
+
+        z = Z[t]
+        obs = ~np.isnan(z)
+        nobs = np.sum(obs)
+
+        if nobs:
+            Ho = aca(H[obs])
+            K, P, L, logdet = update_jit(P, Ho, aca(R[obs][:, obs]))
+
+            y = z[obs] - Ho @ x - d[obs]
+            u = fsolve_jit(L, y.reshape(-1, 1))[:, 0]
+
+            ll -= .5*(nobs*log2pi + logdet + np.sum(u**2))
+            x = x + K @ y
+
+        means[t] = x
+        if store:
+            covs[t] = P
+
+    return means, covs, ll, regimes, flags, x_priors, P_priors, Fs
+
+
+class PiecewiseKalmanFilter(object):
+    """Deterministic piecewise-linear Kalman filter for the nonlinear model, in the spirit of OccBin-style filters.
+
+    Each period, the regime (the expected duration of the constrained spell and the period in which it begins) is determined by the transition function at the filtered mean of the last period. The covariance is then propagated with the affine transition of this regime and the update is the usual Kalman update. The filter uses no random numbers and runs at close to the speed of the linear Kalman filter, which makes it a fast approximate likelihood for mode finding, or a first stage for the ensemble filters.
+
+    The regime matrices (`precalc_mat`), the system (`sys`) and the shock loadings (`SIG`) are set by `run_filter`. The regimes of the last run are stored in `regimes`, and periods in which the transition function flagged an error in `flags`.
+    """
+
+    name = 'PiecewiseKalmanFilter'
+
+    def __init__(self, dim_x, dim_z, max_cnt=4e1):
+
+        self.dim_x = dim_x
+        self.dim_z = dim_z
+        self.max_cnt = max_cnt
+
+        self.precalc_mat = None
+        self.sys = None
+        self.SIG = None
+        self.H = None
+
+        self.R = np.eye(dim_z)
+        self.Q = np.eye(dim_x)
+        self.P = np.eye(dim_x)
+        self.x = np.zeros(dim_x)
+
+    def batch_filter(self, Z, store=False, calc_ll=False, noise=None, verbose=False):
+        """Batch filter.
+
+        Parameters
+        ----------
+        Z : array
+            The data, shape (T, dim_z). NaNs are treated as missing.
+        store : bool, optional
+            Whether to store the predictions required by the smoother. Defaults to False.
+        calc_ll : bool, optional
+            Whether to return the log-likelihood instead of the filtered means and covariances. Defaults to False.
+        noise : None
+            Only for compatibility with the ensemble filters. The filter does not use random numbers.
+
+        Returns
+        -------
+        float or tuple
+            The log-likelihood if `calc_ll` is True, the filtered means (T, dim_x) and covariances (T, dim_x, dim_x) otherwise
+        """
+
+        self.Z = Z
+
+        mat, term, bmat, bterm = self.precalc_mat
+        N, A, J, cx, b, x_bar = self.sys
+        SIG = np.asarray(self.SIG, dtype=float)
+        SQS = aca(SIG @ self.Q @ SIG.T)
+
+        H = aca(self.H[0], dtype=float)
+        d = aca(self.H[1], dtype=float).reshape(-1)
+        store = store or not calc_ll
+
+        try:
+            means, covs, ll, self.regimes, self.flags, x_priors, P_priors, Fs = pwl_kf_jit(
+                aca(Z, dtype=float), aca(self.x, dtype=float), aca(self.P, dtype=float), SQS, H, d, aca(self.R, dtype=float), N, A, J, cx, b, x_bar, mat, term, bmat, bterm, self.max_cnt, store)
+        except np.linalg.LinAlgError:
+            # innovation covariance is not positive definite
+            if calc_ll:
+                return -np.inf
+            raise
+
+        if store:
+            self.x_priors, self.P_priors, self.Fs = x_priors, P_priors, Fs
+
+        self.ll = ll
+
+        if calc_ll:
+            return ll
+
+        return means, covs
+
+    def rts_smoother(self, res, rcond=None):
+        """Rauch-Tung-Striebel smoother using the transitions of the filtered regimes. `rcond` is ignored and only kept for compatibility
+
+        Returns
+        -------
+        means : array
+            Smoothed means
+        covs : array
+            Smoothed covariances
+        """
+
+        means, covs = res
+        means, covs = means.copy(), covs.copy()
+
+        SIG = np.asarray(self.SIG, dtype=float)
+        SQS = SIG @ self.Q @ SIG.T
+
+        for t in range(len(means)-2, -1, -1):
+
+            F = self.Fs[t+1]
+            K, _ = smoother_gain_jit(covs[t], F, aca(F @ SQS @ F.T))
+
+            means[t] += K @ (means[t+1] - self.x_priors[t+1])
+            covs[t] += K @ (covs[t+1] - self.P_priors[t+1]) @ K.T
+
+        return means, covs
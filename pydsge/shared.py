@@ -0,0 +1,111 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains preallocated result arrays that pool workers write into directly, either in shared memory or as memory-mapped files on disk
+"""
+
+import os
+import uuid
+import tempfile
+import numpy as np
+
+
+def shm_dir():
+    """Directory for arrays in shared memory. Falls back to the temporary directory if there is no tmpfs at /dev/shm
+    """
+
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+
+    return tempfile.gettempdir()
+
+
+class SharedArrays(object):
+    """A set of preallocated result arrays, backed by `.npy` files.
+
+    With `storage='shm'` the files live in shared memory and are removed as soon as the arrays are released, with `storage='disk'` they are memory-mapped files in `path` that persist and can be loaded later using `np.load(..., mmap_mode='r')`. If `path` is not given, a fresh temporary directory is created. The file names carry a unique suffix, such that repeated or concurrent runs never write into the files of another run. The files on disk are owned by the caller, who is responsible for deleting them (the directory is stored in `path`). With `resume=True`, the file names are fixed and existing files in `path` are reopened instead of being overwritten. When pickled, only the file names are send along, and the unpickled object in the worker attaches to the same files. Workers hence write their slices in place, such that results do not need to be pickled and stacked in the parent process.
+    """
+
+    def __init__(self, shapes, storage='shm', path=None, prefix='pydsge', resume=False):
+
+        if storage not in ('shm', 'disk'):
+            raise ValueError('[shared:]'.ljust(15, ' ') +
+                             " `storage` must be one of ('shm', 'disk'), got '%s'." % storage)
+
+        self.storage = storage
+
+        if storage == 'shm':
+            path = shm_dir()
+        elif path is None:
+            path = tempfile.mkdtemp(prefix=prefix + '_')
+        else:
+            os.makedirs(path, exist_ok=True)
+
+        # only resumed runs attach to the files of an earlier run
+        if storage == 'shm' or not resume:
+            prefix += '_' + uuid.uuid4().hex[:8]
+
+        self.path = path
+
+        self.files = {}
+        self.arrays = {}
+        self.resumed = False
+
+        for name, (shape, dtype) in shapes.items():
+            fname = os.path.join(path, '%s_%s.npy' % (prefix, name))
+
+            if resume and storage == 'disk' and os.path.exists(fname):
+                arr = np.load(fname, mmap_mode='r+')
+                if arr.shape != tuple(shape) or arr.dtype != np.dtype(dtype):
+                    raise ValueError('[shared:]'.ljust(15, ' ') + " '%s' has shape %s and dtype %s, but %s and %s were requested." % (
+                        fname, arr.shape, arr.dtype, tuple(shape), np.dtype(dtype)))
+                self.files[name] = fname
+                self.arrays[name] = arr
+                self.resumed = True
+                continue
+
+            arr = np.lib.format.open_memmap(
+                fname, mode='w+', dtype=dtype, shape=shape)
+            if np.issubdtype(arr.dtype, np.floating):
+                # rows that are never written (e.g. failed samples) remain NaN
+                arr[:] = np.nan
+            self.files[name] = fname
+            self.arrays[name] = arr
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __getstate__(self):
+        # only the file names are send to workers
+        return {'storage': self.storage, 'files': self.files}
+
+    def __setstate__(self, state):
+
+        self.storage = state['storage']
+        self.files = state['files']
+        self.arrays = {name: np.load(fname, mmap_mode='r+')
+                       for name, fname in self.files.items()}
+
+    def write(self, i, **values):
+        """Write the results of sample `i`
+        """
+
+        for name, val in values.items():
+            self.arrays[name][i] = val
+
+    def flush(self):
+        """Make sure everything written so far is on disk
+        """
+
+        for arr in self.arrays.values():
+            arr.flush()
+
+    def release(self):
+        """Flush the arrays and, for shared memory, remove the files. The arrays of this process stay valid until they are garbage collected
+        """
+
+        self.flush()
+
+        for name, fname in self.files.items():
+            if self.storage == 'shm' and os.path.exists(fname):
+                os.unlink(fname)
@@ -0,0 +1,174 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a compact, numeric-only representation of a model that can be send to workers or stored on disk
+"""
+
+import os
+import copy
+import numpy as np
+import cloudpickle as cpickle
+from .core import get_sys, get_par, set_par
+from .tools import t_func, o_func, calc_obs, lin_t_func, lin_o_func, get_eps_lin, extract_lin
+from .filtering import create_filter, run_filter, get_ll
+from .timing import get_timer
+
+# the parts of `fdict` that are needed for computations. Everything else (model dumps, raw yaml, chains, ...) is left behind
+fdict_keys = 'name', 'reduce_sys', 'ignore_tests', 'filter_n', 'linear', 'seed', 'biject', 'prior_names', 'prior_bounds', 'frozen_prior', 'init_value', 'kernels'
+
+# attributes of the solved model that are copied
+sys_keys = 'par', 'ppar', 'lks', 'sys', 'precalc_mat', 'hx', 'obs_arg', 'SIG', 'vv', 'vx', 'dim_x', 'dim_v', 'out_msk', 'P', 'data', 'Z', '_Z_data', 'filter', 'kernels_fit'
+
+# jitted functions and callbacks that are recreated when needed (and would otherwise drag the whole model along)
+callback_keys = 't_func', 'o_func', 'get_eps', 'get_eps_lin'
+
+# compiled functions. These are always serialized with cloudpickle, so that also dill & co can deal with snapshots
+func_keys = 'pcompile', 'parafunc', 'AA', 'BB', 'CC', 'bb', 'PSI', 'ZZ', 'DD', 'QQ', 'HH'
+
+
+class Snapshot(object):
+    """Numeric snapshot of a DSGE model.
+
+    Contains the parameter metadata, the compiled functions that map parameters to system matrices, the current solution (`sys`, `precalc_mat`, `hx`, `SIG`, ...), the data and the filter, but no symbolic objects. Snapshots are cheap to pickle and can be loaded from disk without parsing the model again.
+
+    The filter is not copied but shared with the model the snapshot is taken from.
+    """
+
+    def __init__(self, model):
+
+        self.name = model.name
+        self.path = model.path
+        self.debug = model.debug
+        # shared with the model
+        self.timer = get_timer(model)
+
+        # parameter metadata
+        self.par_names = model.par_names
+        self.par_fix = model.par_fix.copy()
+        self.prior = model.prior
+        self.prior_arg = model.prior_arg
+        self.prior_names = model.prior_names
+        self.parafunc = model.parafunc
+
+        # compiled parameter -> matrix functions
+        self.pcompile = model.pcompile
+        self.AA = model.AA
+        self.BB = model.BB
+        self.CC = model.CC
+        self.bb = model.bb
+        self.PSI = model.PSI
+        self.ZZ = model.ZZ
+        self.DD = model.DD
+        self.QQ = model.QQ
+        self.HH = model.HH
+
+        # model structure
+        self.var_names = model.var_names
+        self.const_var = str(model.const_var) if model.const_var else []
+        self.shocks = model.shocks
+        self.observables = model.observables
+        self.ny = model.ny
+        self.neps = model.neps
+
+        self.fdict = {k: model.fdict[k]
+                      for k in fdict_keys if k in model.fdict.keys()}
+
+        for k in sys_keys:
+            if hasattr(model, k):
+                setattr(self, k, getattr(model, k))
+
+    def __repr__(self):
+        return "A numeric snapshot of the DSGE model '%s'." % self.name
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+
+        for k in ('t_func_jit', 'o_func_jit', 'get_eps_jit'):
+            state.pop(k, None)
+
+        if 'filter' in state:
+            # callbacks are reassigned by `run_filter` anyways
+            f = copy.copy(state['filter'])
+            for k in callback_keys:
+                if k in f.__dict__:
+                    setattr(f, k, None)
+            state['filter'] = f
+
+        for k in func_keys:
+            if k in state:
+                state[k] = cpickle.dumps(state[k], protocol=4)
+
+        return state
+
+    def __setstate__(self, state):
+
+        for k in func_keys:
+            if k in state:
+                state[k] = cpickle.loads(state[k])
+
+        self.__dict__.update(state)
+
+    @property
+    def parameters(self):
+        return self.par_names
+
+    def p0(self):
+        return list(self.par_fix)
+
+    def save(self, filename=None, verbose=True):
+        """Store the snapshot on disk.
+
+        Parameters
+        ----------
+        filename : str, optional
+            Defaults to '<name>_snapshot' in the directory of the model.
+        """
+
+        filename = filename or os.path.join(self.path, self.name + '_snapshot')
+
+        np.savez_compressed(filename, snapshot=cpickle.dumps(self, protocol=4))
+
+        if verbose:
+            print('[snapshot:]'.ljust(15, ' ') +
+                  " Snapshot saved as '%s'" % filename)
+
+        return
+
+    @classmethod
+    def load(cls, npzfile):
+        """Load a snapshot that was stored using `Snapshot.save`. Does not require to parse the model.
+        """
+
+        if npzfile[-4:] != '.npz':
+            npzfile += '.npz'
+
+        snap = cpickle.loads(np.load(npzfile, allow_pickle=True)['snapshot'])
+        snap.path = os.path.dirname(npzfile)
+
+        return snap
+
+
+def snapshot(self):
+    """Create a numeric snapshot of the model using the current parameters. See `pydsge.snapshot.Snapshot`.
+    """
+
+    if not hasattr(self, 'sys'):
+        get_sys(self)
+
+    return Snapshot(self)
+
+
+Snapshot.get_sys = get_sys
+Snapshot.get_par = get_par
+Snapshot.set_par = set_par
+Snapshot.t_func = t_func
+Snapshot.o_func = o_func
+Snapshot.obs = calc_obs
+Snapshot.lin_t_func = lin_t_func
+Snapshot.lin_o_func = lin_o_func
+Snapshot.get_eps_lin = get_eps_lin
+Snapshot.extract_lin = extract_lin
+Snapshot.create_filter = create_filter
+Snapshot.run_filter = run_filter
+Snapshot.get_ll = get_ll
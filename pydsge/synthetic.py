@@ -0,0 +1,271 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a generator for synthetic models and data of arbitrary size, e.g. for scaling benchmarks
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# the NK core that every synthetic model is build around. It has the same structure as the `dfi` example
+core_vars = ['Pi', 'c', 'y', 'dy', 'r', 'rn', 'u', 'z', 'vr']
+core_shocks = ['e_z', 'e_u', 'e_r']
+core_obs = {'GDP': 'dy + y_mean', 'Infl': 'Pi + pi_mean', 'FFR': 'r + 1/beta'}
+
+core_cal = {'beta': .99, 'theta': .66, 'sigma': 1.5, 'phi_pi': 1.7, 'phi_y': .125, 'rho': .8, 'rho_u': .8, 'rho_z': .9,
+            'rho_r': .7, 'sig_u': .5, 'sig_z': .3, 'sig_r': .3, 'delta': .9, 'y_mean': .35, 'pi_mean': .5, 'elb_level': .07}
+
+core_prior = {'theta': '[0.7813, 0.2, 0.95, beta, 0.5, 0.10]',
+              'sigma': '[1.2312, 0.25, 3, normal, 1.50, 0.375]',
+              'phi_pi': '[1.7985, 1.0, 3, normal, 1.5, 0.25]',
+              'phi_y': '[0.0893, 0.001, 0.5, normal, 0.125, 0.05]',
+              'rho': '[0.8, 0.5, 0.975, beta, 0.75, 0.10]'}
+
+ar_prior = '[.7, .01, .9999, beta, 0.5, 0.20]'
+sig_prior = '[0.5, 0.01, 3, inv_gamma_dynare, 0.1, 2]'
+
+
+def model_size(nfwd=0, nshocks=3, nlags=1):
+    """Minimum number of variables of a synthetic model with the given structure
+    """
+
+    return len(core_vars) + nfwd + (nshocks - 3) + nshocks*(nlags - 1)
+
+
+def gen_yaml(nvars=None, nfwd=0, nshocks=3, nobs=3, nlags=1, name=None):
+    """Generate the YAML description of a synthetic model.
+
+    The model consists of a small New Keynesian core with a ZLB (the same structure as the `dfi` example), a chain of `nfwd` forward-looking variables, `nshocks` exogenous AR(`nlags`) processes and static variables that pad the model up to `nvars` variables. The model is determinate for the calibration and the prior mean by construction.
+
+    Parameters
+    ----------
+    nvars : int, optional
+        Total number of variables. Defaults to the minimum size given the other arguments (see `model_size`).
+    nfwd : int, optional
+        Number of additional forward-looking equations. Defaults to 0.
+    nshocks : int, optional
+        Number of exogenous shocks. Must be at least 3. Defaults to 3.
+    nobs : int, optional
+        Number of observables. Must be at least 3. Additional observables are the forward-looking, static and exogenous variables (in that order). Defaults to 3.
+    nlags : int, optional
+        Number of lags of the exogenous processes. Lags beyond the first are implemented with auxiliary variables. Defaults to 1.
+    name : str, optional
+        Name of the model. Defaults to 'synth_<nvars>'.
+
+    Returns
+    -------
+    str
+        The YAML text
+    """
+
+    min_vars = model_size(nfwd, nshocks, nlags)
+
+    if nshocks < 3:
+        raise ValueError('[synthetic:]'.ljust(
+            15, ' ') + ' `nshocks` must be at least 3.')
+    if nlags < 1:
+        raise ValueError('[synthetic:]'.ljust(
+            15, ' ') + ' `nlags` must be at least 1.')
+
+    nvars = nvars or min_vars
+
+    if nvars < min_vars:
+        raise ValueError('[synthetic:]'.ljust(
+            15, ' ') + ' A model with this structure needs at least %s variables, got %s.' % (min_vars, nvars))
+
+    nstatic = nvars - min_vars
+    name = name or 'synth_%s' % nvars
+
+    variables = core_vars.copy()
+    shocks = core_shocks.copy()
+    parameters = list(core_cal)
+    cal = core_cal.copy()
+    prior = core_prior.copy()
+    observables = core_obs.copy()
+
+    # exogenous processes
+    procs = [('z', 'e_z', 'rho_z'), ('u', 'e_u', 'rho_u'), ('vr', 'e_r', 'rho_r')]
+    for i in range(nshocks - 3):
+        g, e, rho, sig = 'g%s' % i, 'e_g%s' % i, 'rho_g%s' % i, 'sig_g%s' % i
+        procs.append((g, e, rho))
+        variables.append(g)
+        shocks.append(e)
+        parameters += [rho, sig]
+        cal[rho] = .5 + .4*(i % 5)/5
+        cal[sig] = .2
+        prior[rho] = ar_prior
+        prior[sig] = sig_prior
+
+    for p in 'rho_u', 'rho_r', 'rho_z':
+        prior[p] = ar_prior
+    for p in 'sig_u', 'sig_r', 'sig_z':
+        prior[p] = sig_prior
+
+    gsum = ''.join(' + 0.1*%s' % p[0] for p in procs[3:])
+
+    equations = ['Pi = beta*Pi(+1) + kappa*y - z',
+                 'c = c(+1) - 1/sigma*(r - Pi(+1) + u)',
+                 'y = c' + gsum,
+                 'rn = rho*rn(-1) + (1-rho)*(phi_pi*Pi + phi_y*y) + vr',
+                 'dy = y - y(-1)']
+
+    # AR(nlags) processes. The coefficients are positive and sum up to rho, hence the processes are stationary
+    for x, e, rho in procs:
+        if nlags == 1:
+            equations.append('%s = %s*%s(-1) + %s' % (x, rho, x, e))
+            continue
+
+        lags = ['%s(-1)' % x] + ['%s_l%s(-1)' % (x, j)
+                                 for j in range(1, nlags)]
+        equations.append('%s = %s*(0.8*%s + %s*(%s)) + %s' % (x, rho,
+                                                             lags[0], .2/(nlags - 1), ' + '.join(lags[1:]), e))
+        for j in range(1, nlags):
+            lag = '%s(-1)' % x if j == 1 else '%s_l%s(-1)' % (x, j-1)
+            variables.append('%s_l%s' % (x, j))
+            equations.append('%s_l%s = %s' % (x, j, lag))
+
+    # chain of forward-looking variables. Discounting with `delta` < 1 makes them determinate
+    fwd = []
+    for i in range(nfwd):
+        f = 'f%s' % i
+        prev = fwd[-1] if fwd else 'y'
+        driver = procs[3 + i % (nshocks - 3)][0] if nshocks > 3 else 'u'
+        fwd.append(f)
+        variables.append(f)
+        equations.append('%s = delta*%s(+1) + (1-delta)*%s + 0.1*%s' %
+                         (f, f, prev, driver))
+
+    # static variables
+    static = []
+    for i in range(nstatic):
+        w = 'w%s' % i
+        static.append(w)
+        variables.append(w)
+        equations.append('%s = y - %s*Pi' % (w, .1*(i % 10)))
+
+    # observables. Beyond the core, observe the forward-looking and static variables, then the exogenous processes
+    candidates = fwd + static + [p[0] for p in procs]
+    if nobs - 3 > len(candidates):
+        raise ValueError('[synthetic:]'.ljust(
+            15, ' ') + ' A model with this structure can have at most %s observables.' % (len(candidates) + 3))
+
+    for v in candidates[:nobs - 3]:
+        observables['Obs_%s' % v] = v
+
+    def yaml_list(lst):
+        return '[%s]' % ', '.join(lst)
+
+    txt = '# %s.yaml ---\n#\n# Description: synthetic model generated by `pydsge.synthetic`\n#\n' % name
+    txt += 'declarations:\n'
+    txt += "  name: '%s'\n" % name
+    txt += '  variables: %s\n' % yaml_list(variables)
+    txt += '  constrained: [r]\n'
+    txt += '  parameters: %s\n' % yaml_list(parameters)
+    txt += '  para_func: [kappa, x_bar]\n'
+    txt += '  shocks: %s\n' % yaml_list(shocks)
+    txt += '  observables: %s\n\n' % yaml_list(observables)
+
+    txt += 'equations:\n  model:\n'
+    txt += ''.join('    - %s\n' % eq for eq in equations)
+    txt += '\n  constraint:\n    - r = rn\n\n'
+    txt += '  observables:\n'
+    txt += ''.join('    %s : %s\n' % o for o in observables.items())
+
+    txt += '\ncalibration:\n  parameters:\n'
+    txt += ''.join('    %s : %s\n' % c for c in cal.items())
+    txt += '\n  parafunc:\n'
+    txt += '    kappa : (1-theta)*(1-beta*theta)/theta\n'
+    txt += '    x_bar : -1/beta + elb_level\n'
+    txt += '\n  covariances:\n'
+    txt += ''.join('    %s: %s\n' % (e, 'sig_' + rho[4:])
+                   for x, e, rho in procs)
+
+    txt += '\nestimation:\n  prior:\n'
+    txt += ''.join('    %s : %s\n' % p for p in prior.items())
+
+    return txt
+
+
+def gen_data(self, T=100, burnin=50, seed=0, meas_err=0., start='1990-01-01'):
+    """Simulate a synthetic dataset from a model using its current parameters.
+
+    Parameters
+    ----------
+    T : int, optional
+        Number of periods. Defaults to 100.
+    burnin : int, optional
+        Number of periods that are discarded. Defaults to 50.
+    seed : int, optional
+        Random seed. Defaults to 0.
+    meas_err : float, optional
+        Standard deviation of the measurement errors. Defaults to 0.
+    start : str, optional
+        First date of the quarterly index. Defaults to '1990-01-01'.
+
+    Returns
+    -------
+    DataFrame
+    """
+
+    if not hasattr(self, 'sys'):
+        self.set_par('calib', verbose=False)
+
+    rng = np.random.RandomState(seed)
+
+    QQ = self.QQ(self.ppar)
+    state = np.zeros(len(self.vv))
+    Y = np.empty((T, len(self.observables)))
+
+    for t in range(T + burnin):
+        noise = QQ @ rng.randn(len(self.shocks))
+        state, _ = self.t_func(state, noise)
+        if t >= burnin:
+            Y[t - burnin] = state @ self.hx[0].T + self.hx[1]
+
+    Y += meas_err*rng.randn(*Y.shape)
+
+    index = pd.date_range(start, periods=T, freq='Q')
+
+    return pd.DataFrame(Y, index=index, columns=[str(o) for o in self.observables])
+
+
+def gen_model(path, nvars=None, nfwd=0, nshocks=3, nobs=3, nlags=1, T=100, seed=0, name=None, verbose=True):
+    """Write a synthetic model and a matching dataset to disk. See `gen_yaml` for the model structure.
+
+    Parameters
+    ----------
+    path : str
+        Directory in which the files are stored.
+    T : int, optional
+        Number of periods of the dataset. Defaults to 100.
+    seed : int, optional
+        Random seed of the dataset. Defaults to 0.
+
+    Returns
+    -------
+    tuple
+        The paths to the yaml and the csv file, similar to `pydsge.example`
+    """
+
+    from .clsmethods import DSGE
+
+    txt = gen_yaml(nvars, nfwd, nshocks, nobs, nlags, name)
+    name = name or 'synth_%s' % (nvars or model_size(nfwd, nshocks, nlags))
+
+    os.makedirs(path, exist_ok=True)
+    yaml_file = os.path.join(path, name + '.yaml')
+    data_file = os.path.join(path, name + '_data.csv')
+
+    with open(yaml_file, 'w') as f:
+        f.write(txt)
+
+    mod = DSGE.read(yaml_file)
+    data = gen_data(mod, T=T, seed=seed)
+    data.to_csv(data_file, index_label='date')
+
+    if verbose:
+        print('[synthetic:]'.ljust(15, ' ') + " Model with %s variables, %s shocks and %s observables written to '%s'." %
+              (len(mod.variables), len(mod.shocks), len(mod.observables), yaml_file))
+
+    return yaml_file, data_file
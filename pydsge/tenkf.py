@@ -0,0 +1,691 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a native transposed-ensemble Kalman filter (TEnKF) for the nonlinear model
+"""
+
+import time
+import tqdm
+import warnings
+import numpy as np
+from numba import njit
+from scipy.special import ndtri
+from scipy.stats import qmc
+from grgrlib.core import timeprint
+from grgrlib.la import tinv
+from econsieve.tenkf import multivariate_dispatch
+from .kalman import fsolve_jit, log2pi, psd_sqrt
+
+aca = np.ascontiguousarray
+sampling_schemes = 'mc', 'sobol', 'antithetic', 'moment'
+history_modes = 'full', 'checkpoint'
+
+
+@njit(cache=True, nogil=True)
+def analysis_jit(X, Y, z, R, mu, X_bar):
+    """Analysis step of the TEnKF. Updates the ensemble X (shape (N, dim_x)) in place and writes the prior deviations from the ensemble mean to `X_bar`. Returns the log-likelihood of `z`.
+
+    The update is carried out in observation space: with D = z - Y - mu and S the ensemble covariance of Y plus R, the increment is D S^-1 (Y_bar' X_bar)/(N-1), which costs O(N dim_x dim_z).
+    """
+
+    N, dim_x = X.shape
+
+    obs = ~np.isnan(z)
+    nobs = np.sum(obs)
+
+    x_mean = np.zeros(dim_x)
+    for i in range(N):
+        x_mean += X[i]
+    x_mean /= N
+
+    for i in range(N):
+        X_bar[i] = X[i] - x_mean
+
+    if not nobs:
+        return 0.
+
+    Yo = aca(Y[:, obs])
+    y_mean = np.zeros(nobs)
+    for i in range(N):
+        y_mean += Yo[i]
+    y_mean /= N
+
+    Y_bar = Yo - y_mean
+    S = Y_bar.T @ Y_bar/(N-1) + aca(R[obs][:, obs])
+    L = np.linalg.cholesky(S)
+
+    # innovation of each member
+    D = z[obs] - Yo - aca(mu[:, obs])
+    W = aca(fsolve_jit(L, aca(D.T)).T)
+    C = aca(fsolve_jit(L, Y_bar.T @ X_bar))
+    X += W @ C/(N-1)
+
+    u = fsolve_jit(L, (z[obs] - y_mean).reshape(-1, 1))[:, 0]
+
+    return -.5*(nobs*log2pi + 2*np.sum(np.log(np.diag(L))) + np.sum(u**2))
+
+
+@njit(cache=True, nogil=True)
+def npas_target_jit(X, S, Pinv, flags, lam, f):
+    """Objective of the path-adjustment smoother for a batch of candidate states. Row i of `X` belongs to sample i // lam with target `S[i // lam]`. Writes the Mahalanobis distances (infinite if the transition failed) to `f`
+    """
+
+    for i in range(X.shape[0]):
+        if flags[i]:
+            f[i] = np.inf
+        else:
+            d = X[i] - S[i // lam]
+            f[i] = d @ Pinv @ d
+
+    return f
+
+
+@njit(cache=True, nogil=True)
+def lin_eps_jit(X, S, F, SIG_inv):
+    """Shocks that move each row of `X` to the respective row of `S` under the linear transition
+    """
+
+    return (S - X @ F.T) @ SIG_inv.T
+
+
+class TEnKF(object):
+    """Native transposed-ensemble Kalman filter.
+
+    Draws the same random numbers as `econsieve.TEnKF` and reproduces its likelihood for a given seed. The forecast step moves the whole ensemble with one call of a batched transition function, the analysis step is a nopython kernel that works in observation space. The ensemble lives in preallocated arrays that are reused across calls.
+
+    The batched transition `t_func_batch(X, noise, out, flags)` and the observation matrices `H = (hx0, hx1)` are set by `run_filter`. If they are not available, the filter falls back to calling `t_func` for each ensemble member and `o_func` on the ensemble.
+
+    The initial states, measurement errors and shocks are pseudo-random draws by default (`sampling='mc'`). To reduce the Monte Carlo noise of the likelihood, they can instead be drawn from a scrambled Sobol sequence ('sobol', randomized for each period), as antithetic pairs ('antithetic') or be moment-matched such that their sample mean and covariance of each period are exactly zero and the identity ('moment').
+
+    The history kept for the smoother is set by `history`: 'full' stores the filtered and predicted ensembles and their deviations of all periods. 'checkpoint' only stores the filtered ensemble and the random state every `checkpoint_every` periods (default: the square root of the sample length). The random draws are then made period by period, and the smoother recomputes the forward steps of each segment from its checkpoint, regenerating the draws from the stored random state, at the cost of one additional forward pass. Since the draws are made in a different order, the ensembles differ from those of 'full' for the same seed unless `noise` is passed to `batch_filter`. Apart from `noise`, the filter then keeps O(sqrt(T) N dim_x) numbers for the checkpoints and O(T dim_x) for the filtered means. The smoothed ensembles are O(T N dim_x) and can be written to a caller-supplied buffer such as a `np.memmap` (see `rts_smoother`).
+    """
+
+    name = 'TEnKF'
+
+    def __init__(self, N, dim_x=None, dim_z=None, fx=None, hx=None, rule=None, seed=None, sampling='mc', history='full', checkpoint_every=None):
+
+        if sampling not in sampling_schemes:
+            raise ValueError('[tenkf:]'.ljust(15, ' ') + " `sampling` must be one of %s, got '%s'." % (
+                sampling_schemes, sampling))
+        if history not in history_modes:
+            raise ValueError('[tenkf:]'.ljust(15, ' ') + " `history` must be one of %s, got '%s'." % (
+                history_modes, history))
+
+        self.dim_x = dim_x
+        self.dim_z = dim_z
+        self.t_func = fx
+        self.o_func = hx
+        self.t_func_batch = None
+        self.H = None
+
+        self.N = N
+        self.seed = seed
+        self.sampling = sampling
+        self.history = history
+        self.checkpoint_every = checkpoint_every
+
+        self.R = np.eye(self.dim_z)
+        self.Q = np.eye(self.dim_x)
+        self.P = np.eye(self.dim_x)
+
+        self.x = np.zeros(self.dim_x)
+        self.rule = rule
+        self.multivariate = multivariate_dispatch(rule)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        # buffers are allocated again when needed, the transition is set by `run_filter`
+        state.pop('_buffers', None)
+        state.pop('_draws', None)
+        state.pop('_path', None)
+        state.pop('rstates', None)
+        state['t_func_batch'] = None
+
+        return state
+
+    def draw(self, tag, mean, cov, size, seeded):
+        """Draw from N(mean, cov) using `self.multivariate`.
+
+        If the random state was seeded at the beginning of `batch_filter`, the random state before each draw only depends on the seed and on the earlier draws' sizes, but not on the covariances. Draws are then cached together with the random state after the draw, such that e.g. the draws of the measurement errors are not repeated in every likelihood evaluation if `R` does not change.
+        """
+
+        if seeded is None:
+            return self.multivariate(mean=mean, cov=cov, size=size)
+
+        cache = self.__dict__.setdefault('_draws', {})
+        key = seeded, tag, size, np.asarray(mean, dtype=float).tobytes(), np.asarray(cov, dtype=float).tobytes()
+
+        if key in cache:
+            res, state = cache[key]
+            np.random.set_state(state)
+            return res
+
+        res = self.multivariate(mean=mean, cov=cov, size=size)
+
+        if len(cache) > 8:
+            cache.clear()
+        cache[key] = res, np.random.get_state()
+
+        return res
+
+    def draw_noise(self, T, rng=None):
+        """Draw the standard normal auxiliary random numbers of a filter run over `T` periods. Passing these to `batch_filter` (`noise`) makes the likelihood a smooth function of the parameters, which is what correlated pseudo-marginal samplers need
+        """
+
+        rng = rng or np.random
+        dim_e = len(self.Q)
+
+        return {'x0': rng.standard_normal((self.N, self.dim_x)),
+                'mus': rng.standard_normal((T, self.N, self.dim_z)),
+                'eps': rng.standard_normal((T, self.N, dim_e))}
+
+    def normals(self, size, dim):
+        """Draw `size` standard normal vectors of dimension `dim` using the scheme set by `sampling`
+        """
+
+        # shuffle the points, otherwise the structure of the point set ties ensemble members together across periods
+        if self.sampling == 'sobol':
+            sobol = qmc.Sobol(dim, scramble=True, seed=np.random.randint(2**31))
+            with warnings.catch_warnings():
+                # the balance properties only hold for powers of two
+                warnings.simplefilter('ignore')
+                u = sobol.random(size)
+            return ndtri(np.clip(u, 1e-12, 1 - 1e-12))[np.random.permutation(size)]
+
+        if self.sampling == 'antithetic':
+            half = np.random.standard_normal(((size + 1)//2, dim))
+            return np.vstack((half, -half))[:size][np.random.permutation(size)]
+
+        res = np.random.standard_normal((size, dim))
+
+        if self.sampling == 'moment':
+            res -= res.mean(axis=0)
+            if size > dim:
+                L = np.linalg.cholesky(np.cov(res.T).reshape(dim, dim))
+                res = np.linalg.solve(L, res.T).T
+
+        return res
+
+    def sample_noise(self, T, seeded):
+        """Standard normal random numbers of a filter run over `T` periods (same format as `draw_noise`), drawn using the scheme set by `sampling`. As in `draw`, the draws are cached if the random state was seeded
+        """
+
+        N, dim_z, dim_e = self.N, self.dim_z, len(self.Q)
+        cache = self.__dict__.setdefault('_draws', {})
+        key = seeded, 'noise', self.sampling, T, N, self.dim_x, dim_z, dim_e
+
+        if seeded is not None and key in cache:
+            res, state = cache[key]
+            np.random.set_state(state)
+            return res
+
+        # each period is one point set of measurement errors and shocks
+        X = np.array([self.normals(N, dim_z + dim_e) for _ in range(T)])
+        res = {'mus': aca(X[..., :dim_z]),
+               'eps': aca(X[..., dim_z:]),
+               'x0': self.normals(N, self.dim_x)}
+
+        if seeded is not None:
+            if len(cache) > 8:
+                cache.clear()
+            cache[key] = res, np.random.get_state()
+
+        return res
+
+    def period_draws(self, t, noise, R_sqrt, Q_sqrt):
+        """Measurement errors and shocks of period `t` for a run with checkpointed history. Unless `noise` is given, they are drawn from the current random state using the scheme set by `sampling`
+        """
+
+        N, dim_z, dim_e = self.N, self.dim_z, len(self.Q)
+
+        if noise is not None:
+            return noise['mus'][t] @ R_sqrt.T, noise['eps'][t] @ Q_sqrt.T
+
+        if self.sampling != 'mc':
+            X = self.normals(N, dim_z + dim_e)
+            return X[:, :dim_z] @ R_sqrt.T, X[:, dim_z:] @ Q_sqrt.T
+
+        return self.multivariate(mean=np.zeros(dim_z), cov=self.R, size=N), self.multivariate(mean=np.zeros(dim_e), cov=self.Q, size=N)
+
+    def buffers(self):
+        """Preallocated ensemble arrays, reused as long as the dimensions do not change
+        """
+
+        shape = self.N, self.dim_x, self.dim_z
+        buf = getattr(self, '_buffers', None)
+
+        if buf is None or buf['shape'] != shape:
+            buf = {'shape': shape,
+                   'X': np.empty((self.N, self.dim_x)),
+                   'X_new': np.empty((self.N, self.dim_x)),
+                   'X_bar': np.empty((self.N, self.dim_x)),
+                   'Y': np.empty((self.N, self.dim_z)),
+                   'flags': np.empty(self.N, dtype=np.int64)}
+            self._buffers = buf
+
+        return buf
+
+    def predict(self, X, eps, out, flags):
+
+        if self.t_func_batch is not None:
+            return self.t_func_batch(X, eps, out, flags)
+
+        for i in range(len(X)):
+            out[i], flags[i] = self.t_func(X[i], eps[i])
+
+        return out, flags
+
+    def observe(self, X, Y):
+
+        if self.H is not None:
+            np.dot(X, self.H[0].T, out=Y)
+            Y += self.H[1]
+        else:
+            Y[:] = self.o_func(X)
+
+        return Y
+
+    def batch_filter(self, Z, init_states=None, seed=None, store=False, calc_ll=False, noise=None, verbose=False):
+        """Batch filter.
+
+        Runs the TEnKF on the full dataset.
+
+        Parameters
+        ----------
+        Z : array
+            The data, shape (T, dim_z)
+        init_states : array, optional
+            Initial ensemble of shape (dim_x, N). Drawn from N(x, P) if not given.
+        seed : int, optional
+            Random seed. Defaults to `self.seed`.
+        store : bool, optional
+            Whether to store the priors and deviations (or the checkpoints, see `history`) required by the smoother. Defaults to False.
+        calc_ll : bool, optional
+            Whether to return the log-likelihood instead of the filtered ensembles. Defaults to False.
+        noise : dict, optional
+            Standard normal random numbers as returned by `draw_noise`, used instead of drawing from the random state.
+
+        Returns
+        -------
+        float or array
+            The log-likelihood if `calc_ll` is True, the filtered ensembles of shape (N, T, dim_x) otherwise. With checkpointed history and `store`, only the filtered means of shape (T, dim_x) are returned
+        """
+
+        self.Z = Z
+
+        T = Z.shape[0]
+        N, dim_x, dim_z = self.N, self.dim_x, self.dim_z
+        dim_e = len(self.Q)
+
+        seeded = seed if seed is not None else self.seed
+        if seeded is not None:
+            np.random.seed(seeded)
+
+        checkpoint = store and self.history == 'checkpoint'
+
+        if not checkpoint and noise is None and self.sampling != 'mc':
+            noise = self.sample_noise(T, seeded)
+
+        if checkpoint:
+            # draws are made period by period, such that each segment can be regenerated from the random state at its checkpoint
+            R_sqrt, Q_sqrt = psd_sqrt(self.R), psd_sqrt(self.Q)
+        elif noise is not None:
+            mus = noise['mus'] @ psd_sqrt(self.R).T
+            epss = noise['eps'] @ psd_sqrt(self.Q).T
+        else:
+            # same order of draws as `econsieve.TEnKF`
+            mus = self.draw('mus', np.zeros(dim_z), self.R, (T, N), seeded)
+            epss = self.draw('epss', np.zeros(dim_e), self.Q, (T, N), seeded)
+
+        buf = self.buffers()
+        X, X_new, X_bar, Y, flags = buf['X'], buf['X_new'], buf['X_bar'], buf['Y'], buf['flags']
+
+        if init_states is not None:
+            X[:] = np.transpose(init_states)
+        elif noise is not None:
+            X[:] = self.x + noise['x0'] @ psd_sqrt(self.P).T
+        elif checkpoint and self.sampling != 'mc':
+            X[:] = self.x + self.normals(N, dim_x) @ psd_sqrt(self.P).T
+        elif checkpoint:
+            X[:] = self.multivariate(mean=self.x, cov=self.P, size=N)
+        else:
+            X[:] = self.draw('x', self.x, self.P, N, seeded)
+
+        R = aca(self.R, dtype=float)
+        Z = aca(Z, dtype=float)
+        ll = 0
+
+        if checkpoint:
+            every = self.checkpoint_every or max(int(np.sqrt(T)), 1)
+            self.checkpoints = np.empty((-(-T//every), N, dim_x))
+            self.rstates = []
+            self.means = np.empty((T, dim_x))
+            self._path = every, noise, R_sqrt, Q_sqrt, R, Z
+            store = False
+        elif store or not calc_ll:
+            self.Xs = np.empty((T, dim_x, N))
+        if store:
+            self.X_priors = np.empty_like(self.Xs)
+            self.X_bars = np.empty_like(self.Xs)
+            self.X_bar_priors = np.empty_like(self.Xs)
+
+        for t in range(T):
+
+            if checkpoint:
+                mu, eps = self.period_draws(t, noise, R_sqrt, Q_sqrt)
+            else:
+                mu, eps = mus[t], epss[t]
+
+            # predict
+            self.predict(X, aca(eps), X_new, flags)
+            X, X_new = X_new, X
+            self.observe(X, Y)
+
+            if store:
+                self.X_priors[t] = X.T
+
+            # update
+            ll += analysis_jit(X, Y, Z[t], R, aca(mu), X_bar)
+
+            if store:
+                self.X_bar_priors[t] = X_bar.T
+                self.X_bars[t] = (X - X.mean(axis=0)).T
+            if checkpoint:
+                self.means[t] = X.mean(axis=0)
+                if not t % every:
+                    self.checkpoints[t//every] = X
+                    self.rstates.append(np.random.get_state())
+            elif store or not calc_ll:
+                self.Xs[t] = X.T
+
+        # keep the buffers in place for the next call
+        buf['X'], buf['X_new'] = X, X_new
+        self.checkpointed = checkpoint
+        self.ll = ll
+
+        if calc_ll:
+            return ll
+        elif checkpoint:
+            return self.means
+        else:
+            return np.rollaxis(self.Xs, 2)
+
+    def recompute(self, idx):
+        """Recompute the segment `idx` of a run with checkpointed history. The random draws of the filter are regenerated from the random state stored with the checkpoint, the global random state is left unchanged.
+
+        Returns
+        -------
+        Xs : array
+            The filtered ensembles of the segment, shape (k, dim_x, N)
+        X_priors : array
+            The predicted ensembles of the periods following those of `Xs`
+        X_bar_priors : array
+            The deviations of `X_priors` from their mean
+        """
+
+        every, noise, R_sqrt, Q_sqrt, R, Z = self._path
+        T = Z.shape[0]
+        N, dim_x, dim_z = self.N, self.dim_x, self.dim_z
+
+        t0 = idx*every
+        t1 = min(t0 + every, T)
+
+        Xs = np.empty((t1 - t0, dim_x, N))
+        X_priors = np.empty_like(Xs)
+        X_bar_priors = np.empty_like(Xs)
+
+        X = self.checkpoints[idx].copy()
+        X_new = np.empty_like(X)
+        X_bar = np.empty_like(X)
+        Y = np.empty((N, dim_z))
+        flags = np.empty(N, dtype=np.int64)
+
+        Xs[0] = X.T
+
+        state = np.random.get_state()
+        np.random.set_state(self.rstates[idx])
+
+        # the steps are the same as in `batch_filter`, such that the results are identical
+        for t in range(t0 + 1, min(t1 + 1, T)):
+
+            mu, eps = self.period_draws(t, noise, R_sqrt, Q_sqrt)
+            self.predict(X, aca(eps), X_new, flags)
+            X, X_new = X_new, X
+            self.observe(X, Y)
+            X_priors[t-t0-1] = X.T
+
+            analysis_jit(X, Y, Z[t], R, aca(mu), X_bar)
+            X_bar_priors[t-t0-1] = X_bar.T
+
+            if t < t1:
+                Xs[t-t0] = X.T
+
+        np.random.set_state(state)
+
+        return Xs, X_priors, X_bar_priors
+
+    def rts_smoother(self, means=None, covs=None, rcond=1e-14, out=None):
+        """Ensemble RTS smoother. Requires that `batch_filter` was run with `store=True`. With checkpointed history, the segments are recomputed one at a time, starting with the last, and only the history of one segment is held in memory. `means`, `covs` and `rcond` are only kept for compatibility
+
+        Parameters
+        ----------
+        out : array, optional
+            Array of shape (N, T, dim_x) to which the smoothed ensembles are written period by period, e.g. a `np.memmap`. Allocated if not given
+
+        Returns
+        -------
+        array
+            The smoothed ensembles, shape (N, T, dim_x)
+        """
+
+        T = len(self.Z)
+
+        if out is None:
+            out = np.rollaxis(np.empty((T, self.dim_x, self.N)), 2)
+
+        if getattr(self, 'checkpointed', False):
+
+            every = self._path[0]
+
+            for idx in reversed(range(len(self.checkpoints))):
+
+                Xs, X_priors, X_bar_priors = self.recompute(idx)
+                t0 = idx*every
+
+                for i in reversed(range(t0, t0 + len(Xs))):
+
+                    X = Xs[i-t0]
+                    if i == T - 1:
+                        S = X
+                    else:
+                        # same memory layout as in `batch_filter`, such that the results are identical
+                        X_bar = aca(X.T)
+                        X_bar = (X_bar - X_bar.mean(axis=0)).T
+                        J = X_bar @ tinv(X_bar_priors[i-t0])
+                        S = X + J @ (S - X_priors[i-t0])
+
+                    out[:, i] = S.T
+
+        else:
+
+            S = self.Xs[-1]
+            out[:, -1] = S.T
+
+            for i in reversed(range(T - 1)):
+
+                J = self.X_bars[i] @ tinv(self.X_bar_priors[i+1])
+                S = self.Xs[i] + J @ (S - self.X_priors[i+1])
+
+                out[:, i] = S.T
+
+        self.Ss = np.moveaxis(out, 0, 2)
+
+        return out
+
+    def npas(self, X=None, covs=None, get_eps=None, nsamples=1, bound_sigma=4, frtol=1e-5, maxiter=50, damping=(0, 1e-3, 1e-2, 1e-1, 1, 1e1, 1e2), h=1e-6, rcond=1e-8, seed=0, verbose=True):
+        """Nonlinear path-adjustment smoother.
+
+        For each sample, a path of the smoothed ensemble is picked at random. Starting from its initial state, the shocks of each period are chosen such that the next state is as close as possible (in terms of the smoothed ensemble covariance) to the path. The shocks are found by damped Gauss-Newton iterations: in each iteration, the finite-difference Jacobians and then the candidate steps for all values of `damping` are evaluated for all samples with one call of the batched transition function each. The iterations stop for each sample once the relative improvement falls below `frtol`. Requires that the smoother was run.
+
+        Parameters
+        ----------
+        X : array, optional
+            Time series of ensembles, shape (N, T, dim_x). Defaults to the smoothed ensembles
+        covs : array, optional
+            The series of ensemble covariances. Calculated from `X` if not given
+        get_eps : callable, optional
+            Function `get_eps(x, xp)` for the initial guess of the shocks. If the filter provides the linear model (set by `run_filter`), the compiled inversion is used instead. If None, the search starts at zero
+        nsamples : int, optional
+            Number of paths. Defaults to 1
+        bound_sigma : int, optional
+            The number of standard deviations of the shocks included in the box constraint
+        frtol : float, optional
+            Relative tolerance of the objective
+        maxiter : int, optional
+            Maximum number of iterations per period
+        damping : tuple, optional
+            Levenberg-Marquardt damping factors of the candidate steps
+        h : float, optional
+            Step size of the finite differences
+        rcond : float, optional
+            Cutoff for small singular values of the ensemble covariances
+        seed : int, optional
+            Random seed for picking the paths
+
+        Returns
+        -------
+        means : array
+            The adjusted paths, shape (nsamples, T, dim_x)
+        covs : array
+            The ensemble covariances, shape (T, dim_x, dim_x)
+        resid : array
+            The shocks, shape (nsamples, T-1, dim_e)
+        flags : bool
+            Whether the transition function returned an error
+        """
+
+        if verbose:
+            st = time.time()
+
+        if X is None:
+            X = np.rollaxis(self.Ss, 2)
+
+        N, T, dim_x = X.shape
+        dim_e = len(self.Q)
+
+        if covs is None:
+            X_bar = X - X.mean(axis=0)
+            covs = np.einsum('ntj,ntk->tjk', X_bar, X_bar)/(N-1)
+
+        Pinvs = np.linalg.pinv(covs, rcond=rcond, hermitian=True)
+        bound = np.sqrt(np.diag(self.Q))*bound_sigma
+        damping = np.array(damping, dtype=float)
+        ndamp = len(damping)
+
+        rng = np.random.RandomState(seed)
+        paths = X[rng.choice(N, nsamples, replace=nsamples > N)]
+
+        means = np.empty((nsamples, T, dim_x))
+        resid = np.empty((nsamples, T-1, dim_e))
+        flags = np.zeros(nsamples, dtype=bool)
+
+        eps_lin = getattr(self, 'eps_lin', None)
+        size = nsamples*max(dim_e + 1, ndamp)
+        out = np.empty((size, dim_x))
+        tflags = np.empty(size, dtype=np.int64)
+        f = np.empty(size)
+        samples = np.arange(nsamples)
+        dirs = np.vstack((np.zeros(dim_e), h*np.eye(dim_e)))
+
+        def evaluate(x, eps, target, Pinv, lam):
+            # uses the first `len(eps)` rows of the buffers
+            n = len(eps)
+            o, fl = self.predict(aca(x), aca(eps), out[:n], tflags[:n])
+            npas_target_jit(o, target, Pinv, fl, lam, f[:n])
+            return o, fl, f[:n]
+
+        x = aca(paths[:, 0])
+        means[:, 0] = x
+
+        wrap = tqdm.tqdm if verbose else (lambda x, **kwarg: x)
+
+        for t in wrap(range(T-1), unit=' period(s)', dynamic_ncols=True):
+
+            target = aca(paths[:, t+1])
+            Pinv = aca(Pinvs[t+1])
+
+            # initial guess
+            if get_eps is None:
+                eps = np.zeros((nsamples, dim_e))
+            elif eps_lin is not None:
+                eps = lin_eps_jit(x, target, *eps_lin)
+            else:
+                eps = np.array([get_eps(target[n], x[n])
+                                for n in range(nsamples)])
+            eps = np.clip(eps, -bound, bound)
+
+            x_best, fl_best, f_best = [a.copy()
+                                       for a in evaluate(x, eps, target, Pinv, 1)]
+            active = np.ones(nsamples, dtype=bool)
+            cnt = 0
+
+            while active.any() and cnt < maxiter:
+
+                a = samples[active]
+                na = len(a)
+
+                # finite-difference Jacobians of all active samples at once
+                cand = (eps[a, None] + dirs).reshape(-1, dim_e)
+                o, fl, _ = evaluate(np.repeat(x[a], dim_e+1, axis=0), cand,
+                                    target[a], Pinv, dim_e+1)
+                o = o.reshape(na, dim_e+1, dim_x)
+                J = (o[:, 1:] - o[:, :1]).transpose(0, 2, 1)/h
+                d = x_best[a] - target[a]
+
+                JP = J.transpose(0, 2, 1) @ Pinv
+                A = JP @ J
+                g = np.einsum('nex,nx->ne', JP, d)
+
+                # candidate steps for each damping factor
+                diag = np.einsum('nee->ne', A) + 1e-12
+                lhs = A[:, None] + damping[None, :, None, None] * \
+                    (diag[:, None, :, None]*np.eye(dim_e))
+                step = -np.linalg.solve(lhs, np.repeat(g[:, None], ndamp, 1)[..., None])[..., 0]
+                cand = np.clip(eps[a, None] + step, -bound, bound).reshape(-1, dim_e)
+
+                o, fl, fv = evaluate(np.repeat(x[a], ndamp, axis=0), cand,
+                                     target[a], Pinv, ndamp)
+                fv = fv.reshape(na, ndamp)
+                best = np.argmin(fv, axis=1)
+                rows = np.arange(na)*ndamp + best
+                fb = fv[np.arange(na), best]
+
+                improved = fb < f_best[a]
+                gain = np.where(improved, f_best[a] - fb, 0)
+
+                ia = a[improved]
+                eps[ia] = cand[rows[improved]]
+                x_best[ia] = o[rows[improved]]
+                fl_best[ia] = fl[rows[improved]]
+                f_best[ia] = fb[improved]
+
+                active[a] = gain > frtol*(np.abs(f_best[a]) + frtol)
+                cnt += 1
+
+            resid[:, t] = eps
+            x = aca(x_best)
+            means[:, t+1] = x
+            flags |= fl_best.astype(bool)
+
+        flag = flags.any()
+
+        if flag and verbose:
+            print('[npas:]'.ljust(15, ' ') +
+                  'Transition function returned error.')
+
+        if verbose:
+            print('[npas:]'.ljust(15, ' ')+'Extraction took ',
+                  timeprint(time.time() - st, 3))
+
+        return means, covs, resid, flag
@@ -0,0 +1,192 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a low-overhead timer that accumulates counts and runtime histograms per stage of the likelihood evaluation
+"""
+
+import time
+import uuid
+import weakref
+import bisect
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+from contextlib import contextmanager
+
+# the stages that are timed
+stages = 'prior', 'matrices', 'qz', 'desingularise', 'preprocess', 'filter_setup', 'filter', 'filter_period', 'smoother'
+stage_idx = {s: i for i, s in enumerate(stages)}
+
+# log-spaced bins from 100ns to 1000s, 10 per decade. Bin 0 and the last bin catch the under- and overflow
+bins = list(np.logspace(-7, 3, 101))
+nbins = len(bins) + 1
+
+# the shared buffers created in this process (or inherited from the parent process), indexed by a token
+shared_buffers = {}
+
+
+class StageTimer(object):
+    """Accumulates counts, total runtime and a runtime histogram per stage.
+
+    The data lives in shared memory. When a timer is unpickled in the process that created it or in a process forked from it (such as the workers of the pool created by `prep_estim`), it keeps writing into the same memory, so the records of all workers end up in one timer. Everywhere else (e.g. when loaded from disk), unpickling results in a detached timer with a copy of the data. Timers can also be merged explicitly using `merge` or `+`, which returns a detached timer. Only the timer that created a shared buffer registers it, and the buffer is released together with this timer.
+    """
+
+    def __init__(self, token=None, shared=True):
+
+        if token in shared_buffers:
+            self._lock, self._raw = shared_buffers[token]
+        elif shared:
+            token = uuid.uuid4().hex
+            self._lock = mp.Lock()
+            self._raw = mp.RawArray('d', len(stages)*(nbins + 2))
+            shared_buffers[token] = self._lock, self._raw
+            # forget the buffer together with the timer that created it
+            weakref.finalize(self, shared_buffers.pop, token, None)
+        else:
+            # detached timers (merges, copies loaded elsewhere) are not registered
+            token = None
+            self._lock = mp.Lock()
+            self._raw = np.zeros(len(stages)*(nbins + 2))
+
+        self.token = token
+        self.data = np.frombuffer(
+            self._raw).reshape(len(stages), nbins + 2)
+
+    def __getstate__(self):
+        return {'token': self.token, 'data': self.data.copy()}
+
+    def __setstate__(self, state):
+
+        self.__init__(state['token'], shared=False)
+
+        if self.token is None:
+            self.data[:] = state['data']
+
+    def __repr__(self):
+        return 'A stage timer with %s records.' % int(self.data[:, 0].sum())
+
+    def __add__(self, other):
+
+        new = StageTimer(shared=False)
+        new.merge(self)
+        new.merge(other)
+
+        return new
+
+    @staticmethod
+    def tic():
+        return time.perf_counter()
+
+    def add(self, stage, dt):
+        """Record a duration of `dt` seconds for `stage`
+        """
+
+        row = self.data[stage_idx[stage]]
+        b = 2 + bisect.bisect(bins, dt)
+
+        with self._lock:
+            row[0] += 1
+            row[1] += dt
+            row[b] += 1
+
+    def toc(self, stage, tic):
+        """Record the time since `tic` for `stage`. Returns a new `tic`, such that consecutive stages can be chained
+        """
+
+        now = time.perf_counter()
+        self.add(stage, now - tic)
+
+        return now
+
+    @contextmanager
+    def stage(self, stage):
+        """Context manager that times the enclosed block
+        """
+
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - tic)
+
+    def merge(self, other):
+        """Add the records of another timer to this one
+        """
+
+        with self._lock:
+            self.data += other.data
+
+        return self
+
+    def reset(self):
+
+        with self._lock:
+            self.data[:] = 0
+
+    def quantile(self, stage, q):
+        """Approximate quantile of the runtime of `stage`, obtained from the histogram
+        """
+
+        hist = self.data[stage_idx[stage], 2:]
+        if not hist.sum():
+            return np.nan
+
+        b = np.searchsorted(np.cumsum(hist), q*hist.sum())
+        edges = [bins[0]] + bins + [bins[-1]]
+
+        return np.sqrt(edges[b]*edges[b+1])
+
+    def table(self):
+        """Summary of all stages that were recorded at least once
+
+        Returns
+        -------
+        DataFrame
+        """
+
+        rows = {}
+        total = self.data[stage_idx['prior']:stage_idx['filter'] + 1, 1].sum() + \
+            self.data[stage_idx['smoother'], 1]
+
+        for s in stages:
+            count, tsum = self.data[stage_idx[s], :2]
+            if not count:
+                continue
+            rows[s] = {'count': int(count), 'total': tsum, 'mean': tsum/count, 'median': self.quantile(s, .5),
+                       'p90': self.quantile(s, .9), 'share': tsum/total if s != 'filter_period' else np.nan}
+
+        return pd.DataFrame(rows, index=['count', 'total', 'mean', 'median', 'p90', 'share']).T
+
+
+def get_timer(self):
+    """Get the stage timer of a model, create it if necessary
+    """
+
+    if not hasattr(self, 'timer'):
+        self.timer = StageTimer()
+
+    return self.timer
+
+
+def timings(self, reset=False):
+    """Table of the runtime per stage of the likelihood evaluation (prior, matrices, qz, desingularise, preprocess, filter_setup, filter, filter_period, smoother).
+
+    Times are in seconds. Median and 90% quantile are approximated from log-spaced histograms. `filter_period` is the filtering time divided by the number of periods, and not included in `share`. Timings from the worker processes of the pool are included.
+
+    Parameters
+    ----------
+    reset : bool, optional
+        Reset the timer after creating the table. Defaults to False.
+
+    Returns
+    -------
+    DataFrame
+    """
+
+    timer = get_timer(self)
+    table = timer.table()
+
+    if reset:
+        timer.reset()
+
+    return table
@@ -10,6 +10,7 @@ import pandas as pd
 import time
 from grgrlib import fast0, map2arr
 from .engine import boehlgorithm
+from .kalman import shocks_jit
 from decimal import Decimal
 
 
@@ -30,6 +31,33 @@ def lin_o_func(self):
     return self.hx
 
 
+def get_eps_lin(self, x, xp, rcond=1e-14):
+    """Get filter-implied (smoothed) shocks for linear model
+    """
+
+    return np.linalg.pinv(self.SIG, rcond) @ (x - self.lin_t_func@xp)
+
+
+def extract_lin(self, means, rcond=1e-14):
+    """Extract the shocks of the linear model from a series of (smoothed) states.
+
+    Equivalent to alternating `get_eps_lin` and `t_func(..., linear=True)` over time, but the pseudo inverse of `SIG` and the transition matrix are only computed once and the recursion runs in nopython mode.
+
+    Returns
+    -------
+    res : array
+        The states implied by the shocks
+    resid : array
+        The shocks
+    """
+
+    SIG = np.ascontiguousarray(self.SIG, dtype=float)
+    SIG_inv = np.linalg.pinv(SIG, rcond)
+    F = np.ascontiguousarray(self.lin_t_func, dtype=float)
+
+    return shocks_jit(np.ascontiguousarray(means, dtype=float), F, SIG, SIG_inv)
+
+
 def t_func(self, state, noise=None, set_k=None, return_flag=True, return_k=False, linear=False, verbose=False):
 
     if verbose:
@@ -77,6 +105,85 @@ def o_func(self, state):
     return obs
 
 
+cov_types = 'full', 'diag', 'lowrank', 'none'
+
+
+def compress_covs(covs, cov_type='full', rank=None, dtype=None):
+    """Compress a series of covariance matrices of shape (..., dim_x, dim_x).
+
+    Parameters
+    ----------
+    covs : array
+        Series of covariance matrices
+    cov_type : str, optional
+        One of 'full' (keep as is), 'diag' (only the variances, shape (..., dim_x)), 'lowrank' (a factor `L` of shape (..., dim_x, rank) such that `L @ L.T` approximates the covariance, using the leading eigenpairs) or 'none' (returns None). Defaults to 'full'
+    rank : int, optional
+        Rank of the factor for `cov_type='lowrank'`. Must be smaller than dim_x. Defaults to 1
+    dtype : dtype, optional
+        E.g. `np.float32` to halve the size of the results. Defaults to the dtype of `covs`
+
+    Returns
+    -------
+    array or None
+    """
+
+    if cov_type not in cov_types:
+        raise ValueError('[compress_covs:]'.ljust(15, ' ') +
+                         " `cov_type` must be one of %s, got '%s'." % (cov_types, cov_type))
+
+    if cov_type == 'none':
+        return None
+
+    covs = np.asarray(covs)
+
+    if cov_type == 'diag':
+        covs = np.diagonal(covs, axis1=-2, axis2=-1)
+
+    elif cov_type == 'lowrank':
+
+        rank = rank or 1
+        if rank >= covs.shape[-1]:
+            raise ValueError('[compress_covs:]'.ljust(15, ' ') +
+                             ' `rank` (%s) must be smaller than the dimension of the covariance matrices (%s).' % (rank, covs.shape[-1]))
+
+        # eigenvalues are sorted in ascending order
+        w, v = np.linalg.eigh(covs)
+        covs = v[..., -rank:] * np.sqrt(np.maximum(w[..., None, -rank:], 0))
+
+    return covs.astype(dtype or covs.dtype, copy=False)
+
+
+def cov_type_of(covs, ndim):
+    """Infer the form of (compressed) covariances given the dimensionality `ndim` of the respective states. See `compress_covs`.
+    """
+
+    if covs is None:
+        return 'none'
+    if np.ndim(covs) == ndim:
+        return 'diag'
+    if np.shape(covs)[-1] == np.shape(covs)[-2]:
+        return 'full'
+
+    return 'lowrank'
+
+
+def marginal_var(covs, ndim):
+    """Get the marginal variances from (compressed) covariances. See `compress_covs`.
+    """
+
+    cov_type = cov_type_of(covs, ndim)
+
+    if cov_type == 'none':
+        raise ValueError('[marginal_var:]'.ljust(15, ' ') +
+                         ' No covariances were stored.')
+    if cov_type == 'diag':
+        return np.asarray(covs, dtype=float)
+    if cov_type == 'full':
+        return np.diagonal(covs, axis1=-2, axis2=-1).astype(float)
+
+    return np.sum(np.asarray(covs, dtype=float)**2, axis=-1)
+
+
 def calc_obs(self, states, covs=None):
     """Get observables from state representation
 
@@ -84,18 +191,18 @@ def calc_obs(self, states, covs=None):
     ----------
     states : array
     covs : array, optional
-        Series of covariance matrices. If provided, 95% intervals will be calculated.
+        Series of covariance matrices. If provided, 95% intervals will be calculated. Also accepts the compact forms returned by `extract` (see `compress_covs`).
     """
 
     if covs is None:
         return states @ self.hx[0].T + self.hx[1]
 
-    var = np.diagonal(covs, axis1=1, axis2=2)
+    var = marginal_var(covs, np.ndim(states))
     std = np.sqrt(var)
     iv95 = np.stack((states - 1.96*std, states, states + 1.96*std))
 
-    obs = (self.hx[0] @ states.T).T + self.hx[1]
-    std_obs = (self.hx[0] @ std.T).T
+    obs = states @ self.hx[0].T + self.hx[1]
+    std_obs = std @ self.hx[0].T
     iv95_obs = np.stack((obs - 1.96*std_obs, obs, obs + 1.96*std_obs))
 
     return iv95_obs, iv95
@@ -133,8 +240,9 @@ def irfs(self, shocklist, pars=None, state=None, T=30, linear=False, set_k=False
     shocks = self.shocks
     nstates = len(self.vv)
 
-    set_par = serializer(self.set_par)
-    t_func = serializer(self.t_func)
+    msnap = self.snapshot()
+    set_par = serializer(msnap.set_par)
+    t_func = serializer(msnap.t_func)
 
     # accept all sorts of inputs
     new_shocklist = []
@@ -226,7 +334,7 @@ def mask(self, verbose=False):
     return msk.rename(columns=dict(zip(self.observables, self.shocks)))[:-1]
 
 
-def simulate(self, source=None, mask=None, pars=None, resid=None, init=None, operation=np.multiply, linear=False, debug=False, verbose=False, **args):
+def simulate(self, source=None, mask=None, pars=None, resid=None, init=None, operation=np.multiply, linear=False, debug=False, verbose=False, storage=None, storage_path=None, **args):
     """Simulate time series given a series of exogenous innovations.
 
     Parameters
@@ -235,6 +343,10 @@ def simulate(self, source=None, mask=None, pars=None, resid=None, init=None, ope
             Dict of `extract` results
         mask : array
             Mask for eps. Each non-None element will be replaced.
+        storage : str, optional
+            If 'shm' or 'disk', the results of several samples are preallocated in shared memory or as memory-mapped files in `storage_path` and written by the workers in place. See `pydsge.shared.SharedArrays`
+        storage_path : str, optional
+            Directory of the memory-mapped files for `storage='disk'`. Defaults to a fresh temporary directory. The files are not removed, deleting them is up to the caller
     """
     from grgrlib.core import serializer
 
@@ -253,14 +365,27 @@ def simulate(self, source=None, mask=None, pars=None, resid=None, init=None, ope
         from .estimation import create_pool
         create_pool(self)
 
-    set_par = serializer(self.set_par)
-    t_func = serializer(self.t_func)
-    obs = serializer(self.obs)
+    msnap = self.snapshot()
+    set_par = serializer(msnap.set_par)
+    t_func = serializer(msnap.t_func)
+    obs = serializer(msnap.obs)
+
+    multi = np.ndim(resi) > 2 or np.ndim(pars) > 1 or np.ndim(init) > 2
+    storage = storage if multi else None
+
+    if storage:
+        from .shared import SharedArrays
+
+        nsamples, T = np.shape(resi)[0], np.shape(resi)[-2]
+        out = SharedArrays({'X': ((nsamples, T+1, np.shape(init)[-1]), float),
+                            'Y': ((nsamples, T+1, len(self.observables)), float),
+                            'LK': ((nsamples, 2, T), int)},
+                           storage=storage, path=storage_path, prefix=self.name + '_simulate')
 
     def runner(arg):
 
         superflag = False
-        par, eps, state = arg
+        i, (par, eps, state) = arg
 
         if mask is not None:
             eps = np.where(np.isnan(mask), eps, operation(np.array(mask),eps))
@@ -289,18 +414,28 @@ def simulate(self, source=None, mask=None, pars=None, resid=None, init=None, ope
         LK = np.array((L, K))
         K = np.array(K)
 
+        if storage:
+            out.write(i, X=X, Y=Y, LK=LK)
+            return superflag
+
         return X, Y, LK, superflag
 
     wrap = tqdm.tqdm if verbose else (lambda x, **kwarg: x)
 
-    if np.ndim(resi) > 2 or np.ndim(pars) > 1 or np.ndim(init) > 2:
+    if multi:
+
+        sample = list(enumerate(zip(*sample)))
+        res = wrap(self.mapper(runner, sample), unit=' sample(s)',
+                   total=len(sample), dynamic_ncols=True)
 
-        res = wrap(self.mapper(runner, zip(*sample)), unit=' sample(s)',
-                   total=len(source['pars']), dynamic_ncols=True)
-        res = map2arr(res)
+        if storage:
+            res = out['X'], out['Y'], out['LK'], np.array(list(res))
+            out.release()
+        else:
+            res = map2arr(res)
 
     else:
-        res = runner(sample)
+        res = runner((0, sample))
 
     superflag = np.any(res[-1])
 
@@ -0,0 +1,234 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+"""contains a sigma-point (unscented or cubature) Kalman filter for the nonlinear model
+"""
+
+import numpy as np
+from .kalman import update_jit, fsolve_jit, log2pi, psd_sqrt
+
+aca = np.ascontiguousarray
+point_rules = 'unscented', 'cubature'
+
+
+def sigma_points(n, rule='unscented', alpha=1., beta=2., kappa=0.):
+    """Sigma points of a standard normal of dimension `n` and their weights
+
+    Returns
+    -------
+    U : array
+        The points, shape (m, n) with m = 2n+1 for the unscented transform and m = 2n for the cubature rule
+    Wm : array
+        Weights of the mean
+    Wc : array
+        Weights of the covariance
+    """
+
+    if rule == 'cubature':
+        U = np.sqrt(n)*np.vstack((np.eye(n), -np.eye(n)))
+        Wm = np.full(2*n, 1/(2*n))
+        return U, Wm, Wm.copy()
+
+    lam = alpha**2*(n + kappa) - n
+    U = np.sqrt(n + lam)*np.vstack((np.zeros(n), np.eye(n), -np.eye(n)))
+
+    Wm = np.full(2*n + 1, 1/(2*(n + lam)))
+    Wc = Wm.copy()
+    Wm[0] = lam/(n + lam)
+    Wc[0] = Wm[0] + 1 - alpha**2 + beta
+
+    return U, Wm, Wc
+
+
+class UKF(object):
+    """Sigma-point Kalman filter.
+
+    The state is augmented by the shocks, such that the transition is evaluated at 2(dim_x+dim_e)+1 (unscented transform) or 2(dim_x+dim_e) (cubature rule) points per period, with one call of the batched transition function (`t_func_batch(X, noise, out, flags)`, set by `run_filter`). As the observation equation is linear, the update step is the exact Kalman update. The likelihood is deterministic and does not depend on a seed. Missing observations (NaNs) are skipped in the update step.
+
+    `rule` is either 'unscented' (with the usual parameters `alpha`, `beta` and `kappa`) or 'cubature'.
+    """
+
+    name = 'UKF'
+
+    def __init__(self, dim_x, dim_z, rule='unscented', alpha=1., beta=2., kappa=0.):
+
+        if rule not in point_rules:
+            raise ValueError('[ukf:]'.ljust(15, ' ') + " `rule` must be one of %s, got '%s'." % (
+                point_rules, rule))
+
+        self.dim_x = dim_x
+        self.dim_z = dim_z
+        self.rule = rule
+        self.alpha = alpha
+        self.beta = beta
+        self.kappa = kappa
+
+        self.t_func = None
+        self.o_func = None
+        self.t_func_batch = None
+        self.H = None
+
+        self.R = np.eye(dim_z)
+        self.Q = np.eye(dim_x)
+        self.P = np.eye(dim_x)
+        self.x = np.zeros(dim_x)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        # the transition is set by `run_filter`
+        state['t_func_batch'] = None
+
+        return state
+
+    def predict(self, X, eps, out, flags):
+
+        if self.t_func_batch is not None:
+            return self.t_func_batch(X, eps, out, flags)
+
+        for i in range(len(X)):
+            out[i], flags[i] = self.t_func(X[i], eps[i])
+
+        return out, flags
+
+    def observe(self):
+
+        if self.H is not None:
+            return aca(self.H[0], dtype=float), aca(self.H[1], dtype=float).reshape(-1)
+
+        # linearize the observation function numerically
+        d = np.asarray(self.o_func(np.zeros((1, self.dim_x))), dtype=float).reshape(-1)
+        H = np.asarray(self.o_func(np.eye(self.dim_x)), dtype=float) - d
+
+        return aca(H), d
+
+    def batch_filter(self, Z, store=False, calc_ll=False, noise=None, verbose=False):
+        """Batch filter.
+
+        Parameters
+        ----------
+        Z : array
+            The data, shape (T, dim_z). NaNs are treated as missing.
+        store : bool, optional
+            Whether to store the predictions required by the smoother. Defaults to False.
+        calc_ll : bool, optional
+            Whether to return the log-likelihood instead of the filtered means and covariances. Defaults to False.
+        noise : None
+            Only for compatibility with the ensemble filters. The filter does not use random numbers.
+
+        Returns
+        -------
+        float or tuple
+            The log-likelihood if `calc_ll` is True, the filtered means (T, dim_x) and covariances (T, dim_x, dim_x) otherwise
+        """
+
+        self.Z = Z
+        Z = aca(Z, dtype=float)
+
+        T = Z.shape[0]
+        dim_x = self.dim_x
+        dim_e = len(self.Q)
+        n = dim_x + dim_e
+
+        U, Wm, Wc = sigma_points(n, self.rule, self.alpha, self.beta, self.kappa)
+        m = len(U)
+
+        H, d = self.observe()
+        R = aca(self.R, dtype=float)
+        Q_sqrt = psd_sqrt(self.Q)
+
+        X_new = np.empty((m, dim_x))
+        flags = np.empty(m, dtype=np.int64)
+
+        means = np.empty((T, dim_x))
+        covs = np.empty((T, dim_x, dim_x))
+        if store:
+            self.x_priors = np.empty((T, dim_x))
+            self.P_priors = np.empty((T, dim_x, dim_x))
+            self.C_priors = np.empty((T, dim_x, dim_x))
+
+        x = np.asarray(self.x, dtype=float)
+        P = np.asarray(self.P, dtype=float)
+        ll = 0
+        self.flags = np.zeros(T, dtype=bool)
+
+        for t in range(T):
+
+            # points of the augmented state. The shocks are independent of the state
+            S = psd_sqrt(P)
+            dX = U[:, :dim_x] @ S.T
+            eps = aca(U[:, dim_x:] @ Q_sqrt.T)
+
+            self.predict(aca(x + dX), eps, X_new, flags)
+            self.flags[t] = np.any(flags)
+
+            x_pred = Wm @ X_new
+            D = X_new - x_pred
+            P_pred = (D.T*Wc) @ D
+            P_pred = (P_pred + P_pred.T)/2
+
+            if store:
+                self.x_priors[t] = x_pred
+                self.P_priors[t] = P_pred
+                # cross-covariance between the last and the current state
+                self.C_priors[t] = (dX.T*Wc) @ D
+
+            z = Z[t]
+            obs = ~np.isnan(z)
+            nobs = np.sum(obs)
+
+            if nobs:
+                Ho = aca(H[obs])
+                try:
+                    K, P, L, logdet = update_jit(P_pred, Ho, aca(R[obs][:, obs]))
+                except np.linalg.LinAlgError:
+                    # innovation covariance is not positive definite
+                    ll = -np.inf
+                    break
+
+                y = z[obs] - Ho @ x_pred - d[obs]
+                u = fsolve_jit(L, y.reshape(-1, 1))[:, 0]
+
+                ll -= .5*(nobs*log2pi + logdet + np.sum(u**2))
+                x = x_pred + K @ y
+            else:
+                x, P = x_pred, P_pred
+
+            means[t] = x
+            covs[t] = P
+
+        self.ll = ll
+
+        if calc_ll:
+            return ll
+
+        return means, covs
+
+    def rts_smoother(self, res, rcond=1e-14):
+        """Unscented Rauch-Tung-Striebel smoother, using the cross-covariances of the sigma points. Requires that `batch_filter` was run with `store=True`
+
+        Parameters
+        ----------
+        res : tuple
+            Filtered means and covariances as returned by `batch_filter`
+        rcond : float, optional
+            Cutoff for small singular values of the predicted covariances
+
+        Returns
+        -------
+        means : array
+            Smoothed means
+        covs : array
+            Smoothed covariances
+        """
+
+        means, covs = res
+        means, covs = means.copy(), covs.copy()
+
+        for t in range(len(means)-2, -1, -1):
+
+            G = self.C_priors[t+1] @ np.linalg.pinv(self.P_priors[t+1], rcond)
+            means[t] += G @ (means[t+1] - self.x_priors[t+1])
+            covs[t] += G @ (covs[t+1] - self.P_priors[t+1]) @ G.T
+
+        return means, covs